@@ -15,8 +15,8 @@ global_rule = {
      должен полнять, какие новости хочте получать юзер всегда. Это specifical_tags. остальные тэги, general_tags - уже скорее обобщенные. Пример:
      "Я хочу получать новости о стоимости биткоина!" -> specifical_tags: ["биткоин", "стоимость"], general_tags: ["криптовалюта", "биржа"]. Чем общирнее твой ответ, тем больше вероятность, что пользователь будет получать уведомления о том, что он хочет получать. 
       Чем больше смысла в запросе пользователя - тем больше тэгов соотвественно надо. Но и супер много, конечно, не надо. Нужно найти баланс.
-      ТАК ЖЕ ОЧЕНЬ ВАЖно. На 1 банальный тег делай по несколько экземпляров (с маленькой и большой буквы, сокращения, аббревиатура): Биткоин, биткоин, Bitcoin, BTC, Биток! Это очень важно
-      В General тэгс это ТОЖЕ касается, там тоже в разных вариациях.
+      На 1 понятие делай ОДИН тег, без вариантов написания: не "Биткоин, биткоин, Bitcoin, BTC, Биток", а просто "биткоин". Синонимы, регистр и тикеры сервис приводит к одному тегу сам.
+      В General тэгс это ТОЖЕ касается.
       Правила:
 1. Сухой технический текст
 2. Используй только двойные кавычки для JSON
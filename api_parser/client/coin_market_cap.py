@@ -1,61 +1,63 @@
 # coin_market_cap.py
-from requests import Session
-from requests.exceptions import ConnectionError, Timeout, TooManyRedirects
-import json
+import asyncio
+import logging
+import aiohttp
 from os import getenv
+from http_client import fetch_json
+from rate_limiter import cmc_credits
 
+logger = logging.getLogger(__name__)
 
-def CMC_listings_latest(limit: int = 50) -> dict:
-    url = 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest'
-    parameters = {
-        'start': '1',
-        'limit': str(limit),
-        'convert': 'USD'
-    }
-    headers = {
+
+# Запросы идут через общую keep-alive сессию http_client (лимиты, бюджет кредитов и кэш ответов)
+
+CMC_URL = 'https://pro-api.coinmarketcap.com'
+
+
+def _headers() -> dict:
+    return {
         'Accepts': 'application/json',
         'X-CMC_PRO_API_KEY': getenv('CMC_API_KEY', ''),
     }
 
-    session = Session()
-    session.headers.update(headers)
 
+async def CMC_listings_latest_async(limit: int = 50) -> dict:
+    parameters = {
+        'start': '1',
+        'limit': str(limit),
+        'convert': 'USD'
+    }
     try:
-        response = session.get(url, params=parameters)
-        data = json.loads(response.text)
+        data = await fetch_json(
+            f'{CMC_URL}/v1/cryptocurrency/listings/latest', params=parameters, headers=_headers(),
+            provider='cmc', endpoint='listings', credits=cmc_credits('listings', limit)
+        )
         return {
             'datetime': data.get('status', {}).get('timestamp'),
             'data': data.get('data', []),
             'type': 'cmc_listings'
         }
-    except (ConnectionError, Timeout, TooManyRedirects) as e:
-        print(f"CMC API Error: {e}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"CMC API Error: {e}")
         return {}
 
 
-def CMC_market_pairs(symbol: str, limit: int = 50) -> dict:
-    url = 'https://pro-api.coinmarketcap.com/v2/cryptocurrency/market-pairs/latest'
+async def CMC_market_pairs_async(symbol: str, limit: int = 50) -> dict:
     parameters = {
         'symbol': symbol,
         'limit': str(limit),
         'convert': 'USD'
     }
-    headers = {
-        'Accepts': 'application/json',
-        'X-CMC_PRO_API_KEY': getenv('CMC_API_KEY', ''),
-    }
-
-    session = Session()
-    session.headers.update(headers)
-
     try:
-        response = session.get(url, params=parameters)
-        data = json.loads(response.text)
+        data = await fetch_json(
+            f'{CMC_URL}/v2/cryptocurrency/market-pairs/latest', params=parameters, headers=_headers(),
+            provider='cmc', endpoint='market_pairs', credits=cmc_credits('market_pairs', limit)
+        )
         return {
             'datetime': data.get('status', {}).get('timestamp'),
             'data': data.get('data', {}),
             'type': 'cmc_market_pairs'
         }
-    except (ConnectionError, Timeout, TooManyRedirects) as e:
-        print(f"CMC Market Pairs API Error: {e}")
-        return {}
\ No newline at end of file
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"CMC Market Pairs API Error: {e}")
+        return {}
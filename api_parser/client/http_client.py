@@ -0,0 +1,161 @@
+# http_client.py
+import asyncio
+import logging
+import aiohttp
+from os import getenv
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Общий пул соединений: keep-alive между опросами, ограничение параллельных запросов к одному API
+HTTP_LIMIT = int(getenv('HTTP_LIMIT', 50))
+HTTP_LIMIT_PER_HOST = int(getenv('HTTP_LIMIT_PER_HOST', 10))
+HTTP_TIMEOUT = float(getenv('HTTP_TIMEOUT', 30))
+HTTP_CONNECT_TIMEOUT = float(getenv('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_KEEPALIVE_TIMEOUT = float(getenv('HTTP_KEEPALIVE_TIMEOUT', 75))
+# Сколько раз повторять запрос после 429 (каждый раз после Retry-After)
+HTTP_MAX_RETRIES = int(getenv('HTTP_MAX_RETRIES', 3))
+
+# Глобальная HTTP-сессия для повторного использования
+http_session: aiohttp.ClientSession | None = None
+_session_lock = asyncio.Lock()
+
+# RateLimiter (rate_limiter.py), подключается в main.py; без него запросы идут без ограничений
+rate_limiter = None
+
+# ResponseCache (response_cache.py), подключается в main.py; без него каждый вызов идет в API
+response_cache = None
+
+# Фоновые обновления устаревших записей кэша: не больше одного на ключ
+_revalidations: dict[str, asyncio.Task] = {}
+
+
+def set_rate_limiter(limiter):
+    global rate_limiter
+    rate_limiter = limiter
+
+
+def set_response_cache(cache):
+    global response_cache
+    response_cache = cache
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    global http_session
+    if http_session is None or http_session.closed:
+        async with _session_lock:
+            if http_session is None or http_session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=HTTP_LIMIT,
+                    limit_per_host=HTTP_LIMIT_PER_HOST,
+                    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=300,
+                )
+                http_session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT),
+                )
+    return http_session
+
+
+async def close_http_session():
+    global http_session
+    pending = list(_revalidations.values())
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if http_session:
+        await http_session.close()
+        http_session = None
+
+
+def _retry_after(response: aiohttp.ClientResponse, attempt: int) -> float:
+    try:
+        return max(1.0, float(response.headers.get('Retry-After', '')))
+    except ValueError:
+        return float(2 ** attempt)
+
+
+async def _request(url: str, params: dict | None, headers: dict | None,
+                   provider: str | None, endpoint: str | None, credits: int) -> tuple[int, object, dict]:
+    """Запрос с учетом лимитов; возвращает (статус, JSON или None для 304, ETag/Last-Modified)"""
+    session = await get_http_session()
+    limited = rate_limiter is not None and provider is not None
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        if limited:
+            await rate_limiter.acquire(provider, endpoint, credits)
+        async with session.get(url, params=params, headers=headers) as response:
+            if response.status == 429 and limited and attempt < HTTP_MAX_RETRIES:
+                await rate_limiter.throttled(provider, endpoint, _retry_after(response, attempt), credits)
+                continue
+            response.raise_for_status()
+            if response.status == 304:
+                return 304, None, {}
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            return response.status, await response.json(content_type=None), validators
+
+
+async def _refresh(key: str, entry: dict | None, ttl: int, url: str, params: dict | None, headers: dict | None,
+                   provider: str, endpoint: str | None, credits: int):
+    """Условный запрос по сохраненной записи; обновляет кэш и возвращает данные"""
+    conditional = {**(headers or {}), **response_cache.validators(entry)}
+    status, data, validators = await _request(url, params, conditional, provider, endpoint, credits)
+    if status == 304 and entry is not None:
+        response_cache.not_modified += 1
+        await response_cache.put(key, entry, ttl)
+        return entry['data']
+    await response_cache.put(key, {'data': data, **validators}, ttl)
+    return data
+
+
+async def _revalidate(key: str, lock_key: str, *args):
+    try:
+        await _refresh(key, *args)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Фоновое обновление кэша {key} не удалось: {e}")
+    finally:
+        await response_cache.unlock(lock_key)
+
+
+async def fetch_json(url: str, params: dict | None = None, headers: dict | None = None,
+                     provider: str | None = None, endpoint: str | None = None, credits: int = 0,
+                     allow_stale: bool = False):
+    """GET-запрос через общую сессию; ошибки HTTP (4xx/5xx) поднимаются как aiohttp.ClientResponseError.
+
+    provider/endpoint - ключи лимитов RateLimiter и TTL кэша, credits - стоимость запроса в дневном бюджете.
+    Ответ 429 не теряет запрос: лимит ставится на паузу по Retry-After и запрос повторяется.
+    allow_stale - отдавать устаревшую запись сразу и обновлять ее в фоне; плановым опросам это не нужно:
+    они и так ждут свой интервал, а устаревший ответ опубликовали бы повторно.
+    """
+    ttl = response_cache.ttl(provider, endpoint) if response_cache is not None and provider else 0
+    if ttl <= 0:
+        _, data, _ = await _request(url, params, headers, provider, endpoint, credits)
+        return data
+
+    key, lock_key = response_cache.keys(provider, endpoint, url, params)
+    entry = await response_cache.get(key)
+    if entry is not None:
+        age = response_cache.age(entry)
+        if age < ttl:
+            response_cache.hits += 1
+            return entry['data']
+        if allow_stale and age < ttl + response_cache.stale_seconds:
+            # stale-while-revalidate: отдаем сохраненный ответ, обновление идет в фоне
+            response_cache.stale_hits += 1
+            if key not in _revalidations and await response_cache.lock(lock_key):
+                task = asyncio.create_task(_revalidate(
+                    key, lock_key, entry, ttl, url, params, headers, provider, endpoint, credits
+                ))
+                _revalidations[key] = task
+                task.add_done_callback(lambda _: _revalidations.pop(key, None))
+            return entry['data']
+
+    response_cache.misses += 1
+    return await _refresh(key, entry, ttl, url, params, headers, provider, endpoint, credits)
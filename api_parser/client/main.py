@@ -1,16 +1,19 @@
 # main.py
 import asyncio
+import hashlib
 import time
 import json
 import logging
 import redis.asyncio as redis
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
-from ton_api import TON_jettons, TON_jetton_details, TON_jetton_holders, TON_jetton_events
-from coin_market_cap import CMC_listings_latest, CMC_market_pairs
+from ton_api import TON_jettons_async, TON_jetton_details_async, TON_jetton_holders_async, TON_jetton_events_async
+from coin_market_cap import CMC_listings_latest_async, CMC_market_pairs_async
+from http_client import close_http_session, set_rate_limiter, set_response_cache
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
 from os import getenv
 from dotenv import load_dotenv
-import aiohttp
 
 load_dotenv()
 
@@ -34,6 +37,24 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# Лимиты запросов к TonAPI/CMC и дневной бюджет кредитов CMC (общий для реплик через Redis)
+rate_limiter = RateLimiter.from_env(redis_client)
+set_rate_limiter(rate_limiter)
+
+# Кэш ответов API в Redis, общий для реплик
+response_cache = ResponseCache.from_env(redis_client)
+set_response_cache(response_cache)
+
+# Метрики лимитов и кэша для /metrics/collector монолита
+COLLECTOR_METRICS_KEY = 'api_parser:metrics'
+
+# Хэш последнего опубликованного ответа источника: ответ из кэша или 304 не публикуется повторно
+LAST_PUBLISHED_KEY = 'api_parser:last_published:{source}'
+LAST_PUBLISHED_TTL = 24 * 3600
+
+# Сколько ответов не опубликовано, так как не изменились с прошлой публикации
+unchanged_skipped = 0
+
 # Конфигурация сбора данных
 DATA_SOURCES = {
     'ton_jettons': {'interval': 1800, 'last_run': 0},  # 30 минут
@@ -50,31 +71,10 @@ PRIORITY_JETTONS = [
     # Добавьте другие приоритетные jettons
 ]
 
-# Глобальная HTTP-сессия для повторного использования
-http_session = None
-
-
-async def get_http_session():
-    global http_session
-    if http_session is None:
-        http_session = aiohttp.ClientSession()
-    return http_session
-
-
-async def close_http_session():
-    global http_session
-    if http_session:
-        await http_session.close()
-        http_session = None
-
-
 async def collect_ton_jettons(limit: int = 50) -> Dict[str, Any]:
     """Сбор данных о jettons из TON API"""
     try:
-        session = await get_http_session()
-        jettons = await asyncio.get_event_loop().run_in_executor(
-            None, TON_jettons, limit
-        )
+        jettons = await TON_jettons_async(limit)
         logger.info(f"TON jettons collected: {len(jettons)} items")
 
         # Анализ: находим jettons с быстрым ростом
@@ -105,10 +105,7 @@ async def collect_ton_jettons(limit: int = 50) -> Dict[str, Any]:
 async def collect_ton_jetton_details(address: str) -> Dict[str, Any]:
     """Сбор детальной информации о конкретном jetton"""
     try:
-        session = await get_http_session()
-        details = await asyncio.get_event_loop().run_in_executor(
-            None, TON_jetton_details, address
-        )
+        details = await TON_jetton_details_async(address)
         logger.info(f"TON jetton details collected for {address}")
 
         # Анализ: проверяем основные метрики
@@ -135,10 +132,7 @@ async def collect_ton_jetton_details(address: str) -> Dict[str, Any]:
 async def collect_ton_jetton_holders(address: str) -> Dict[str, Any]:
     """Сбор информации о холдерах jetton"""
     try:
-        session = await get_http_session()
-        holders = await asyncio.get_event_loop().run_in_executor(
-            None, TON_jetton_holders, address, 20
-        )
+        holders = await TON_jetton_holders_async(address, 20)
         logger.info(f"TON jetton holders collected for {address}")
 
         # Анализ: концентрация средств
@@ -173,12 +167,9 @@ async def collect_ton_jetton_holders(address: str) -> Dict[str, Any]:
 async def collect_ton_jetton_events(address: str) -> Dict[str, Any]:
     """Сбор событий по jetton"""
     try:
-        session = await get_http_session()
         # Получаем события за последние 24 часа
         start_date = (datetime.now() - timedelta(hours=24)).strftime('%Y-%m-%dT%H:%M:%SZ')
-        events = await asyncio.get_event_loop().run_in_executor(
-            None, TON_jetton_events, address, 50, start_date
-        )
+        events = await TON_jetton_events_async(address, 50, start_date)
         logger.info(f"TON jetton events collected for {address}")
 
         # Анализ: активность транзакций
@@ -204,10 +195,7 @@ async def collect_ton_jetton_events(address: str) -> Dict[str, Any]:
 async def collect_cmc_listings() -> Dict[str, Any]:
     """Сбор данных из CoinMarketCap Listings"""
     try:
-        session = await get_http_session()
-        cmc_data = await asyncio.get_event_loop().run_in_executor(
-            None, CMC_listings_latest, 30
-        )
+        cmc_data = await CMC_listings_latest_async(30)
         logger.info("CMC listings data collected")
 
         # Анализ: находим самые volatile токены
@@ -238,10 +226,7 @@ async def collect_cmc_listings() -> Dict[str, Any]:
 async def collect_cmc_market_pairs(symbol: str = 'TON') -> Dict[str, Any]:
     """Сбор данных о рыночных парах из CoinMarketCap"""
     try:
-        session = await get_http_session()
-        market_data = await asyncio.get_event_loop().run_in_executor(
-            None, CMC_market_pairs, symbol, 20
-        )
+        market_data = await CMC_market_pairs_async(symbol, 20)
         logger.info(f"CMC market pairs data collected for {symbol}")
 
         # Анализ: объем торгов
@@ -268,7 +253,7 @@ async def collect_cmc_market_pairs(symbol: str = 'TON') -> Dict[str, Any]:
         return {"source": "cmc_market_pairs", "symbol": symbol, "data": None, "error": error_msg}
 
 
-async def publish_to_redis(data: Dict[str, Any]):
+async def publish_to_redis(data: Dict[str, Any]) -> bool:
     """Публикация данных в Redis Stream"""
     try:
         # Добавляем timestamp
@@ -293,59 +278,119 @@ async def publish_to_redis(data: Dict[str, Any]):
         elif data['source'] == 'cmc_listings':
             await redis_client.set('last_cmc_listings', message_data, ex=600)
 
+        return True
     except Exception as e:
         logger.error(f"Failed to publish to Redis: {e}")
+        return False
+
+
+# Задачи источников, которые еще ждут лимитов или ответа API
+in_flight: Dict[str, set] = {}
+
+
+def is_due(source: str, current_time: float) -> bool:
+    """Пора ли запускать источник; пока его прошлые запросы в очереди лимитов, новые не добавляются"""
+    config = DATA_SOURCES[source]
+    if current_time - config['last_run'] < config['interval']:
+        return False
+    if in_flight.get(source):
+        logger.warning(f"{source}: предыдущие запросы ({len(in_flight[source])}) еще ждут лимитов, пропускаем запуск")
+        return False
+    config['last_run'] = current_time
+    return True
+
+
+def published_digest(result: Dict[str, Any]) -> tuple[str, str]:
+    """(ключ последней публикации источника для адреса/символа, хэш данных)"""
+    source = ':'.join(str(part) for part in (result['source'], result.get('address') or result.get('symbol')) if part)
+    digest = hashlib.sha1(json.dumps(result['data'], sort_keys=True, default=str).encode()).hexdigest()
+    return LAST_PUBLISHED_KEY.format(source=source), digest
+
+
+async def is_unchanged(key: str, digest: str) -> bool:
+    """Совпадают ли данные с прошлой публикацией (ответ из кэша или 304)"""
+    global unchanged_skipped
+    try:
+        if await redis_client.get(key) != digest:
+            return False
+    except Exception as e:
+        logger.error(f"Failed to read {key}: {e}")
+        return False
+    unchanged_skipped += 1
+    logger.info(f"{key}: data unchanged since last publish, skipping")
+    return True
+
+
+async def collect_and_publish(coroutine):
+    try:
+        result = await coroutine
+    except Exception as e:
+        logger.error(f"Task failed: {e}")
+        return
+    if not result or result.get('data') is None:
+        return
+    key, digest = published_digest(result)
+    if await is_unchanged(key, digest):
+        return
+    if await publish_to_redis(result):
+        try:
+            await redis_client.set(key, digest, ex=LAST_PUBLISHED_TTL)
+        except Exception as e:
+            logger.error(f"Failed to save {key}: {e}")
+
+
+def spawn(source: str, coroutine):
+    """Запускает сбор в фоне: запрос, ожидающий лимита или бюджета, не задерживает остальные источники"""
+    task = asyncio.create_task(collect_and_publish(coroutine))
+    running = in_flight.setdefault(source, set())
+    running.add(task)
+    task.add_done_callback(running.discard)
 
 
 async def data_collection_cycle():
     """Один цикл сбора данных с разной периодичностью"""
     current_time = time.time()
-    tasks = []
 
     # TON Jettons (каждые 30 минут)
-    if current_time - DATA_SOURCES['ton_jettons']['last_run'] >= DATA_SOURCES['ton_jettons']['interval']:
-        tasks.append(asyncio.create_task(collect_ton_jettons(50)))
-        DATA_SOURCES['ton_jettons']['last_run'] = current_time
+    if is_due('ton_jettons', current_time):
+        spawn('ton_jettons', collect_ton_jettons(50))
 
     # TON Jetton Details (каждый час для приоритетных jettons)
-    if current_time - DATA_SOURCES['ton_jetton_details']['last_run'] >= DATA_SOURCES['ton_jetton_details']['interval']:
+    if is_due('ton_jetton_details', current_time):
         for address in PRIORITY_JETTONS:
-            tasks.append(asyncio.create_task(collect_ton_jetton_details(address)))
-        DATA_SOURCES['ton_jetton_details']['last_run'] = current_time
+            spawn('ton_jetton_details', collect_ton_jetton_details(address))
 
     # TON Jetton Holders (каждые 2 часа для приоритетных jettons)
-    if current_time - DATA_SOURCES['ton_jetton_holders']['last_run'] >= DATA_SOURCES['ton_jetton_holders']['interval']:
+    if is_due('ton_jetton_holders', current_time):
         for address in PRIORITY_JETTONS:
-            tasks.append(asyncio.create_task(collect_ton_jetton_holders(address)))
-        DATA_SOURCES['ton_jetton_holders']['last_run'] = current_time
+            spawn('ton_jetton_holders', collect_ton_jetton_holders(address))
 
     # TON Jetton Events (каждые 15 минут для приоритетных jettons)
-    if current_time - DATA_SOURCES['ton_jetton_events']['last_run'] >= DATA_SOURCES['ton_jetton_events']['interval']:
+    if is_due('ton_jetton_events', current_time):
         for address in PRIORITY_JETTONS:
-            tasks.append(asyncio.create_task(collect_ton_jetton_events(address)))
-        DATA_SOURCES['ton_jetton_events']['last_run'] = current_time
+            spawn('ton_jetton_events', collect_ton_jetton_events(address))
 
     # CMC Listings (каждые 5 минут)
-    if current_time - DATA_SOURCES['cmc_listings']['last_run'] >= DATA_SOURCES['cmc_listings']['interval']:
-        tasks.append(asyncio.create_task(collect_cmc_listings()))
-        DATA_SOURCES['cmc_listings']['last_run'] = current_time
+    if is_due('cmc_listings', current_time):
+        spawn('cmc_listings', collect_cmc_listings())
 
     # CMC Market Pairs (каждые 10 минут)
-    if current_time - DATA_SOURCES['cmc_market_pairs']['last_run'] >= DATA_SOURCES['cmc_market_pairs']['interval']:
-        tasks.append(asyncio.create_task(collect_cmc_market_pairs('TON')))
-        tasks.append(asyncio.create_task(collect_cmc_market_pairs('BTC')))
-        DATA_SOURCES['cmc_market_pairs']['last_run'] = current_time
+    if is_due('cmc_market_pairs', current_time):
+        spawn('cmc_market_pairs', collect_cmc_market_pairs('TON'))
+        spawn('cmc_market_pairs', collect_cmc_market_pairs('BTC'))
 
-    # Выполняем все задачи
-    if tasks:
-        results = await asyncio.gather(*tasks, return_exceptions=True)
 
-        # Публикуем результаты в Redis
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"Task failed: {result}")
-            elif result and result.get('data') is not None:
-                await publish_to_redis(result)
+async def publish_metrics():
+    """Остаток лимитов и бюджета CMC, статистика кэша - в Redis для /metrics/collector"""
+    try:
+        stats = await rate_limiter.stats()
+        stats['in_flight'] = {source: len(tasks) for source, tasks in in_flight.items() if tasks}
+        stats['cache'] = response_cache.stats()
+        stats['unchanged_skipped'] = unchanged_skipped
+        stats['updated_at'] = datetime.now().isoformat()
+        await redis_client.set(COLLECTOR_METRICS_KEY, json.dumps(stats), ex=300)
+    except Exception as e:
+        logger.error(f"Failed to publish collector metrics: {e}")
 
 
 async def main_worker():
@@ -366,6 +411,7 @@ async def main_worker():
 
             # Выполняем цикл сбора данных
             await data_collection_cycle()
+            await publish_metrics()
 
             # Ждем перед следующим циклом (30 секунд)
             await asyncio.sleep(30)
@@ -375,6 +421,10 @@ async def main_worker():
     except Exception as e:
         logger.error(f"Worker error: {e}")
     finally:
+        pending = [task for tasks in in_flight.values() for task in tasks]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
         try:
             await redis_client.close()
             await close_http_session()
@@ -0,0 +1,210 @@
+# rate_limiter.py
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from os import getenv
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Лимиты по умолчанию: бесплатный тариф TonAPI - 1 RPS, базовый тариф CMC - 30 запросов в минуту
+DEFAULT_RATE_LIMITS = 'tonapi:1/1,cmc:0.5/1'
+
+# Базовый тариф CMC - 10 000 кредитов в месяц
+DEFAULT_CMC_DAILY_CREDITS = 330
+
+CMC_CREDITS_KEY = 'cmc_credits:{date}'
+
+
+def parse_rate_limits(value: str) -> dict[str, tuple[float, float]]:
+    """RATE_LIMITS вида 'tonapi:1/1,cmc:0.5/1,tonapi.jetton_events:0.2/1' -> {ключ: (запросов в секунду, burst)}.
+
+    Ключ - провайдер или провайдер.endpoint; лимит endpoint действует вместе с лимитом провайдера.
+    """
+    limits = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        try:
+            key, spec = item.rsplit(':', 1)
+            rate, _, burst = spec.partition('/')
+            rate = float(rate)
+            if rate <= 0:
+                raise ValueError(rate)
+            limits[key.strip()] = (rate, float(burst) if burst else max(1.0, rate))
+        except ValueError:
+            logger.error(f"Некорректный лимит в RATE_LIMITS: {item}")
+    return limits
+
+
+def cmc_credits(endpoint: str, limit: int) -> int:
+    """Стоимость запроса CMC в кредитах: 1 кредит за 200 монет в listings и за 100 пар в market-pairs"""
+    per_credit = 200 if endpoint == 'listings' else 100
+    return max(1, math.ceil(limit / per_credit))
+
+
+class TokenBucket:
+    """Token bucket: запросы сверх лимита ждут своей очереди (FIFO), а не отбрасываются"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.acquired = 0
+        self.waiting = 0
+        self.waited_seconds = 0.0
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Ждет, пока в ведре появятся токены; возвращает время ожидания"""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            # Lock в asyncio честный: ожидающие получают токены в порядке прихода
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self.paused_until:
+                        await asyncio.sleep(self.paused_until - now)
+                        continue
+                    self._refill(now)
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        break
+                    await asyncio.sleep((tokens - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.waited_seconds += waited
+        return waited
+
+    def pause(self, seconds: float):
+        """Провайдер ответил 429: не отдаем токены до истечения Retry-After"""
+        self.throttled += 1
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        self._refill(time.monotonic())
+        return {
+            'rate': self.rate,
+            'capacity': self.capacity,
+            'tokens': round(self.tokens, 2),
+            'waiting': self.waiting,
+            'acquired': self.acquired,
+            'waited_seconds': round(self.waited_seconds, 1),
+            'throttled': self.throttled,
+        }
+
+
+class CreditBudget:
+    """Дневной бюджет кредитов CMC в Redis (общий для всех реплик), сбрасывается в полночь UTC"""
+
+    def __init__(self, redis, daily_credits: int, key: str = CMC_CREDITS_KEY, poll_interval: float = 300):
+        self.redis = redis
+        self.daily_credits = daily_credits
+        self.key = key
+        self.poll_interval = poll_interval
+
+        self.spent = 0
+        self.waiting = 0
+
+    def _key(self) -> str:
+        return self.key.format(date=datetime.now(timezone.utc).strftime('%Y-%m-%d'))
+
+    @staticmethod
+    def _seconds_to_reset() -> float:
+        now = datetime.now(timezone.utc)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - now).total_seconds()
+
+    async def reserve(self, credits: int):
+        """Списывает кредиты; если бюджет на сегодня исчерпан - ждет следующих суток UTC"""
+        self.waiting += 1
+        try:
+            while True:
+                key = self._key()
+                used = await self.redis.incrby(key, credits)
+                if used == credits:
+                    await self.redis.expire(key, 2 * 24 * 3600)
+                if used <= self.daily_credits:
+                    self.spent += credits
+                    return
+                await self.redis.decrby(key, credits)
+                delay = min(self.poll_interval, self._seconds_to_reset() + 1)
+                logger.warning(f"Дневной бюджет CMC исчерпан ({used - credits}/{self.daily_credits}), "
+                               f"запрос ждет {delay:.0f} сек")
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    async def refund(self, credits: int):
+        """Возвращает кредиты запроса, который провайдер не выполнил (429)"""
+        await self.redis.decrby(self._key(), credits)
+        self.spent -= credits
+
+    async def remaining(self) -> int:
+        used = int(await self.redis.get(self._key()) or 0)
+        return max(0, self.daily_credits - used)
+
+    async def stats(self) -> dict:
+        return {
+            'daily_credits': self.daily_credits,
+            'remaining': await self.remaining(),
+            'spent_by_replica': self.spent,
+            'waiting': self.waiting,
+            'reset_in_seconds': int(self._seconds_to_reset()),
+        }
+
+
+class RateLimiter:
+    """Лимиты запросов к внешним API: token bucket на провайдера и endpoint, дневной бюджет кредитов CMC"""
+
+    def __init__(self, limits: dict[str, tuple[float, float]], budget: CreditBudget | None = None):
+        self.buckets = {key: TokenBucket(rate, burst) for key, (rate, burst) in limits.items()}
+        self.budget = budget
+
+    @classmethod
+    def from_env(cls, redis) -> 'RateLimiter':
+        limits = parse_rate_limits(DEFAULT_RATE_LIMITS)
+        limits.update(parse_rate_limits(getenv('RATE_LIMITS', '')))
+        daily_credits = int(getenv('CMC_DAILY_CREDITS', DEFAULT_CMC_DAILY_CREDITS))
+        budget = CreditBudget(redis, daily_credits) if daily_credits > 0 else None
+        return cls(limits, budget)
+
+    def _buckets(self, provider: str, endpoint: str | None) -> list[TokenBucket]:
+        # Сначала более узкий лимит endpoint, чтобы не держать токен провайдера во время ожидания
+        keys = (f'{provider}.{endpoint}' if endpoint else None, provider)
+        return [self.buckets[key] for key in keys if key in self.buckets]
+
+    async def acquire(self, provider: str, endpoint: str | None = None, credits: int = 0):
+        if credits and self.budget is not None:
+            await self.budget.reserve(credits)
+        for bucket in self._buckets(provider, endpoint):
+            await bucket.acquire()
+
+    async def throttled(self, provider: str, endpoint: str | None, retry_after: float, credits: int = 0):
+        for bucket in self._buckets(provider, endpoint):
+            bucket.pause(retry_after)
+        if credits and self.budget is not None:
+            await self.budget.refund(credits)
+        logger.warning(f"{provider}.{endpoint}: 429, пауза {retry_after:.0f} сек")
+
+    async def stats(self) -> dict:
+        return {
+            'buckets': {key: bucket.stats() for key, bucket in self.buckets.items()},
+            'cmc_credits': await self.budget.stats() if self.budget is not None else None,
+        }
@@ -0,0 +1,140 @@
+# response_cache.py
+import hashlib
+import json
+import logging
+import time
+from os import getenv
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ответ считается свежим; 0 - не кэшировать (events запрашиваются с плавающим start_date).
+# Для опрашиваемых endpoint TTL = интервал опроса (DATA_SOURCES в main.py) минус такт цикла (30 сек):
+# очередной опрос реплики всегда идет в API, а реплики, опросившие следом, получают тот же ответ из кэша.
+# Детали jetton меняются редко: их TTL длиннее интервала, неизменный ответ повторно не публикуется.
+DEFAULT_CACHE_TTLS = {
+    'tonapi.jettons': 1770,
+    'tonapi.jetton_details': 6 * 3600,
+    'tonapi.jetton_holders': 7170,
+    'tonapi.jetton_events': 0,
+    'cmc.listings': 270,
+    'cmc.market_pairs': 570,
+}
+
+CACHE_KEY = 'api_cache:{endpoint}:{digest}'
+CACHE_LOCK_KEY = 'api_cache_lock:{endpoint}:{digest}'
+
+
+def parse_cache_ttls(value: str) -> dict[str, int]:
+    """API_CACHE_TTLS вида 'tonapi.jetton_details:21600,cmc.listings:240' -> {provider.endpoint: секунды}"""
+    ttls = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        try:
+            key, seconds = item.rsplit(':', 1)
+            ttls[key.strip()] = int(seconds)
+        except ValueError:
+            logger.error(f"Некорректный TTL в API_CACHE_TTLS: {item}")
+    return ttls
+
+
+class ResponseCache:
+    """Общий для реплик кэш ответов API в Redis с ключом endpoint + параметры запроса.
+
+    Свежий ответ (моложе TTL) отдается без запроса. Устаревшая запись хранится еще stale_seconds: ее
+    ETag/Last-Modified уходят в If-None-Match/If-Modified-Since, ответ 304 лишь продлевает запись.
+    По запросу (allow_stale в fetch_json) устаревший ответ отдается сразу, а в фоне одна реплика
+    (lock в Redis) перезапрашивает его (stale-while-revalidate).
+    """
+
+    def __init__(self, redis, ttls: dict[str, int], stale_seconds: int = 3600, lock_seconds: int = 60):
+        self.redis = redis
+        self.ttls = ttls
+        self.stale_seconds = stale_seconds
+        self.lock_seconds = lock_seconds
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, redis) -> 'ResponseCache':
+        ttls = dict(DEFAULT_CACHE_TTLS)
+        ttls.update(parse_cache_ttls(getenv('API_CACHE_TTLS', '')))
+        return cls(redis, ttls, stale_seconds=int(getenv('API_CACHE_STALE_SECONDS', 3600)))
+
+    def ttl(self, provider: str, endpoint: str | None) -> int:
+        return self.ttls.get(f'{provider}.{endpoint}', 0)
+
+    @staticmethod
+    def _digest(url: str, params: dict | None) -> str:
+        raw = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def keys(self, provider: str, endpoint: str | None, url: str, params: dict | None) -> tuple[str, str]:
+        """(ключ записи, ключ lock фонового обновления)"""
+        parts = {'endpoint': f'{provider}.{endpoint}', 'digest': self._digest(url, params)}
+        return CACHE_KEY.format(**parts), CACHE_LOCK_KEY.format(**parts)
+
+    async def get(self, key: str) -> dict | None:
+        try:
+            raw = await self.redis.get(key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка чтения кэша {key}: {e}")
+            return None
+
+    async def put(self, key: str, entry: dict, ttl: int):
+        """Сохраняет ответ; запись живет TTL + окно stale-while-revalidate"""
+        entry['fetched_at'] = time.time()
+        try:
+            await self.redis.set(key, json.dumps(entry, ensure_ascii=False), ex=ttl + self.stale_seconds)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка записи кэша {key}: {e}")
+
+    async def lock(self, lock_key: str) -> bool:
+        """Только одна реплика обновляет устаревшую запись"""
+        try:
+            return bool(await self.redis.set(lock_key, 1, nx=True, ex=self.lock_seconds))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка lock кэша {lock_key}: {e}")
+            return False
+
+    async def unlock(self, lock_key: str):
+        try:
+            await self.redis.delete(lock_key)
+        except Exception as e:
+            logger.error(f"Ошибка снятия lock кэша {lock_key}: {e}")
+
+    @staticmethod
+    def age(entry: dict) -> float:
+        return time.time() - entry.get('fetched_at', 0)
+
+    @staticmethod
+    def validators(entry: dict | None) -> dict:
+        """Заголовки условного запроса из сохраненных ETag/Last-Modified"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def stats(self) -> dict:
+        requests = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'errors': self.errors,
+            'hit_ratio': round((self.hits + self.stale_hits) / requests, 3) if requests else None,
+        }
@@ -1,43 +1,44 @@
 # ton_api.py
-from requests import request
 import os
 from dotenv import load_dotenv
+from http_client import fetch_json
 
 load_dotenv()
 
 TONAPI_KEY = os.getenv('TONAPI_KEY', '')
+TONAPI_URL = 'https://tonapi.io/v2'
 
-def TON_jettons(limit: int = 100, offset: int = 0) -> list:
-    headers = {'Authorization': f'Bearer {TONAPI_KEY}'} if TONAPI_KEY else {}
-    response = request(
-        url=f"https://tonapi.io/v2/jettons?limit={limit}&offset={offset}",
-        method="GET",
-        headers=headers
+# Запросы идут через общую keep-alive сессию http_client (лимиты и кэш ответов)
+
+def _headers() -> dict:
+    return {'Authorization': f'Bearer {TONAPI_KEY}'} if TONAPI_KEY else {}
+
+async def TON_jettons_async(limit: int = 100, offset: int = 0) -> list:
+    data = await fetch_json(
+        f"{TONAPI_URL}/jettons", params={'limit': limit, 'offset': offset}, headers=_headers(),
+        provider='tonapi', endpoint='jettons'
     )
-    return response.json().get('jettons', [])
-
-def TON_jetton_details(address: str) -> dict:
-    headers = {'Authorization': f'Bearer {TONAPI_KEY}'} if TONAPI_KEY else {}
-    response = request(
-        url=f"https://tonapi.io/v2/jettons/{address}",
-        method="GET",
-        headers=headers
+    return data.get('jettons', [])
+
+async def TON_jetton_details_async(address: str) -> dict:
+    return await fetch_json(
+        f"{TONAPI_URL}/jettons/{address}", headers=_headers(), provider='tonapi', endpoint='jetton_details'
     )
-    return response.json()
-
-def TON_jetton_holders(address: str, limit: int = 100, offset: int = 0) -> dict:
-    headers = {'Authorization': f'Bearer {TONAPI_KEY}'} if TONAPI_KEY else {}
-    response = request(
-        url=f"https://tonapi.io/v2/jettons/{address}/holders?limit={limit}&offset={offset}",
-        method="GET",
-        headers=headers
+
+async def TON_jetton_holders_async(address: str, limit: int = 100, offset: int = 0) -> dict:
+    return await fetch_json(
+        f"{TONAPI_URL}/jettons/{address}/holders",
+        params={'limit': limit, 'offset': offset},
+        headers=_headers(),
+        provider='tonapi',
+        endpoint='jetton_holders'
     )
-    return response.json()
 
-def TON_jetton_events(address: str, limit: int = 100, start_date: str = None) -> dict:
-    headers = {'Authorization': f'Bearer {TONAPI_KEY}'} if TONAPI_KEY else {}
-    url = f"https://tonapi.io/v2/jettons/{address}/events?limit={limit}"
+async def TON_jetton_events_async(address: str, limit: int = 100, start_date: str = None) -> dict:
+    params = {'limit': limit}
     if start_date:
-        url += f"&start_date={start_date}"
-    response = request(url=url, method="GET", headers=headers)
-    return response.json()
\ No newline at end of file
+        params['start_date'] = start_date
+    return await fetch_json(
+        f"{TONAPI_URL}/jettons/{address}/events", params=params, headers=_headers(),
+        provider='tonapi', endpoint='jetton_events'
+    )
@@ -0,0 +1,321 @@
+# benchmarks/fanout.py
+"""Масштабирование сопоставления новостей с пользователями на синтетической таблице users.
+
+Таблицы users и user_tags создаются в SQLite с той же схемой, что в MariaDB (JSON-теги в users,
+канонические теги в user_tags), и заполняются синтетическими пользователями (Zipf-распределение
+тегов). Затем один и тот же корпус новостей прогоняется через движки:
+
+    scan     - полный обход users пачками по 100 и проверка каждого (прежняя семантика Go-парсера)
+    indexed  - кандидаты из user_tags, проверка только их (текущий Go-парсер)
+    matcher  - TagMatcher, in-memory инвертированный индекс (NEWS_FANOUT=1)
+    sparse   - SparseTagScorer, пакетное умножение разреженных матриц
+
+Для каждого размера таблицы и движка пишутся users_scanned, matches, news_per_second и peak_memory_mb.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fanout --users 10000 100000 1000000 --news 500 --output fanout.json
+
+Память: tracemalloc на построении индекса и первых --memory-news новостях, замер скорости идет
+отдельно и без трассировки. Память самого SQLite tracemalloc не видит, для scan/indexed смотрите
+peak_rss_mb. Движки поверх SQL на 1M строк медленные, поэтому scan и indexed прогоняют только
+первые --sql-news новостей корпуса.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from benchmarks.synthetic import Population
+from src.infrastructure.repository.mariadb.user_stream import UserFilter, UserRow
+from src.services.matching.tag_matcher import GENERAL_THRESHOLD, SPECIFIC_THRESHOLD, TagMatcher
+from src.services.tags.canonical import canonical_tags
+
+ENGINES = ('scan', 'indexed', 'matcher', 'sparse')
+SQL_ENGINES = ('scan', 'indexed')
+
+# Размер пачки, как в processUsersWithCursorPagination
+SCAN_BATCH = 100
+
+# Каждый 50-й пользователь заблокировал бота (is_reachable = 0)
+UNREACHABLE_EVERY = 50
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS users (
+        telegram_id INTEGER PRIMARY KEY,
+        is_premium INTEGER NOT NULL DEFAULT 0,
+        premium_until TEXT,
+        is_reachable INTEGER NOT NULL DEFAULT 1,
+        alert_config_general TEXT NOT NULL,
+        alert_config_specific TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_tags (
+        tag_normalized TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        telegram_id INTEGER NOT NULL,
+        PRIMARY KEY (tag_normalized, kind, telegram_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_user_tags_telegram_id ON user_tags (telegram_id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_is_reachable ON users (is_reachable)",
+)
+
+
+def populate(connection: sqlite3.Connection, users: int, seed: int) -> float:
+    """Заполняет users и user_tags; пропускает заполнение, если таблица уже нужного размера"""
+    for statement in SCHEMA:
+        connection.execute(statement)
+    if connection.execute("SELECT COUNT(*) FROM users").fetchone()[0] == users:
+        return 0.0
+
+    started = time.perf_counter()
+    connection.execute("DELETE FROM users")
+    connection.execute("DELETE FROM user_tags")
+    user_rows, tag_rows = [], []
+
+    def flush():
+        connection.executemany("INSERT INTO users VALUES (?, ?, NULL, ?, ?, ?)", user_rows)
+        connection.executemany("INSERT OR IGNORE INTO user_tags VALUES (?, ?, ?)", tag_rows)
+        user_rows.clear()
+        tag_rows.clear()
+
+    for user in Population(seed=seed).users(users):
+        user_rows.append((
+            user.telegram_id,
+            int(user.is_premium),
+            int(user.telegram_id % UNREACHABLE_EVERY != 0),
+            json.dumps(user.general, ensure_ascii=False),
+            json.dumps(user.specific, ensure_ascii=False),
+        ))
+        for kind, tags in (('general', user.general), ('specific', user.specific)):
+            tag_rows.extend((tag, kind, user.telegram_id) for tag in canonical_tags(tags))
+        if len(user_rows) >= 10000:
+            flush()
+    flush()
+    connection.commit()
+    return time.perf_counter() - started
+
+
+class SQLiteUsers:
+    """iter_users поверх SQLite: TagMatcher и SparseTagScorer строятся тем же кодом, что и из MariaDB"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    async def iter_users(self, user_filter=None, batch_size: int = 1000, columns: tuple[str, ...] = ()):
+        user_filter = user_filter or UserFilter()
+        names = list(dict.fromkeys(('telegram_id', *columns)))
+        where = "telegram_id > ?"
+        if user_filter.is_reachable is not None:
+            where += f" AND is_reachable = {int(user_filter.is_reachable)}"
+        query = f"SELECT {', '.join(names)} FROM users WHERE {where} ORDER BY telegram_id LIMIT ?"
+        last_id = 0
+        while True:
+            rows = self.connection.execute(query, (last_id, batch_size)).fetchall()
+            for row in rows:
+                yield UserRow(dict(zip(names, row)))
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+
+def should_send(news_tags: list[str], general: list[str], specific: list[str]) -> bool:
+    """shouldSendNotification из user_parser/main.go; news_tags уже канонические"""
+    news = set(news_tags)
+    general_match = sum(tag in news for tag in canonical_tags(general)) / len(news_tags) * 100
+    if general_match >= GENERAL_THRESHOLD:
+        return True
+    specific_match = sum(tag in news for tag in canonical_tags(specific)) / len(news_tags) * 100
+    return specific_match >= SPECIFIC_THRESHOLD
+
+
+class SQLEngine:
+    """Go-парсер: пачки пользователей из БД по курсору и проверка каждого в цикле"""
+
+    SCAN_QUERY = """SELECT telegram_id, is_premium, alert_config_general, alert_config_specific
+        FROM users WHERE telegram_id > ? AND is_reachable = 1 ORDER BY telegram_id LIMIT ?"""
+    INDEXED_QUERY = """SELECT telegram_id, is_premium, alert_config_general, alert_config_specific
+        FROM users
+        WHERE telegram_id IN (SELECT telegram_id FROM user_tags WHERE tag_normalized IN ({placeholders}))
+        AND is_reachable = 1 AND telegram_id > ? ORDER BY telegram_id LIMIT ?"""
+
+    def __init__(self, connection: sqlite3.Connection, indexed: bool):
+        self.connection = connection
+        self.indexed = indexed
+
+    async def build(self):
+        pass
+
+    def match(self, news_tags: list[list[str]]) -> list[tuple[int, int]]:
+        """(просмотрено пользователей, совпадений) для каждой новости"""
+        return [self._match_one(canonical_tags(tags)) for tags in news_tags]
+
+    def _match_one(self, tags: list[str]) -> tuple[int, int]:
+        if not tags:
+            return 0, 0
+        if self.indexed:
+            query = self.INDEXED_QUERY.format(placeholders=','.join('?' * len(tags)))
+            params = tags
+        else:
+            query, params = self.SCAN_QUERY, []
+        scanned = matches = 0
+        last_id = 0
+        while True:
+            rows = self.connection.execute(query, (*params, last_id, SCAN_BATCH)).fetchall()
+            if not rows:
+                break
+            for _, _, general, specific in rows:
+                if should_send(tags, json.loads(general), json.loads(specific)):
+                    matches += 1
+            scanned += len(rows)
+            last_id = rows[-1][0]
+        return scanned, matches
+
+
+class MatcherEngine:
+    def __init__(self, connection: sqlite3.Connection):
+        self.matcher = TagMatcher(SQLiteUsers(connection))
+
+    async def build(self):
+        await self.matcher.rebuild()
+
+    def match(self, news_tags: list[list[str]]) -> list[tuple[int, int]]:
+        results = (self.matcher.match(tags) for tags in news_tags)
+        return [(result.scanned, len(result.user_ids)) for result in results]
+
+
+class SparseEngine:
+    def __init__(self, connection: sqlite3.Connection, batch: int):
+        from src.services.matching.sparse_scoring import SparseTagScorer
+        self.repository = SQLiteUsers(connection)
+        self.scorer = SparseTagScorer()
+        self.batch = batch
+
+    async def build(self):
+        await self.scorer.rebuild(self.repository)
+
+    def match(self, news_tags: list[list[str]]) -> list[tuple[int, int]]:
+        results = []
+        for index in range(0, len(news_tags), self.batch):
+            results.extend(
+                (result.scanned, len(result.user_ids)) for result in self.scorer.score(news_tags[index:index + self.batch])
+            )
+        return results
+
+
+def create_engine(name: str, connection: sqlite3.Connection, batch: int):
+    if name == 'scan':
+        return SQLEngine(connection, indexed=False)
+    if name == 'indexed':
+        return SQLEngine(connection, indexed=True)
+    if name == 'matcher':
+        return MatcherEngine(connection)
+    if name == 'sparse':
+        return SparseEngine(connection, batch)
+    raise ValueError(f"Неизвестный движок: {name}")
+
+
+def run_engine(name: str, connection: sqlite3.Connection, corpus: list[list[str]], batch: int,
+               memory_news: int) -> dict:
+    # Память: построение индекса и несколько новостей под tracemalloc
+    tracemalloc.start()
+    started = time.perf_counter()
+    engine = create_engine(name, connection, batch)
+    asyncio.run(engine.build())
+    build_seconds = time.perf_counter() - started
+    engine.match(corpus[:memory_news])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Скорость: весь корпус без трассировки
+    started = time.perf_counter()
+    results = engine.match(corpus)
+    seconds = time.perf_counter() - started
+
+    scanned = sum(result[0] for result in results)
+    matches = sum(result[1] for result in results)
+    return {
+        'engine': name,
+        'news': len(corpus),
+        'build_seconds': round(build_seconds, 3),
+        'match_seconds': round(seconds, 3),
+        'news_per_second': round(len(corpus) / seconds, 2) if seconds else None,
+        'users_scanned': scanned,
+        'users_scanned_per_news': round(scanned / len(corpus), 1) if corpus else 0,
+        'matches': matches,
+        'matches_per_news': round(matches / len(corpus), 1) if corpus else 0,
+        'peak_memory_mb': round(peak / 2 ** 20, 1),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(users: list[int], news: int, engines: list[str], batch: int = 256, sql_news: int = 50,
+        memory_news: int = 10, seed: int = 42, db_dir: str | None = None) -> dict:
+    corpus = Population(seed=seed + 1).news(news)
+    results = []
+    for count in users:
+        path = os.path.join(db_dir, f'fanout_{count}_{seed}.sqlite') if db_dir else ':memory:'
+        connection = sqlite3.connect(path)
+        try:
+            populate_seconds = populate(connection, count, seed)
+            for name in engines:
+                replay = corpus[:sql_news] if name in SQL_ENGINES else corpus
+                result = run_engine(name, connection, replay, batch, min(memory_news, len(replay)))
+                results.append({'users': count, 'populate_seconds': round(populate_seconds, 3), **result})
+                print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+        finally:
+            connection.close()
+
+    return {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'seed': seed,
+        'peak_rss_mb': peak_rss_mb(),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--news', type=int, default=500)
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--batch', type=int, default=256, help='размер пачки новостей для sparse')
+    parser.add_argument('--sql-news', type=int, default=50, help='сколько новостей прогонять через scan и indexed')
+    parser.add_argument('--memory-news', type=int, default=10, help='сколько новостей прогонять под tracemalloc')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-dir', help='каталог для файлов SQLite (повторные запуски не генерируют таблицы заново)')
+    parser.add_argument('--output', help='файл для JSON с результатами (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    report = run(args.users, args.news, args.engines, args.batch, args.sql_news, args.memory_news,
+                 args.seed, args.db_dir)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
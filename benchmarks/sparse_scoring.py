@@ -0,0 +1,62 @@
+# benchmarks/sparse_scoring.py
+"""Пропускная способность SparseTagScorer (новостей в секунду) на синтетической базе.
+
+Запуск из корня репозитория:
+    python -m benchmarks.sparse_scoring --users 1000000 --news 2000 --batch 256
+
+Для честного сравнения с одним ядром ограничьте потоки BLAS: OMP_NUM_THREADS=1.
+"""
+import argparse
+import json
+import time
+from benchmarks.synthetic import Population
+from src.services.matching.sparse_scoring import SparseTagScorer
+
+
+def run(users: int, news: int, batch: int, seed: int = 42) -> dict:
+    population = Population(seed=seed)
+
+    started = time.perf_counter()
+    scorer = SparseTagScorer()
+    scorer.build(
+        (user.telegram_id, user.general, user.specific, user.is_premium, None)
+        for user in population.users(users)
+    )
+    build_seconds = time.perf_counter() - started
+
+    corpus = population.news(news)
+    matches = 0
+    scanned = 0
+    started = time.perf_counter()
+    for index in range(0, len(corpus), batch):
+        for result in scorer.score(corpus[index:index + batch]):
+            matches += len(result.user_ids)
+            scanned += result.scanned
+    score_seconds = time.perf_counter() - started
+
+    return {
+        'engine': 'sparse',
+        'users': users,
+        'news': news,
+        'batch': batch,
+        'build_seconds': round(build_seconds, 3),
+        'score_seconds': round(score_seconds, 3),
+        'news_per_second': round(news / score_seconds, 1) if score_seconds else None,
+        'matches': matches,
+        'users_scanned': scanned,
+        **scorer.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--news', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.news, args.batch, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
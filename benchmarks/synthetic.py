@@ -0,0 +1,49 @@
+# benchmarks/synthetic.py
+"""Синтетические пользователи и новости для бенчмарков рассылки.
+
+Популярность тегов распределена по Zipf: несколько тегов (ton, bitcoin, ...) есть у большинства,
+длинный хвост - у единиц, как в реальных настройках alert_config_general/alert_config_specific.
+"""
+import itertools
+import random
+from dataclasses import dataclass
+
+HEAD_TAGS = ['ton', 'bitcoin', 'ethereum', 'memecoin', 'defi', 'nft', 'stonfi', 'dedust', 'listing', 'airdrop']
+
+
+@dataclass
+class SyntheticUser:
+    telegram_id: int
+    general: list[str]
+    specific: list[str]
+    is_premium: bool
+
+
+class Population:
+    """Генератор пользователей и новостей с общим словарем тегов"""
+
+    def __init__(self, vocabulary_size: int = 5000, zipf_s: float = 1.1, seed: int = 42):
+        self.random = random.Random(seed)
+        self.vocabulary = HEAD_TAGS + [f'token_{index}' for index in range(vocabulary_size - len(HEAD_TAGS))]
+        weights = [1 / (rank + 1) ** zipf_s for rank in range(len(self.vocabulary))]
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def _tags(self, low: int, high: int) -> list[str]:
+        count = self.random.randint(low, high)
+        # Теги пользователя хранятся как есть: повторы и разный регистр встречаются и в реальных данных
+        return [
+            tag.upper() if self.random.random() < 0.05 else tag
+            for tag in self.random.choices(self.vocabulary, cum_weights=self.cum_weights, k=count)
+        ]
+
+    def users(self, count: int, premium_share: float = 0.1):
+        for telegram_id in range(1, count + 1):
+            yield SyntheticUser(
+                telegram_id=telegram_id,
+                general=self._tags(0, 10),
+                specific=self._tags(0, 4),
+                is_premium=self.random.random() < premium_share,
+            )
+
+    def news(self, count: int) -> list[list[str]]:
+        return [self._tags(2, 8) for _ in range(count)]
@@ -0,0 +1,74 @@
+# infrastructure/container.py
+from os import getenv
+from typing import Optional
+from aiogram import Bot
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from src.infrastructure.logging.logger_setup import *
+from src.infrastructure.repository.mariadb.user_repo import MariaUserRepository
+from src.services.telegram.reachability import UserReachability
+
+load_dotenv()
+
+
+class Container:
+    """Общие ресурсы приложения: один движок БД, один пул Redis и одна сессия Bot"""
+
+    def __init__(self):
+        self._repository: Optional[MariaUserRepository] = None
+        self._redis: Optional[aioredis.Redis] = None
+        self._reachability: Optional[UserReachability] = None
+        self.bot: Optional[Bot] = None
+
+    @property
+    def repository(self) -> MariaUserRepository:
+        if self._repository is None:
+            self._repository = MariaUserRepository()
+        return self._repository
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            max_connections = int(getenv('REDIS_MAX_CONNECTIONS', 50))
+            redis_url = getenv('REDIS_URL')
+            if redis_url:
+                pool = aioredis.ConnectionPool.from_url(
+                    redis_url, max_connections=max_connections, decode_responses=True
+                )
+            else:
+                pool = aioredis.ConnectionPool(
+                    host=getenv('REDIS_HOST', 'redis'),
+                    port=int(getenv('REDIS_PORT', 6379)),
+                    password=getenv('REDIS_PASSWORD'),
+                    max_connections=max_connections,
+                    decode_responses=True
+                )
+            self._redis = aioredis.Redis(connection_pool=pool)
+        return self._redis
+
+    @property
+    def reachability(self) -> UserReachability:
+        if self._reachability is None:
+            self._reachability = UserReachability(self.repository, self.redis)
+        return self._reachability
+
+    async def init_schema(self):
+        """Создает таблицы один раз при старте, вне обработки запросов"""
+        await self.repository.init_schema()
+
+    def workflow_data(self) -> dict:
+        """Зависимости, которые aiogram передает в обработчики по имени аргумента"""
+        return {
+            'repository': self.repository,
+            'redis': self.redis,
+            'reachability': self.reachability,
+        }
+
+    async def close(self):
+        if self._repository is not None:
+            await self._repository.close()
+        if self._redis is not None:
+            await self._redis.aclose()
+        if self.bot is not None:
+            await self.bot.session.close()
+        info('Container resources closed')
@@ -0,0 +1,186 @@
+# infrastructure/database/instrumentation.py
+import functools
+import inspect
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from os import getenv
+from dotenv import load_dotenv
+from sqlalchemy import event
+from src.infrastructure.logging.logger_setup import *
+
+load_dotenv()
+
+# Границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current_operation: ContextVar[str] = ContextVar('db_operation', default='-')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_PARAM_LIST_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+_VALUES_LIST_RE = re.compile(r'(\([^()]*\))(?:\s*,\s*\([^()]*\))+')
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+\b")
+
+
+@functools.lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Форма запроса без литералов и с схлопнутыми IN/VALUES-списками"""
+    shape = _WHITESPACE_RE.sub(' ', statement).strip()
+    shape = _LITERAL_RE.sub('?', shape)
+    shape = _PARAM_LIST_RE.sub('%s, ...', shape)
+    shape = _VALUES_LIST_RE.sub(r'\1, ...', shape)
+    return shape[:300]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def observe(self, elapsed_ms: float, rows: int = 0):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and elapsed_ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if rows > 0:
+            self.rows += rows
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 2),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 2),
+            'rows': self.rows,
+            'buckets': dict(zip([*map(str, LATENCY_BUCKETS_MS), 'inf'], self.buckets)),
+        }
+
+
+class QueryStats:
+    """Статистика SQL-запросов: гистограммы по форме запроса и методу репозитория, slow log"""
+
+    def __init__(self, slow_query_ms: float = 200.0, slow_log_size: int = 100):
+        self.slow_query_ms = slow_query_ms
+        self.statements: dict[str, LatencyHistogram] = {}
+        self.operations: dict[str, LatencyHistogram] = {}
+        self.pool_checkout = LatencyHistogram()
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    @classmethod
+    def from_env(cls) -> 'QueryStats':
+        return cls(
+            slow_query_ms=float(getenv('DB_SLOW_QUERY_MS', 200)),
+            slow_log_size=int(getenv('DB_SLOW_LOG_SIZE', 100)),
+        )
+
+    def attach(self, engine):
+        """Подключает хуки к движку (AsyncEngine или Engine)"""
+        sync_engine = getattr(engine, 'sync_engine', engine)
+        event.listen(sync_engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(sync_engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+        shape = statement_shape(statement)
+        operation = _current_operation.get()
+
+        self.statements.setdefault(shape, LatencyHistogram()).observe(elapsed_ms, rows)
+        self.operations.setdefault(operation, LatencyHistogram()).observe(elapsed_ms, rows)
+
+        if elapsed_ms >= self.slow_query_ms:
+            self.slow_queries.append({
+                'at': datetime.now().isoformat(timespec='seconds'),
+                'operation': operation,
+                'elapsed_ms': round(elapsed_ms, 2),
+                'rows': rows,
+                'statement': shape,
+            })
+            warn(f"Медленный запрос {elapsed_ms:.1f} мс [{operation}]: {shape}")
+
+    def record_checkout(self, elapsed_seconds: float):
+        self.pool_checkout.observe(elapsed_seconds * 1000)
+
+    def snapshot(self, top: int | None = None) -> dict:
+        def ranked(histograms: dict[str, LatencyHistogram]):
+            items = sorted(histograms.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return [{'name': name, **histogram.to_dict()} for name, histogram in items[:top]]
+
+        return {
+            'slow_query_ms': self.slow_query_ms,
+            'operations': ranked(self.operations),
+            'statements': ranked(self.statements),
+            'pool_checkout': self.pool_checkout.to_dict(),
+            'slow_queries': list(self.slow_queries),
+        }
+
+    def reset(self):
+        self.statements.clear()
+        self.operations.clear()
+        self.pool_checkout = LatencyHistogram()
+        self.slow_queries.clear()
+
+
+def track_operation(func):
+    """Помечает SQL-запросы внутри метода репозитория именем этого метода"""
+    name = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def gen_wrapper(*args, **kwargs):
+            # Имя операции выставляется только на время шага генератора, не на код потребителя
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    token = _current_operation.set(name)
+                    try:
+                        item = await generator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _current_operation.reset(token)
+                    yield item
+            finally:
+                await generator.aclose()
+        return gen_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_operation.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _current_operation.reset(token)
+    return wrapper
+
+
+query_stats = QueryStats.from_env()
@@ -1,5 +1,5 @@
 # infrastructure/database/models.py
-from sqlalchemy import Column, Integer, String, Boolean, JSON, BigInteger, Index, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, JSON, BigInteger, Index, DateTime, ForeignKey, true
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -17,13 +17,18 @@ class UserORM(Base):
     alert_config_specific = Column(JSON, default=[])
     language = Column(String(10), default='ru')
     premium_until = Column(DateTime, nullable=True)
+    # Пользователь заблокировал бота или удалил чат: исключается из рассылок до следующего /start
+    is_reachable = Column(Boolean, nullable=False, default=True, server_default=true())
+    blocked_at = Column(DateTime, nullable=True)
+    # Режим дайджеста: алерты копятся и приходят раз в digest_hours часов; NULL - мгновенная доставка
+    digest_hours = Column(Integer, nullable=True)
 
     __table_args__ = (
         Index('ix_users_telegram_id', 'telegram_id'),
-        Index('ix_users_alert_config_general', 'alert_config_general'),
-        Index('ix_users_alert_config_specific', 'alert_config_specific'),
         Index('ix_users_language', 'language'),
         Index('ix_users_is_admin', 'is_admin'),
+        Index('ix_users_premium_until', 'premium_until'),
+        Index('ix_users_is_reachable', 'is_reachable'),
     )
 
     def to_user_full(self):
@@ -42,4 +47,31 @@ class UserORM(Base):
                 alert_config_specific=self.alert_config_specific,
                 language=self.language
             )
-        )
\ No newline at end of file
+        )
+
+
+# create_all не добавляет колонки в существующие таблицы; эти ALTER идемпотентны в MariaDB
+SCHEMA_UPGRADES = (
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_reachable BOOLEAN NOT NULL DEFAULT 1",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked_at DATETIME NULL",
+    "CREATE INDEX IF NOT EXISTS ix_users_is_reachable ON users (is_reachable)",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS digest_hours INTEGER NULL",
+    "CREATE INDEX IF NOT EXISTS ix_users_premium_until ON users (premium_until)",
+)
+
+
+TAG_KIND_GENERAL = 'general'
+TAG_KIND_SPECIFIC = 'specific'
+
+
+class UserTagORM(Base):
+    """Инвертированный индекс тегов: какие пользователи подписаны на тег"""
+    __tablename__ = 'user_tags'
+
+    tag_normalized = Column(String(191), primary_key=True)
+    kind = Column(String(16), primary_key=True)
+    telegram_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        Index('ix_user_tags_telegram_id', 'telegram_id'),
+    )
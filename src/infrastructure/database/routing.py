@@ -0,0 +1,111 @@
+# infrastructure/database/routing.py
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.infrastructure.logging.logger_setup import *
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    healthy: bool = True
+    lag: float | None = None
+    last_error: str | None = None
+    checked_at: float = field(default=0.0)
+
+
+class EngineRouter:
+    """Выбирает движок для запроса: записи - на primary, чтения - на живые реплики без большого лага"""
+
+    def __init__(self, primary: AsyncEngine, replicas: list[Replica] | None = None, max_lag: float = 5.0,
+                 sticky_seconds: float = 5.0, health_interval: float = 5.0):
+        self.primary = primary
+        self.replicas = replicas or []
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.health_interval = health_interval
+        # Пользователи, недавно писавшие в БД: их чтения идут на primary, пока реплика не догонит
+        self._sticky: dict[int, float] = {}
+        self._round_robin = itertools.cycle(self.replicas) if self.replicas else None
+
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self.fallback_reads = 0
+
+    def mark_write(self, *telegram_ids: int):
+        if not self.replicas:
+            return
+        until = time.monotonic() + self.sticky_seconds
+        for telegram_id in telegram_ids:
+            self._sticky[telegram_id] = until
+        if len(self._sticky) > 100000:
+            now = time.monotonic()
+            self._sticky = {key: value for key, value in self._sticky.items() if value > now}
+
+    def is_sticky(self, telegram_id: int) -> bool:
+        until = self._sticky.get(telegram_id)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            del self._sticky[telegram_id]
+            return False
+        return True
+
+    def reader(self, *telegram_ids: int) -> AsyncEngine:
+        if not self.replicas or any(self.is_sticky(telegram_id) for telegram_id in telegram_ids):
+            self.primary_reads += 1
+            return self.primary
+        for _ in range(len(self.replicas)):
+            replica = next(self._round_robin)
+            if replica.healthy and replica.lag is not None and replica.lag <= self.max_lag:
+                self.replica_reads += 1
+                return replica.engine
+        # Все реплики недоступны или отстают
+        self.fallback_reads += 1
+        return self.primary
+
+    async def check_replica(self, replica: Replica):
+        try:
+            async with replica.engine.connect() as conn:
+                status = (await conn.execute(text("SHOW SLAVE STATUS"))).mappings().first()
+            lag = status.get('Seconds_Behind_Master') if status else None
+            replica.lag = float(lag) if lag is not None else None
+            replica.healthy = replica.lag is not None
+            replica.last_error = None if replica.healthy else 'replication is not running'
+        except Exception as e:
+            replica.healthy = False
+            replica.lag = None
+            replica.last_error = str(e)
+        replica.checked_at = time.monotonic()
+        if not replica.healthy:
+            warn(f"Реплика {replica.name} исключена из чтения: {replica.last_error}")
+
+    async def run_health_checks(self):
+        """Периодически проверяет доступность и лаг реплик"""
+        if not self.replicas:
+            return
+        info(f"Проверка реплик БД запущена: {[replica.name for replica in self.replicas]}")
+        while True:
+            await asyncio.gather(*(self.check_replica(replica) for replica in self.replicas))
+            await asyncio.sleep(self.health_interval)
+
+    def stats(self) -> dict:
+        return {
+            'replicas': [
+                {'name': replica.name, 'healthy': replica.healthy, 'lag': replica.lag, 'error': replica.last_error}
+                for replica in self.replicas
+            ],
+            'primary_reads': self.primary_reads,
+            'replica_reads': self.replica_reads,
+            'fallback_reads': self.fallback_reads,
+            'sticky_users': len(self._sticky),
+        }
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        await self.primary.dispose()
@@ -2,52 +2,37 @@ from faststream import FastStream, Context
 from faststream.redis import RedisBroker
 from os import getenv
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from src.infrastructure.logging.logger_setup import *
-from aiogram.exceptions import TelegramNotFound, TelegramBadRequest
 load_dotenv()
 
 redis_broker = RedisBroker(getenv('REDIS_URL'))
 faststream = FastStream(redis_broker)
 
-telegram_service = None
-
 class AlertMessage(BaseModel):
     user_id: int = Field(..., description="ID пользователя")
     text: str = Field(..., description="Текст сообщения для отправки")
+    priority: str = Field('medium', description="Приоритет новости от ИИ: high/medium/low")
+    premium: bool = Field(False, description="Премиум-пользователь")
 
 
-from aiogram.exceptions import TelegramBadRequest, TelegramNotFound
-
-
-@redis_broker.subscriber(stream='alerts')
-async def alerts_subscriber(message: AlertMessage):
-    info(f"Сообщение для пользователя {message.user_id} пришло из FastStream")
-
-    if telegram_service is None:
-        error("TelegramService не инициализирован!")
-        return
+class BroadcastMessage(BaseModel):
+    """Рассылка одной новости пачке пользователей; текст лежит в Redis под alert_news:{news_id}"""
+    news_id: str = Field(..., description="ID новости (ID записи stream news)")
+    user_ids: list[int] = Field(..., description="ID пользователей через запятую")
+    priority: str = Field('medium', description="Приоритет новости от ИИ: high/medium/low")
+    premium: bool = Field(False, description="Все пользователи пачки - премиум")
 
-    try:
-        success = await telegram_service.send_message(user_id=message.user_id, text=message.text)
-        if success:
-            info(f"Сообщение для пользователя {message.user_id} успешно отправлено")
-        else:
-            error(f"Сообщение для пользователя {message.user_id} не удалось отправить")
-
-    except TelegramBadRequest as e:
-        if "chat not found" in str(e).lower():
-            error(f"Пользователь {message.user_id} не найден заблокировал бота")
-            #   добавить логику очистки пользователя из БД
-        else:
-            error(f"Ошибка Telegram API для пользователя {message.user_id}: {e}")
+    @field_validator('user_ids', mode='before')
+    @classmethod
+    def split_user_ids(cls, value):
+        if isinstance(value, str):
+            return [user_id for user_id in value.split(',') if user_id]
+        return value
 
-    except TelegramNotFound as e:
-        error(f"Пользователь {message.user_id} не найден: {e}")
-        # пользователь не начинал диалог с ботом
 
-    except Exception as e:
-        error(f"Неожиданная ошибка при отправке пользователю {message.user_id}: {e}")
+# Stream alerts читает AlertsConsumer (src/infrastructure/streams/alerts_consumer.py) через consumer group:
+# записи AlertMessage (одиночные) и BroadcastMessage (рассылка одной новости пачке пользователей)
 
 
 @faststream.on_startup
@@ -59,10 +44,7 @@ async def on_shutdown():
     info("FastStream остановлен")
 
 
-async def run_faststream(service):
-    global telegram_service
-    telegram_service = service
-
+async def run_faststream():
     try:
         await faststream.run()
     except Exception as e:
@@ -1,6 +1,5 @@
 import logging
 import asyncio
-from aiogram import Bot
 from dotenv import load_dotenv
 from os import getenv
 
@@ -17,16 +16,14 @@ __all__ = [
 
 # Настройки
 ADMIN_ID = getenv('ADMIN_ID')
-BOT_TOKEN = getenv('TELEGRAM_BOT_TOKEN')
 
 TG = 5
 logging.addLevelName(TG, 'TG')
 
-bot = Bot(token=BOT_TOKEN)
 message_queue = asyncio.Queue()
 
 
-async def telegram_worker():
+async def telegram_worker(bot):
     while True:
         try:
             message = await message_queue.get()
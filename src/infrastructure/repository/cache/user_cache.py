@@ -0,0 +1,173 @@
+# infrastructure/repository/cache/user_cache.py
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from os import getenv
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from shared import UserFull
+from src.infrastructure.logging.logger_setup import *
+
+load_dotenv()
+
+INVALIDATE_ALL = '*'
+
+
+@dataclass
+class CachedUser:
+    user: UserFull
+    premium_until: datetime | None
+    expires_at: float
+
+
+class UserCache:
+    """In-process LRU+TTL кэш снимков UserFull по telegram_id"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0, redis_url: str | None = None,
+                 channel: str = 'user_cache_invalidate'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.channel = channel
+        self._entries: OrderedDict[int, CachedUser] = OrderedDict()
+        # Версии нужны, чтобы чтение из БД, начатое до инвалидации, не вернуло в кэш устаревшие данные.
+        # telegram_id -> (номер инвалидации, время); записи старше TTL удаляются, их номера поднимают _floor -
+        # версию пользователей без записи, поэтому чтение, начатое до удаленной инвалидации, в кэш не попадет
+        self._versions: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self._epoch = 0
+        self._instance_id = uuid.uuid4().hex
+        self._redis = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> 'UserCache':
+        redis_url = getenv('REDIS_URL') if getenv('USER_CACHE_PUBSUB', '0') == '1' else None
+        return cls(
+            maxsize=int(getenv('USER_CACHE_SIZE', 10000)),
+            ttl=float(getenv('USER_CACHE_TTL', 60)),
+            redis_url=redis_url,
+        )
+
+    def get(self, telegram_id: int) -> CachedUser | None:
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[telegram_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return entry
+
+    def version(self, telegram_id: int) -> tuple[int, int]:
+        """Версия записи; передается в put() после чтения из БД"""
+        entry = self._versions.get(telegram_id)
+        return self._epoch, entry[0] if entry is not None else self._floor
+
+    def put(self, user: UserFull, premium_until: datetime | None, version: tuple[int, int] | None = None):
+        telegram_id = user.telegram_id
+        if version is not None and version != self.version(telegram_id):
+            return
+        self._entries[telegram_id] = CachedUser(user, premium_until, time.monotonic() + self.ttl)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _drop(self, telegram_ids):
+        now = time.monotonic()
+        for telegram_id in telegram_ids:
+            self._entries.pop(telegram_id, None)
+            self._versions.pop(telegram_id, None)
+            self._clock += 1
+            self._versions[telegram_id] = (self._clock, now)
+            self.invalidations += 1
+        self._prune_versions(now)
+
+    def _prune_versions(self, now: float):
+        """Удаляет версии старше TTL: чтение из БД столько не длится"""
+        while self._versions:
+            telegram_id, (clock, invalidated_at) = next(iter(self._versions.items()))
+            if invalidated_at >= now - self.ttl:
+                break
+            del self._versions[telegram_id]
+            self._floor = max(self._floor, clock)
+
+    def _drop_all(self):
+        self._entries.clear()
+        self._versions.clear()
+        self._floor = 0
+        self._epoch += 1
+        self.invalidations += 1
+
+    async def invalidate(self, *telegram_ids: int):
+        """Удаляет записи локально и оповещает другие реплики"""
+        self._drop(telegram_ids)
+        await self._publish(','.join(str(telegram_id) for telegram_id in telegram_ids))
+
+    async def invalidate_all(self):
+        self._drop_all()
+        await self._publish(INVALIDATE_ALL)
+
+    async def _publish(self, payload: str):
+        if not self.redis_url or not payload:
+            return
+        try:
+            if self._redis is None:
+                self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            await self._redis.publish(self.channel, f'{self._instance_id}:{payload}')
+        except Exception as e:
+            error(f"Не удалось опубликовать инвалидацию кэша пользователей: {e}")
+
+    async def listen_invalidations(self):
+        """Слушает инвалидации от других реплик монолита"""
+        if not self.redis_url:
+            return
+        while True:
+            try:
+                if self._redis is None:
+                    self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                info(f"Подписка на инвалидации кэша пользователей: {self.channel}")
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    sender, _, payload = message['data'].partition(':')
+                    if sender == self._instance_id:
+                        continue
+                    if payload == INVALIDATE_ALL:
+                        self._drop_all()
+                    else:
+                        self._drop(int(telegram_id) for telegram_id in payload.split(',') if telegram_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error(f"Ошибка подписки на инвалидации кэша: {e}")
+                # Пока подписка недоступна, записи могли устареть
+                self._drop_all()
+                await asyncio.sleep(5)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'invalidations': self.invalidations,
+            'versions': len(self._versions),
+        }
+
+
+# Общий кэш процесса: все экземпляры репозитория должны видеть одни и те же инвалидации
+user_cache = UserCache.from_env()
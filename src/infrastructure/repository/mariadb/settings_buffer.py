@@ -0,0 +1,96 @@
+# infrastructure/repository/mariadb/settings_buffer.py
+import asyncio
+from itertools import islice
+from shared import UserSettingsDTO
+from src.infrastructure.logging.logger_setup import *
+
+
+class SettingsWriteBuffer:
+    """Write-behind буфер настроек: склеивает изменения одного пользователя за окно и пишет пачками"""
+
+    def __init__(self, repository, window: float = 0.5, max_batch: int = 500, max_pending: int = 10000):
+        self.repository = repository
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: dict[int, UserSettingsDTO] = {}
+        # Пачка, которая сейчас пишется в БД; нужна для read-your-writes до инвалидации кэша
+        self._inflight: dict[int, UserSettingsDTO] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+        self.staged = 0
+        self.coalesced = 0
+        self.written = 0
+
+    def pending(self, telegram_id: int) -> UserSettingsDTO | None:
+        """Последние незаписанные настройки пользователя, если они есть"""
+        return self._pending.get(telegram_id) or self._inflight.get(telegram_id)
+
+    def discard(self, telegram_id: int):
+        """Отбрасывает отложенную запись (пользователь целиком перезаписан другим путем)"""
+        self._pending.pop(telegram_id, None)
+
+    async def stage(self, telegram_id: int, settings: UserSettingsDTO):
+        self.staged += 1
+        if telegram_id in self._pending:
+            self.coalesced += 1
+        # Более новая версия заменяет предыдущую и переносится в конец очереди
+        self._pending.pop(telegram_id, None)
+        self._pending[telegram_id] = settings
+
+        if len(self._pending) >= self.max_pending:
+            # Ограничиваем память: пишем синхронно, пока буфер не разгрузится
+            await self.flush()
+        elif len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Пишет одну пачку (не больше max_batch пользователей)"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch = dict(islice(self._pending.items(), self.max_batch))
+            for telegram_id in batch:
+                del self._pending[telegram_id]
+            self._inflight = batch
+            try:
+                await self.repository._write_settings_batch(batch)
+                self.written += len(batch)
+                return len(batch)
+            except Exception as e:
+                error(f"Ошибка записи пачки настроек ({len(batch)} шт.): {e}")
+                # Возвращаем в очередь то, что не было перезаписано более новой версией
+                for telegram_id, settings in batch.items():
+                    self._pending.setdefault(telegram_id, settings)
+                raise
+            finally:
+                self._inflight = {}
+
+    async def flush_all(self):
+        while self._pending:
+            await self.flush()
+
+    async def run(self):
+        """Фоновый цикл: сбрасывает буфер раз в окно или при накоплении пачки"""
+        info(f"Write-behind буфер настроек запущен, окно {self.window} сек")
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(self.window)
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'staged': self.staged,
+            'coalesced': self.coalesced,
+            'written': self.written,
+        }
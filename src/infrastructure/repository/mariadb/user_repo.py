@@ -1,11 +1,22 @@
 # infrastructure/database/repositories/maria_user_repository.py
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
+from sqlalchemy import select, update, delete, insert, case, func, literal_column, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from shared import UserFull, UserSettingsDTO
-from src.infrastructure.database.models import UserORM, Base
+from src.infrastructure.database.models import (UserORM, UserTagORM, Base, TAG_KIND_GENERAL, TAG_KIND_SPECIFIC,
+                                                SCHEMA_UPGRADES)
+from src.infrastructure.database.instrumentation import QueryStats, query_stats, track_operation
+from src.infrastructure.database.routing import EngineRouter, Replica
+from src.infrastructure.repository.cache.user_cache import UserCache, CachedUser, user_cache
+from src.infrastructure.repository.mariadb.user_stream import UserFilter, UserRow, select_columns
+from src.infrastructure.repository.mariadb.settings_buffer import SettingsWriteBuffer
 from os import getenv
 from dotenv import load_dotenv
 from src.infrastructure.logging.logger_setup import *
+from src.services.tags.canonical import canonical_tags
+import time
 import datetime
 from datetime import timedelta
 
@@ -13,35 +24,145 @@ load_dotenv()
 
 
 class MariaUserRepository():
-    def __init__(self):
+    def __init__(self, cache: UserCache | None = None, stats: QueryStats | None = None,
+                 primary_dsn: str | None = None, replica_dsns: list[str] | None = None):
         # Получаем параметры подключения из переменных окружения
-        db_host = getenv('DB_HOST')
-        db_port = getenv('DB_PORT')
-        db_name = getenv('DB_NAME')
-        db_user = getenv('DB_USER')
-        db_password = getenv('DB_ROOT_PASSWORD')
+        if not primary_dsn:
+            primary_dsn = getenv('DB_PRIMARY_DSN')
+        if not primary_dsn:
+            db_host = getenv('DB_HOST')
+            db_port = getenv('DB_PORT')
+            db_name = getenv('DB_NAME')
+            db_user = getenv('DB_USER')
+            db_password = getenv('DB_ROOT_PASSWORD')
+            primary_dsn = f"mysql+asyncmy://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+        if not replica_dsns:
+            replica_dsns = [dsn.strip() for dsn in getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()]
 
-        # Создаем подключение к базе данных
-        connection_string = f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-        self.engine = create_engine(connection_string, echo=True)
+        # Латентность запросов, ожидание пула и slow log
+        self.stats = stats or query_stats
 
-        # Создаем таблицы, если они не существуют
-        Base.metadata.create_all(self.engine)
+        # Primary принимает записи; реплики - только чтения
+        self.engine = self._create_engine(primary_dsn)
+        replicas = []
+        for dsn in replica_dsns:
+            url = make_url(dsn)
+            replicas.append(Replica(name=f"{url.host}:{url.port or 3306}", engine=self._create_engine(dsn)))
+        self.router = EngineRouter(
+            self.engine,
+            replicas,
+            max_lag=float(getenv('DB_REPLICA_MAX_LAG', 5)),
+            sticky_seconds=float(getenv('DB_REPLICA_STICKY_SECONDS', 5)),
+            health_interval=float(getenv('DB_REPLICA_HEALTH_INTERVAL', 5)),
+        )
 
-        # Создаем сессию
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Фабрика сессий: отдельная короткая сессия на каждую операцию
+        self.session_factory = async_sessionmaker(expire_on_commit=False)
 
-    async def new_user(self, user: UserFull) -> bool:
+        # Read-through кэш пользователей, общий для всех экземпляров репозитория
+        self.cache = cache or user_cache
+
+        # Размер пачки для массовых операций (IN-списки и многострочные INSERT)
+        self.bulk_chunk_size = int(getenv('DB_BULK_CHUNK_SIZE', 1000))
+
+        # Опциональный write-behind буфер для set_settings
+        self.settings_buffer: SettingsWriteBuffer | None = None
+        if getenv('SETTINGS_WRITE_BEHIND', '0') == '1':
+            self.settings_buffer = SettingsWriteBuffer(
+                self,
+                window=float(getenv('SETTINGS_WRITE_WINDOW', 0.5)),
+                max_batch=int(getenv('SETTINGS_WRITE_MAX_BATCH', 500)),
+                max_pending=int(getenv('SETTINGS_WRITE_MAX_PENDING', 10000)),
+            )
+
+        # Подписчики на изменения пользователей (например, in-memory индекс тегов TagMatcher)
+        self.listeners: list = []
+
+    def _create_engine(self, dsn: str) -> AsyncEngine:
+        # Создаем асинхронный движок с пулом соединений
+        engine = create_async_engine(
+            dsn,
+            echo=getenv('DB_ECHO', '0') == '1',
+            pool_size=int(getenv('DB_POOL_SIZE', 10)),
+            max_overflow=int(getenv('DB_MAX_OVERFLOW', 20)),
+            pool_timeout=float(getenv('DB_POOL_TIMEOUT', 30)),
+            pool_recycle=int(getenv('DB_POOL_RECYCLE', 1800)),
+            pool_pre_ping=True,
+        )
+        self.stats.attach(engine)
+        return engine
+
+    async def init_schema(self):
+        """Создает таблицы, если они не существуют (вызывается при старте приложения)"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for statement in SCHEMA_UPGRADES:
+                await conn.execute(text(statement))
+
+    @asynccontextmanager
+    async def _session(self, read_only: bool = False, telegram_ids: tuple = ()) -> AsyncSession:
+        # Чтения уходят на реплику, если пользователь недавно не писал в БД
+        engine = self.router.reader(*telegram_ids) if read_only else self.engine
+        async with self.session_factory(bind=engine) as session:
+            # Явно берем соединение из пула, чтобы измерить время ожидания
+            started = time.perf_counter()
+            await session.connection()
+            self.stats.record_checkout(time.perf_counter() - started)
+            yield session
+
+    def add_listener(self, listener):
+        """Подписывает объект на события user_tags_changed, user_premium_changed, user_reachability_changed"""
+        self.listeners.append(listener)
+
+    def _notify(self, event: str, *args):
+        for listener in self.listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                error(f"Ошибка обработчика события {event}: {e}")
+
+    async def _after_write(self, *telegram_ids: int):
+        """После записи: чтения этих пользователей временно идут на primary, кэш сбрасывается"""
+        self.router.mark_write(*telegram_ids)
+        await self.cache.invalidate(*telegram_ids)
+
+    @staticmethod
+    def _tag_rows(telegram_id: int, general_tags, specific_tags) -> list[dict]:
+        return [
+            {'tag_normalized': tag, 'kind': kind, 'telegram_id': telegram_id}
+            for kind, tags in ((TAG_KIND_GENERAL, general_tags), (TAG_KIND_SPECIFIC, specific_tags))
+            for tag in canonical_tags(tags)
+        ]
+
+    async def _replace_user_tags(self, session: AsyncSession, users: dict[int, tuple], insert_only: bool = False):
+        """Перезаписывает индекс тегов пользователей в рамках текущей транзакции.
+
+        insert_only - пользователи только что созданы: старых строк нет (ON DELETE CASCADE), DELETE не нужен.
+        """
+        if not users:
+            return
+        if not insert_only:
+            await session.execute(delete(UserTagORM).where(UserTagORM.telegram_id.in_(list(users))))
+        rows = [
+            row
+            for telegram_id, (general_tags, specific_tags) in users.items()
+            for row in self._tag_rows(telegram_id, general_tags, specific_tags)
+        ]
+        if rows:
+            await session.execute(insert(UserTagORM), rows)
+
+    @track_operation
+    async def register_user(self, user: UserFull) -> bool | None:
+        """Атомарно регистрирует пользователя одним INSERT IGNORE.
+
+        Возвращает True, если пользователь создан, False - если уже существовал,
+        None - при ошибке базы данных.
+        """
         try:
-            # Проверяем, существует ли пользователь
-            existing_user = self.session.get(UserORM, user.telegram_id)
-            if existing_user:
-                warn(f"Пользователь с ID {user.telegram_id} уже существует")
-                return False
-
-            # Создаем новую ORM-запись
-            new_user = UserORM(
+            stmt = insert(UserORM).prefix_with('IGNORE').values(
                 telegram_id=user.telegram_id,
                 first_name=user.first_name,
                 username=user.username,
@@ -52,134 +173,490 @@ class MariaUserRepository():
                 alert_config_specific=user.alert_config_specific,
                 language=user.language
             )
+            async with self._session() as session:
+                result = await session.execute(stmt)
+                created = result.rowcount == 1
+                if created and (user.alert_config_general or user.alert_config_specific):
+                    await self._replace_user_tags(session, {
+                        user.telegram_id: (user.alert_config_general, user.alert_config_specific)
+                    }, insert_only=True)
+                await session.commit()
 
-            # Добавляем и сохраняем
-            self.session.add(new_user)
-            self.session.commit()
-            info(f"Создан новый пользователь: {user.telegram_id}")
-            return True
+            if created:
+                await self._after_write(user.telegram_id)
+                self._notify('user_tags_changed', user.telegram_id, user.alert_config_general,
+                             user.alert_config_specific)
+                self._notify('user_premium_changed', user.telegram_id, user.is_premium, None)
+                info(f"Создан новый пользователь: {user.telegram_id}")
+            return created
 
         except Exception as e:
-            error(f"Ошибка при создании пользователя: {e}")
-            self.session.rollback()
-            return False
+            error(f"Ошибка при регистрации пользователя {user.telegram_id}: {e}")
+            return None
 
+    @track_operation
+    async def new_user(self, user: UserFull) -> bool:
+        created = await self.register_user(user)
+        if created is False:
+            warn(f"Пользователь с ID {user.telegram_id} уже существует")
+        return bool(created)
+
+    async def _load_user(self, telegram_id: int):
+        """Читает пользователя из кэша, при промахе - из БД с заполнением кэша"""
+        cached = self.cache.get(telegram_id)
+        if cached:
+            return cached
+        version = self.cache.version(telegram_id)
+        async with self._session(read_only=True, telegram_ids=(telegram_id,)) as session:
+            user_orm = await session.get(UserORM, telegram_id)
+            if not user_orm:
+                return None
+            user = user_orm.to_user_full()
+            premium_until = user_orm.premium_until
+        self.cache.put(user, premium_until, version)
+        return CachedUser(user, premium_until, 0)
+
+    def _with_pending_settings(self, user: UserFull) -> UserFull:
+        """Накладывает еще не записанные настройки из write-behind буфера"""
+        if self.settings_buffer is None:
+            return user
+        settings = self.settings_buffer.pending(user.telegram_id)
+        if settings is None:
+            return user
+        return UserFull(user=user.user, settings=settings)
+
+    @track_operation
     async def get_user(self, telegram_id: int) -> UserFull | None:
         try:
             # Ищем пользователя по ID
-            user_orm = self.session.get(UserORM, telegram_id)
-            if user_orm:
-                return user_orm.to_user_full()
+            cached = await self._load_user(telegram_id)
+            if cached:
+                return self._with_pending_settings(cached.user)
             return None
         except Exception as e:
             error(f"Ошибка при получении пользователя {telegram_id}: {e}")
             return None
 
+    @track_operation
     async def set_settings(self, telegram_id: int, settings: UserSettingsDTO) -> bool:
         try:
-            # Ищем пользователя
-            user_orm = self.session.get(UserORM, telegram_id)
-            if not user_orm:
-                warn(f"Пользователь {telegram_id} не найден при обновлении настроек")
-                return False
-
-            # Обновляем настройки
-            user_orm.LLM_model = settings.LLM_model.value if hasattr(settings.LLM_model,
-                                                                     'value') else settings.LLM_model
-            user_orm.alert_config_general = settings.alert_config_general
-            user_orm.alert_config_specific = settings.alert_config_specific
-            user_orm.language = settings.language
-
-            # Сохраняем изменения
-            self.session.commit()
+            if self.settings_buffer is not None:
+                if not await self._load_user(telegram_id):
+                    warn(f"Пользователь {telegram_id} не найден при обновлении настроек")
+                    return False
+                await self.settings_buffer.stage(telegram_id, settings)
+                self._notify('user_tags_changed', telegram_id, settings.alert_config_general,
+                             settings.alert_config_specific)
+                return True
+
+            async with self._session() as session:
+                # Ищем пользователя
+                user_orm = await session.get(UserORM, telegram_id)
+                if not user_orm:
+                    warn(f"Пользователь {telegram_id} не найден при обновлении настроек")
+                    return False
+
+                # Обновляем настройки
+                user_orm.LLM_model = settings.LLM_model.value if hasattr(settings.LLM_model,
+                                                                         'value') else settings.LLM_model
+                user_orm.alert_config_general = settings.alert_config_general
+                user_orm.alert_config_specific = settings.alert_config_specific
+                user_orm.language = settings.language
+                await self._replace_user_tags(session, {
+                    telegram_id: (settings.alert_config_general, settings.alert_config_specific)
+                })
+
+                # Сохраняем изменения
+                await session.commit()
+            await self._after_write(telegram_id)
+            self._notify('user_tags_changed', telegram_id, settings.alert_config_general,
+                         settings.alert_config_specific)
             info(f"Настройки пользователя {telegram_id} обновлены")
             return True
 
         except Exception as e:
             error(f"Ошибка при обновлении настроек пользователя {telegram_id}: {e}")
-            self.session.rollback()
             return False
 
+    @track_operation
+    async def _write_settings_batch(self, batch: dict[int, UserSettingsDTO]):
+        """Пишет накопленные настройки одним executemany UPDATE по первичному ключу"""
+        rows = [
+            {
+                'telegram_id': telegram_id,
+                'LLM_model': settings.LLM_model.value if hasattr(settings.LLM_model, 'value') else settings.LLM_model,
+                'alert_config_general': settings.alert_config_general,
+                'alert_config_specific': settings.alert_config_specific,
+                'language': settings.language,
+            }
+            for telegram_id, settings in batch.items()
+        ]
+        async with self._session() as session:
+            await session.execute(update(UserORM), rows)
+            await self._replace_user_tags(session, {
+                telegram_id: (settings.alert_config_general, settings.alert_config_specific)
+                for telegram_id, settings in batch.items()
+            })
+            await session.commit()
+        await self._after_write(*batch)
+        info(f"Записаны настройки {len(batch)} пользователей")
+
+    @track_operation
     async def add_subscription_days(self, telegram_id: int, days: int) -> bool:
         try:
             from datetime import datetime
-            user_orm = self.session.get(UserORM, telegram_id)
-            if not user_orm:
-                warn(f"Пользователь {telegram_id} не найден при добавлении подписки")
-                return False
-
-            # Устанавливаем или обновляем дату окончания подписки
-            if user_orm.premium_until and user_orm.premium_until > datetime.now():
-                # Если подписка уже активна, добавляем дни к текущей дате
-                user_orm.premium_until += timedelta(days=days)
-            else:
-                # Если подписки нет или она истекла, устанавливаем новую дату
-                user_orm.premium_until = datetime.now() + timedelta(days=days)
-
-            user_orm.is_premium = True
-            self.session.commit()
+            async with self._session() as session:
+                user_orm = await session.get(UserORM, telegram_id)
+                if not user_orm:
+                    warn(f"Пользователь {telegram_id} не найден при добавлении подписки")
+                    return False
+
+                # Устанавливаем или обновляем дату окончания подписки
+                if user_orm.premium_until and user_orm.premium_until > datetime.now():
+                    # Если подписка уже активна, добавляем дни к текущей дате
+                    user_orm.premium_until += timedelta(days=days)
+                else:
+                    # Если подписки нет или она истекла, устанавливаем новую дату
+                    user_orm.premium_until = datetime.now() + timedelta(days=days)
+
+                user_orm.is_premium = True
+                premium_until = user_orm.premium_until
+                await session.commit()
+            await self._after_write(telegram_id)
+            self._notify('user_premium_changed', telegram_id, True, premium_until)
             info(f"Добавлено {days} дней подписки пользователю {telegram_id}")
             return True
         except Exception as e:
             error(f"Ошибка при добавлении подписки пользователю {telegram_id}: {e}")
-            self.session.rollback()
             return False
 
+    @track_operation
     async def delete_subscription(self, telegram_id: int) -> bool:
         # В этой реализации просто возвращаем True, так как в текущей модели нет поля для подписки
         info(f"Подписка пользователя {telegram_id} удалена")
         return True
 
 
+    @track_operation
     async def update_user(self, user: UserFull) -> bool:
         try:
-            user_orm = self.session.get(UserORM, user.telegram_id)
             from datetime import datetime, timedelta
-            if not user_orm:
-                warn(f"Пользователь {user.telegram_id} не найден при обновлении")
-                return False
-
-            # Обновляем поля
-            user_orm.first_name = user.first_name
-            user_orm.username = user.username
-            user_orm.is_premium = user.is_premium
-            user_orm.is_admin = user.is_admin
-            user_orm.LLM_model = user.LLM_model.value if hasattr(user.LLM_model, 'value') else user.LLM_model
-            user_orm.alert_config_general = user.alert_config_general
-            user_orm.alert_config_specific = user.alert_config_specific
-            user_orm.language = user.language
-
-            # Устанавливаем дату окончания подписки (30 дней с момента оплаты)
-            if user.is_premium and not user_orm.premium_until:
-                user_orm.premium_until = datetime.now() + timedelta(days=30)
-
-            self.session.commit()
+            if self.settings_buffer is not None:
+                # Полная запись пользователя уже содержит актуальные настройки
+                self.settings_buffer.discard(user.telegram_id)
+            async with self._session() as session:
+                user_orm = await session.get(UserORM, user.telegram_id)
+                if not user_orm:
+                    warn(f"Пользователь {user.telegram_id} не найден при обновлении")
+                    return False
+
+                # Обновляем поля
+                user_orm.first_name = user.first_name
+                user_orm.username = user.username
+                user_orm.is_premium = user.is_premium
+                user_orm.is_admin = user.is_admin
+                user_orm.LLM_model = user.LLM_model.value if hasattr(user.LLM_model, 'value') else user.LLM_model
+                user_orm.alert_config_general = user.alert_config_general
+                user_orm.alert_config_specific = user.alert_config_specific
+                user_orm.language = user.language
+                await self._replace_user_tags(session, {
+                    user.telegram_id: (user.alert_config_general, user.alert_config_specific)
+                })
+
+                # Устанавливаем дату окончания подписки (30 дней с момента оплаты)
+                if user.is_premium and not user_orm.premium_until:
+                    user_orm.premium_until = datetime.now() + timedelta(days=30)
+                premium_until = user_orm.premium_until
+
+                await session.commit()
+            await self._after_write(user.telegram_id)
+            self._notify('user_tags_changed', user.telegram_id, user.alert_config_general,
+                         user.alert_config_specific)
+            self._notify('user_premium_changed', user.telegram_id, user.is_premium, premium_until)
             info(f"Данные пользователя {user.telegram_id} обновлены")
             return True
 
         except Exception as e:
             error(f"Ошибка при обновлении пользователя {user.telegram_id}: {e}")
-            self.session.rollback()
             return False
 
+    @track_operation
     async def check_subscription_status(self, telegram_id: int) -> bool:
-        """Проверяет статус подписки пользователя"""
+        """Проверяет статус подписки пользователя (только чтение)"""
         try:
             from datetime import datetime
-            user_orm = self.session.get(UserORM, telegram_id)
-            if user_orm and user_orm.is_premium and user_orm.premium_until:
-                # Проверяем, не истекла ли подписка (используем UTC)
-                if user_orm.premium_until < datetime.now():
-                    user_orm.is_premium = False
-                    self.session.commit()
-                    return False
-                return True
+            cached = await self._load_user(telegram_id)
+            if cached and cached.user.is_premium and cached.premium_until:
+                # Флаг is_premium снимает фоновый sweeper, поэтому дату проверяем сами
+                return cached.premium_until >= datetime.now()
             return False
         except Exception as e:
             error(f"Ошибка при проверке статуса подписки: {e}")
             return False
 
-    def __del__(self):
-        # Закрываем сессию при уничтожении объекта
-        if hasattr(self, 'session'):
-            self.session.close()
\ No newline at end of file
+    @track_operation
+    async def expire_subscriptions(self) -> int:
+        """Снимает премиум с истекших подписок; из кэша выбывают только их пользователи"""
+        is_expired = (UserORM.premium_until < func.now(), UserORM.is_premium.is_(True))
+        async with self._session() as session:
+            result = await session.execute(select(UserORM.telegram_id).where(*is_expired))
+            telegram_ids = list(result.scalars())
+        expired = 0
+        for chunk in self._chunks(telegram_ids):
+            # Условие повторяется: подписку могли продлить между SELECT и UPDATE
+            stmt = (
+                update(UserORM)
+                .where(UserORM.telegram_id.in_(chunk), *is_expired)
+                .values(is_premium=False)
+                .execution_options(synchronize_session=False)
+            )
+            async with self._session() as session:
+                result = await session.execute(stmt)
+                await session.commit()
+            expired += result.rowcount
+            await self._after_write(*chunk)
+        return expired
+
+    @track_operation
+    async def set_reachable(self, telegram_id: int, reachable: bool) -> bool:
+        """Помечает пользователя доступным или недоступным для рассылок; True, если флаг изменился"""
+        try:
+            stmt = (
+                update(UserORM)
+                .where(UserORM.telegram_id == telegram_id, UserORM.is_reachable.is_(not reachable))
+                .values(is_reachable=reachable, blocked_at=None if reachable else func.now())
+                .execution_options(synchronize_session=False)
+            )
+            async with self._session() as session:
+                result = await session.execute(stmt)
+                await session.commit()
+            if result.rowcount:
+                await self._after_write(telegram_id)
+                self._notify('user_reachability_changed', telegram_id, reachable)
+            return result.rowcount > 0
+        except Exception as e:
+            error(f"Ошибка при изменении доступности пользователя {telegram_id}: {e}")
+            return False
+
+    @track_operation
+    async def set_digest_hours(self, telegram_id: int, hours: int | None) -> bool:
+        """Включает дайджест раз в hours часов или мгновенную доставку (None)"""
+        try:
+            stmt = (
+                update(UserORM)
+                .where(UserORM.telegram_id == telegram_id)
+                .values(digest_hours=hours)
+                .execution_options(synchronize_session=False)
+            )
+            async with self._session() as session:
+                result = await session.execute(stmt)
+                await session.commit()
+            await self._after_write(telegram_id)
+            return result.rowcount > 0
+        except Exception as e:
+            error(f"Ошибка при изменении режима дайджеста пользователя {telegram_id}: {e}")
+            return False
+
+    def _chunks(self, items: list, chunk_size: int | None = None):
+        chunk_size = chunk_size or self.bulk_chunk_size
+        for i in range(0, len(items), chunk_size):
+            yield items[i:i + chunk_size]
+
+    @track_operation
+    async def get_users(self, telegram_ids: list[int], chunk_size: int | None = None) -> list[UserFull]:
+        """Возвращает пользователей по списку ID: из кэша и одним IN-запросом на пачку"""
+        try:
+            users = []
+            missing = []
+            for telegram_id in dict.fromkeys(telegram_ids):
+                cached = self.cache.get(telegram_id)
+                if cached:
+                    users.append(self._with_pending_settings(cached.user))
+                else:
+                    missing.append(telegram_id)
+
+            for chunk in self._chunks(missing, chunk_size):
+                versions = {telegram_id: self.cache.version(telegram_id) for telegram_id in chunk}
+                async with self._session(read_only=True, telegram_ids=tuple(chunk)) as session:
+                    result = await session.execute(select(UserORM).where(UserORM.telegram_id.in_(chunk)))
+                    for user_orm in result.scalars():
+                        user = user_orm.to_user_full()
+                        self.cache.put(user, user_orm.premium_until, versions[user_orm.telegram_id])
+                        users.append(self._with_pending_settings(user))
+            return users
+        except Exception as e:
+            error(f"Ошибка при получении пользователей ({len(telegram_ids)} шт.): {e}")
+            return []
+
+    @track_operation
+    async def add_subscription_days_bulk(self, telegram_ids: list[int], days: int,
+                                         chunk_size: int | None = None) -> int:
+        """Продлевает подписку сразу многим пользователям; возвращает число обновленных строк"""
+        telegram_ids = list(dict.fromkeys(telegram_ids))
+        # Активную подписку продлеваем от даты окончания, истекшую - от текущего момента
+        now = func.now()
+        premium_until = case(
+            (UserORM.premium_until > now,
+             func.timestampadd(literal_column('DAY'), days, UserORM.premium_until)),
+            else_=func.timestampadd(literal_column('DAY'), days, now),
+        )
+        updated = 0
+        try:
+            for chunk in self._chunks(telegram_ids, chunk_size):
+                stmt = (
+                    update(UserORM)
+                    .where(UserORM.telegram_id.in_(chunk))
+                    .values(premium_until=premium_until, is_premium=True)
+                    .execution_options(synchronize_session=False)
+                )
+                async with self._session() as session:
+                    result = await session.execute(stmt)
+                    await session.commit()
+                updated += result.rowcount
+                await self._after_write(*chunk)
+                for telegram_id in chunk:
+                    # Новая дата окончания вычислена в БД; до пересборки подписчики считают подписку активной
+                    self._notify('user_premium_changed', telegram_id, True, None)
+            info(f"Добавлено {days} дней подписки {updated} пользователям")
+            return updated
+        except Exception as e:
+            error(f"Ошибка при массовом добавлении подписки (обновлено {updated}): {e}")
+            return updated
+
+    @track_operation
+    async def upsert_users(self, users: list[UserFull], chunk_size: int | None = None) -> int:
+        """Создает или обновляет пользователей через INSERT ... ON DUPLICATE KEY UPDATE"""
+        processed = 0
+        try:
+            for chunk in self._chunks(users, chunk_size):
+                if self.settings_buffer is not None:
+                    for user in chunk:
+                        self.settings_buffer.discard(user.telegram_id)
+                rows = [
+                    {
+                        'telegram_id': user.telegram_id,
+                        'first_name': user.first_name,
+                        'username': user.username,
+                        'is_premium': user.is_premium,
+                        'is_admin': user.is_admin,
+                        'LLM_model': user.LLM_model.value if hasattr(user.LLM_model, 'value') else user.LLM_model,
+                        'alert_config_general': user.alert_config_general,
+                        'alert_config_specific': user.alert_config_specific,
+                        'language': user.language,
+                    }
+                    for user in chunk
+                ]
+                stmt = mysql_insert(UserORM).values(rows)
+                stmt = stmt.on_duplicate_key_update({
+                    column: stmt.inserted[column]
+                    for column in rows[0]
+                    if column != 'telegram_id'
+                })
+                async with self._session() as session:
+                    await session.execute(stmt)
+                    await self._replace_user_tags(session, {
+                        user.telegram_id: (user.alert_config_general, user.alert_config_specific)
+                        for user in chunk
+                    })
+                    await session.commit()
+                processed += len(chunk)
+                await self._after_write(*(user.telegram_id for user in chunk))
+                for user in chunk:
+                    self._notify('user_tags_changed', user.telegram_id, user.alert_config_general,
+                                 user.alert_config_specific)
+                    self._notify('user_premium_changed', user.telegram_id, user.is_premium, None)
+            info(f"Сохранено {processed} пользователей")
+            return processed
+        except Exception as e:
+            error(f"Ошибка при массовом сохранении пользователей (сохранено {processed}): {e}")
+            return processed
+
+    @track_operation
+    async def iter_users(self, user_filter: UserFilter | None = None, batch_size: int = 1000,
+                         columns: tuple[str, ...] = ()):
+        """Потоково обходит пользователей с keyset-пагинацией по telegram_id (без фильтра - только доступных)"""
+        user_filter = user_filter or UserFilter()
+        selected = select_columns(columns)
+        last_id = 0
+        while True:
+            stmt = (
+                select(*selected)
+                .where(UserORM.telegram_id > last_id)
+                .order_by(UserORM.telegram_id)
+                .limit(batch_size)
+            )
+            stmt = user_filter.apply(stmt)
+            async with self._session(read_only=True) as session:
+                rows = (await session.execute(stmt)).mappings().all()
+            if not rows:
+                return
+            for row in rows:
+                yield UserRow(dict(row))
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]['telegram_id']
+
+    @track_operation
+    async def find_users_by_tags(self, tags: list[str], kind: str | None = None,
+                                 reachable_only: bool = True) -> list[int]:
+        """Возвращает ID пользователей, у которых есть хотя бы один из тегов (индексный поиск)"""
+        normalized = canonical_tags(tags)
+        if not normalized:
+            return []
+        try:
+            telegram_ids = set()
+            for chunk in self._chunks(normalized):
+                stmt = select(UserTagORM.telegram_id).where(UserTagORM.tag_normalized.in_(chunk)).distinct()
+                if kind:
+                    stmt = stmt.where(UserTagORM.kind == kind)
+                if reachable_only:
+                    stmt = stmt.join(UserORM, UserORM.telegram_id == UserTagORM.telegram_id).where(
+                        UserORM.is_reachable.is_(True)
+                    )
+                async with self._session(read_only=True) as session:
+                    result = await session.execute(stmt)
+                    telegram_ids.update(result.scalars())
+            return sorted(telegram_ids)
+        except Exception as e:
+            error(f"Ошибка при поиске пользователей по тегам: {e}")
+            return []
+
+    @track_operation
+    async def rebuild_tag_index(self, chunk_size: int | None = None) -> int:
+        """Заполняет user_tags из JSON-колонок users (для существующих данных)"""
+        chunk_size = chunk_size or self.bulk_chunk_size
+        last_id = 0
+        processed = 0
+        while True:
+            stmt = (
+                select(UserORM.telegram_id, UserORM.alert_config_general, UserORM.alert_config_specific)
+                .where(UserORM.telegram_id > last_id)
+                .order_by(UserORM.telegram_id)
+                .limit(chunk_size)
+            )
+            async with self._session() as session:
+                rows = (await session.execute(stmt)).all()
+                if not rows:
+                    break
+                await self._replace_user_tags(session, {
+                    row.telegram_id: (row.alert_config_general, row.alert_config_specific)
+                    for row in rows
+                })
+                await session.commit()
+            processed += len(rows)
+            last_id = rows[-1].telegram_id
+        info(f"Индекс тегов перестроен для {processed} пользователей")
+        return processed
+
+    async def tag_table_published(self):
+        """Словарь тегов изменился (TagCanonicalizer): user_tags хранит прежние канонические формы"""
+        await self.rebuild_tag_index()
+
+    async def close(self):
+        """Дописывает отложенные настройки и закрывает все соединения пула"""
+        if self.settings_buffer is not None:
+            try:
+                await self.settings_buffer.flush_all()
+            except Exception as e:
+                error(f"Не удалось записать отложенные настройки при остановке: {e}")
+        await self.router.dispose()
@@ -0,0 +1,67 @@
+# infrastructure/repository/mariadb/user_stream.py
+import json
+from dataclasses import dataclass
+from sqlalchemy import Text, type_coerce
+from src.infrastructure.database.models import UserORM
+
+# JSON-колонки выбираются как текст и декодируются только при обращении
+JSON_COLUMNS = ('alert_config_general', 'alert_config_specific')
+
+
+@dataclass
+class UserFilter:
+    """Условия отбора пользователей для потокового обхода"""
+    is_premium: bool | None = None
+    is_admin: bool | None = None
+    language: str | None = None
+    # По умолчанию недоступные пользователи (заблокировали бота) в обход не попадают
+    is_reachable: bool | None = True
+    has_digest: bool | None = None
+
+    def apply(self, stmt):
+        if self.is_premium is not None:
+            stmt = stmt.where(UserORM.is_premium.is_(self.is_premium))
+        if self.is_admin is not None:
+            stmt = stmt.where(UserORM.is_admin.is_(self.is_admin))
+        if self.language is not None:
+            stmt = stmt.where(UserORM.language == self.language)
+        if self.is_reachable is not None:
+            stmt = stmt.where(UserORM.is_reachable.is_(self.is_reachable))
+        if self.has_digest is not None:
+            stmt = stmt.where(UserORM.digest_hours.is_not(None) if self.has_digest else UserORM.digest_hours.is_(None))
+        return stmt
+
+
+class UserRow:
+    """Легкая строка пользователя с ленивым разбором JSON-тегов"""
+    __slots__ = ('_data',)
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        if name in JSON_COLUMNS and not isinstance(value, list):
+            value = json.loads(value) if value else []
+            self._data[name] = value
+        return value
+
+    def __repr__(self):
+        return f"UserRow(telegram_id={self._data.get('telegram_id')})"
+
+
+def select_columns(columns) -> list:
+    """Собирает список колонок для SELECT; telegram_id нужен всегда для пагинации"""
+    names = dict.fromkeys(('telegram_id', *(columns or ())))
+    selected = []
+    for name in names:
+        if name not in UserORM.__table__.columns:
+            raise ValueError(f"Неизвестная колонка users: {name}")
+        column = getattr(UserORM, name)
+        if name in JSON_COLUMNS:
+            column = type_coerce(column, Text).label(name)
+        selected.append(column)
+    return selected
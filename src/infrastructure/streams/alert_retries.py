@@ -0,0 +1,212 @@
+# infrastructure/streams/alert_retries.py
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime
+from os import getenv
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from aiogram.exceptions import (TelegramBadRequest, TelegramNotFound, TelegramForbiddenError,
+                                TelegramRetryAfter, TelegramNetworkError, TelegramServerError)
+from src.infrastructure.logging.logger_setup import *
+from src.services.telegram.reachability import UNREACHABLE_REASONS
+from src.services.telegram.delivery_scheduler import LANE_MEDIUM, LANE_PREMIUM
+
+load_dotenv()
+
+ALERTS_STREAM = 'alerts'
+RETRY_KEY = 'alerts_retry'
+DEAD_STREAM = 'alerts_dead'
+
+# Атомарно забирает из sorted set записи, время повтора которых наступило
+POP_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+def classify_error(e: BaseException) -> tuple[bool, str]:
+    """Возвращает (временная ли ошибка, код причины)"""
+    if isinstance(e, TelegramRetryAfter):
+        return True, 'retry_after'
+    if isinstance(e, (TelegramNetworkError, asyncio.TimeoutError, ConnectionError)):
+        return True, 'network'
+    if isinstance(e, TelegramServerError):
+        return True, 'server_error'
+    if isinstance(e, TelegramForbiddenError):
+        return False, 'forbidden'
+    if isinstance(e, TelegramNotFound):
+        return False, 'not_found'
+    if isinstance(e, TelegramBadRequest):
+        if "chat not found" in str(e).lower():
+            return False, 'chat_not_found'
+        return False, 'bad_request'
+    return True, 'unknown'
+
+
+async def replay_dead_letters(redis: aioredis.Redis, count: int = 100,
+                              stream: str = ALERTS_STREAM, dead_stream: str = DEAD_STREAM) -> int:
+    """Возвращает записи из dead-letter stream обратно в основной stream с прежней полосой доставки"""
+    entries = await redis.xrange(dead_stream, count=count)
+    if not entries:
+        return 0
+    async with redis.pipeline(transaction=True) as pipe:
+        for _, fields in entries:
+            # Полоса восстанавливается из priority/premium через lane_for в AlertsConsumer
+            lane = fields.get('lane', LANE_MEDIUM)
+            premium = lane == LANE_PREMIUM
+            pipe.xadd(stream, {
+                'user_id': fields['user_id'],
+                'text': fields['text'],
+                'priority': LANE_MEDIUM if premium else lane,
+                'premium': 'true' if premium else 'false',
+            })
+        pipe.xdel(dead_stream, *(message_id for message_id, _ in entries))
+        await pipe.execute()
+    info(f"Из {dead_stream} в {stream} возвращено {len(entries)} записей")
+    return len(entries)
+
+
+class AlertRetryQueue:
+    """Отложенные повторы через sorted set и dead-letter stream для исчерпавших попытки"""
+
+    def __init__(self, redis: aioredis.Redis, scheduler, max_attempts: int = 5, base_delay: float = 5.0,
+                 max_delay: float = 900.0, concurrency: int = 10, poll_interval: float = 1.0,
+                 dead_maxlen: int = 10000, reachability=None):
+        self.redis = redis
+        self.scheduler = scheduler
+        # UserReachability: заблокировавшие бота помечаются недоступными вместо dead-letter
+        self.reachability = reachability
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.dead_maxlen = dead_maxlen
+        # Повторы идут отдельной полосой с ограниченной конкурентностью, чтобы не вытеснять свежие алерты
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._pop_due = redis.register_script(POP_DUE_SCRIPT)
+        self._tasks: set[asyncio.Task] = set()
+
+        self.scheduled = 0
+        self.retried = 0
+        self.dead = 0
+
+    @classmethod
+    def from_env(cls, redis: aioredis.Redis, scheduler, reachability=None) -> 'AlertRetryQueue':
+        return cls(
+            redis,
+            scheduler,
+            reachability=reachability,
+            max_attempts=int(getenv('ALERTS_RETRY_MAX_ATTEMPTS', 5)),
+            base_delay=float(getenv('ALERTS_RETRY_BASE_DELAY', 5)),
+            max_delay=float(getenv('ALERTS_RETRY_MAX_DELAY', 900)),
+            concurrency=int(getenv('ALERTS_RETRY_CONCURRENCY', 10)),
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def handle_failure(self, user_id: int, text: str, e: BaseException, attempts: int = 1,
+                             lane: str = LANE_MEDIUM):
+        """Откладывает повтор временной ошибки или отправляет запись в dead-letter stream"""
+        transient, reason = classify_error(e)
+        if not transient and self.reachability is not None and reason in UNREACHABLE_REASONS:
+            await self.reachability.mark_unreachable(user_id, reason)
+            return
+        if transient and attempts < self.max_attempts:
+            await self.schedule(user_id, text, attempts, reason, lane)
+        else:
+            if transient:
+                reason = f'{reason}_max_attempts'
+            await self.dead_letter(user_id, text, attempts, reason, str(e), lane)
+
+    async def schedule(self, user_id: int, text: str, attempts: int, reason: str, lane: str = LANE_MEDIUM):
+        payload = json.dumps({
+            'id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'text': text,
+            'attempts': attempts,
+            'reason': reason,
+            'lane': lane,
+        }, ensure_ascii=False)
+        delay = self._backoff(attempts)
+        await self.redis.zadd(RETRY_KEY, {payload: time.time() + delay})
+        self.scheduled += 1
+        warn(f"Повтор отправки пользователю {user_id} через {delay:.0f} сек (попытка {attempts}, {reason})")
+
+    async def dead_letter(self, user_id: int, text: str, attempts: int, reason: str, detail: str = '',
+                          lane: str = LANE_MEDIUM):
+        await self.redis.xadd(DEAD_STREAM, {
+            'user_id': str(user_id),
+            'text': text,
+            'lane': lane,
+            'attempts': str(attempts),
+            'reason': reason,
+            'detail': detail[:500],
+            'failed_at': datetime.now().isoformat(timespec='seconds'),
+        }, maxlen=self.dead_maxlen, approximate=True)
+        self.dead += 1
+        error(f"Алерт для пользователя {user_id} отправлен в {DEAD_STREAM}: {reason}")
+
+    async def _retry(self, item: dict):
+        lane = item.get('lane', LANE_MEDIUM)
+        try:
+            await self.scheduler.send(item['user_id'], item['text'], lane)
+            info(f"Повторная отправка пользователю {item['user_id']} успешна (попытка {item['attempts'] + 1})")
+        except asyncio.CancelledError:
+            # Не теряем повтор при остановке
+            await self.schedule(item['user_id'], item['text'], item['attempts'], item['reason'], lane)
+            raise
+        except Exception as e:
+            await self.handle_failure(item['user_id'], item['text'], e, item['attempts'] + 1, lane)
+        finally:
+            self._slots.release()
+
+    async def run(self):
+        info(f"Очередь повторов алертов запущена, максимум попыток: {self.max_attempts}")
+        while True:
+            try:
+                # Из sorted set забираем не больше, чем свободных слотов: забранный, но не запущенный
+                # повтор при остановке или падении процесса потерялся бы
+                await self._slots.acquire()
+                items = []
+                try:
+                    free = max(1, self.concurrency - len(self._tasks))
+                    items = await self._pop_due(keys=[RETRY_KEY], args=[time.time(), free])
+                finally:
+                    if not items:
+                        self._slots.release()
+                for index, raw in enumerate(items):
+                    if index:
+                        # Слот свободен: задачи освобождают слот раньше, чем выбывают из _tasks
+                        await self._slots.acquire()
+                    task = asyncio.create_task(self._retry(json.loads(raw)))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    self.retried += 1
+                if items:
+                    continue
+            except asyncio.CancelledError:
+                for task in self._tasks:
+                    task.cancel()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+                raise
+            except Exception as e:
+                error(f"Ошибка обработки очереди повторов: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def stats(self) -> dict:
+        return {
+            'scheduled': self.scheduled,
+            'retried': self.retried,
+            'dead': self.dead,
+            'retry_backlog': await self.redis.zcard(RETRY_KEY),
+            'dead_backlog': await self.redis.xlen(DEAD_STREAM),
+        }
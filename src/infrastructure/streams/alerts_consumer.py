@@ -0,0 +1,283 @@
+# infrastructure/streams/alerts_consumer.py
+import asyncio
+import os
+import socket
+from os import getenv
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from redis.exceptions import ResponseError
+from aiogram.exceptions import TelegramBadRequest, TelegramNotFound, TelegramForbiddenError
+from pydantic import ValidationError
+from src.infrastructure.faststream.alerts import AlertMessage, BroadcastMessage
+from src.infrastructure.streams.news_bodies import NewsBodyCache
+from src.services.telegram.delivery_scheduler import lane_for
+from src.infrastructure.logging.logger_setup import *
+
+load_dotenv()
+
+# Ошибки, при которых повторная отправка бессмысленна
+PERMANENT_ERRORS = (TelegramBadRequest, TelegramNotFound, TelegramForbiddenError)
+
+
+def log_delivery_error(user_id: int, e: BaseException):
+    if isinstance(e, TelegramBadRequest):
+        if "chat not found" in str(e).lower():
+            error(f"Пользователь {user_id} не найден заблокировал бота")
+        else:
+            error(f"Ошибка Telegram API для пользователя {user_id}: {e}")
+    elif isinstance(e, (TelegramNotFound, TelegramForbiddenError)):
+        error(f"Пользователь {user_id} недоступен: {e}")
+    else:
+        error(f"Неожиданная ошибка при отправке пользователю {user_id}: {e}")
+
+
+class AlertsConsumer:
+    """Читает stream alerts через consumer group: несколько воркеров, ack после отправки, XAUTOCLAIM зависших.
+
+    Запись - либо одиночный алерт (user_id, text), либо рассылка (news_id, user_ids) с текстом в Redis.
+    """
+
+    def __init__(self, redis: aioredis.Redis, scheduler, stream: str = 'alerts', group: str = 'monolith',
+                 consumer: str | None = None, workers: int = 4, batch_size: int = 50,
+                 claim_idle_ms: int = 60000, claim_interval: float = 30.0, retries=None, reachability=None,
+                 digest=None, news_cache_size: int = 256, batch_alerts: int = 500):
+        self.redis = redis
+        self.scheduler = scheduler
+        # AlertRetryQueue: неудачные отправки уходят в отложенные повторы или dead-letter, не блокируя stream
+        self.retries = retries
+        # UserReachability: алерты недоступным пользователям подтверждаются без отправки
+        self.reachability = reachability
+        # AlertDigest: алерты пользователей в режиме дайджеста откладываются в Redis
+        self.digest = digest
+        self.news_bodies = NewsBodyCache(redis, news_cache_size)
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.workers = workers
+        self.batch_size = batch_size
+        # Запись-рассылка разворачивается в десятки алертов: пачка ограничивается и числом алертов,
+        # чтобы ее отправка укладывалась в claim_idle_ms
+        self.batch_alerts = batch_alerts
+        self._alerts_per_entry = 1.0
+        self.claim_idle_ms = claim_idle_ms
+        self.claim_interval = claim_interval
+        # Записи, которые сейчас обрабатываются: heartbeat сбрасывает им idle, чтобы XAUTOCLAIM их не забрал
+        self._in_flight: set[str] = set()
+
+        self.acked = 0
+        self.failed = 0
+        self.reclaimed = 0
+        self.deferred = 0
+
+    @classmethod
+    def from_env(cls, redis: aioredis.Redis, scheduler, retries=None, reachability=None,
+                 digest=None) -> 'AlertsConsumer':
+        return cls(
+            redis,
+            scheduler,
+            retries=retries,
+            reachability=reachability,
+            digest=digest,
+            group=getenv('ALERTS_GROUP', 'monolith'),
+            consumer=getenv('ALERTS_CONSUMER_NAME') or None,
+            workers=int(getenv('ALERTS_WORKERS', 4)),
+            batch_size=int(getenv('ALERTS_BATCH_SIZE', 50)),
+            claim_idle_ms=int(getenv('ALERTS_CLAIM_IDLE_MS', 60000)),
+            claim_interval=float(getenv('ALERTS_CLAIM_INTERVAL', 30)),
+            news_cache_size=int(getenv('ALERTS_NEWS_CACHE_SIZE', 256)),
+            batch_alerts=int(getenv('ALERTS_BATCH_ALERTS', 500)),
+        )
+
+    async def _ensure_group(self):
+        try:
+            # Группа начинает с новых записей: прежний подписчик читал stream без группы и не удалял
+            # записи, доставка с '0' разослала бы всю историю повторно
+            await self.redis.xgroup_create(self.stream, self.group, id='$', mkstream=True)
+            info(f"Создана группа {self.group} для stream {self.stream}")
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def _ack(self, message_ids: list[str]):
+        if not message_ids:
+            return
+        # Подтвержденные записи удаляем, чтобы stream не рос в памяти Redis
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xack(self.stream, self.group, *message_ids)
+            pipe.xdel(self.stream, *message_ids)
+            await pipe.execute()
+        self.acked += len(message_ids)
+
+    async def _expand(self, fields: dict) -> list[AlertMessage]:
+        """Разворачивает запись stream в алерты: рассылка (news_id, user_ids) или одиночный (user_id, text)"""
+        if 'news_id' in fields:
+            broadcast = BroadcastMessage.model_validate(fields)
+            text = await self.news_bodies.get(broadcast.news_id)
+            if text is None:
+                error(f"Текст новости {broadcast.news_id} не найден, рассылка на {len(broadcast.user_ids)} пропущена")
+                return []
+            return [
+                AlertMessage(user_id=user_id, text=text, priority=broadcast.priority, premium=broadcast.premium)
+                for user_id in broadcast.user_ids
+            ]
+        return [AlertMessage.model_validate(fields)]
+
+    async def _process(self, entries):
+        """Отправляет пачку записей и подтверждает те, по которым все алерты отправлены или отложены"""
+        message_ids = [message_id for message_id, _ in entries]
+        self._in_flight.update(message_ids)
+        try:
+            await self._deliver(entries)
+        finally:
+            self._in_flight.difference_update(message_ids)
+
+    def _read_count(self) -> int:
+        """Сколько записей читать, чтобы в пачке было около batch_alerts алертов"""
+        return max(1, min(self.batch_size, int(self.batch_alerts / self._alerts_per_entry)))
+
+    async def _deliver(self, entries):
+        messages = []
+        for message_id, fields in entries:
+            try:
+                messages.extend((message_id, message) for message in await self._expand(fields))
+            except ValidationError:
+                error(f"Некорректная запись {message_id} в stream {self.stream}: {fields}")
+        if entries:
+            # Скользящее среднее: размер рассылок меняется вместе с источником новостей
+            self._alerts_per_entry = 0.8 * self._alerts_per_entry + 0.2 * max(1.0, len(messages) / len(entries))
+
+        if self.reachability is not None and messages:
+            try:
+                reachable = set(await self.reachability.filter_reachable(
+                    list({message.user_id for _, message in messages})
+                ))
+                messages = [(message_id, message) for message_id, message in messages if message.user_id in reachable]
+            except Exception as e:
+                warn(f"Не удалось проверить доступность пользователей: {e}")
+
+        if self.digest is not None and messages:
+            queued = set()
+            try:
+                periods = await self.digest.periods(list({message.user_id for _, message in messages}))
+                for index, (_, message) in enumerate(messages):
+                    hours = periods.get(message.user_id)
+                    if hours:
+                        await self.digest.enqueue(message.user_id, message.text, hours)
+                        queued.add(index)
+            except Exception as e:
+                warn(f"Не удалось проверить режим дайджеста: {e}")
+            messages = [item for index, item in enumerate(messages) if index not in queued]
+
+        pending = []
+        for message_id, message in messages:
+            lane = lane_for(message.priority, message.premium)
+            future = await self.scheduler.submit(message.user_id, message.text, lane)
+            pending.append((message_id, message, future))
+
+        # Записи, у которых хотя бы один алерт не отправлен и не отложен, остаются в pending до XAUTOCLAIM
+        unresolved = set()
+        for message_id, message, future in pending:
+            try:
+                await future
+                info(f"Сообщение для пользователя {message.user_id} успешно отправлено")
+            except Exception as e:
+                log_delivery_error(message.user_id, e)
+                if self.retries is not None:
+                    try:
+                        await self.retries.handle_failure(
+                            message.user_id, message.text, e, lane=lane_for(message.priority, message.premium)
+                        )
+                        self.deferred += 1
+                    except Exception as retry_error:
+                        self.failed += 1
+                        unresolved.add(message_id)
+                        error(f"Не удалось отложить повтор для пользователя {message.user_id}: {retry_error}")
+                elif not isinstance(e, PERMANENT_ERRORS):
+                    self.failed += 1
+                    unresolved.add(message_id)
+
+        await self._ack([message_id for message_id, _ in entries if message_id not in unresolved])
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                response = await self.redis.xreadgroup(
+                    self.group, self.consumer, {self.stream: '>'}, count=self._read_count(), block=5000
+                )
+                for _, entries in response or []:
+                    await self._process(entries)
+            except asyncio.CancelledError:
+                raise
+            except ResponseError as e:
+                if 'NOGROUP' in str(e):
+                    await self._ensure_group()
+                else:
+                    error(f"Ошибка чтения stream {self.stream} (воркер {index}): {e}")
+                    await asyncio.sleep(1)
+            except Exception as e:
+                error(f"Ошибка чтения stream {self.stream} (воркер {index}): {e}")
+                await asyncio.sleep(1)
+
+    async def _heartbeat(self):
+        """Сбрасывает idle записей в обработке (XCLAIM JUSTID), пока их отправка ждет лимитов Telegram"""
+        while True:
+            await asyncio.sleep(self.claim_idle_ms / 3000)
+            message_ids = list(self._in_flight)
+            try:
+                for i in range(0, len(message_ids), 1000):
+                    await self.redis.xclaim(
+                        self.stream, self.group, self.consumer, 0, message_ids[i:i + 1000], justid=True
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error(f"Ошибка обновления записей в обработке для stream {self.stream}: {e}")
+
+    async def _reclaimer(self):
+        """Забирает записи, зависшие у упавших или медленных потребителей"""
+        while True:
+            try:
+                start_id = '0-0'
+                while True:
+                    response = await self.redis.xautoclaim(
+                        self.stream, self.group, self.consumer, self.claim_idle_ms,
+                        start_id=start_id, count=self._read_count()
+                    )
+                    start_id, entries = response[0], response[1]
+                    # Свои записи в обработке не переотправляем, даже если heartbeat не успел сбросить им idle
+                    entries = [
+                        (message_id, fields) for message_id, fields in entries
+                        if fields and message_id not in self._in_flight
+                    ]
+                    if entries:
+                        self.reclaimed += len(entries)
+                        warn(f"Переотправка {len(entries)} зависших записей из {self.stream}")
+                        await self._process(entries)
+                    if start_id in ('0-0', b'0-0'):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error(f"Ошибка XAUTOCLAIM для stream {self.stream}: {e}")
+            await asyncio.sleep(self.claim_interval)
+
+    async def run(self):
+        await self._ensure_group()
+        info(f"Потребитель {self.consumer} читает {self.stream} в группе {self.group}, воркеров: {self.workers}")
+        await asyncio.gather(
+            *(self._worker(index) for index in range(self.workers)),
+            self._heartbeat(),
+            self._reclaimer(),
+        )
+
+    def stats(self) -> dict:
+        return {
+            'consumer': self.consumer,
+            'workers': self.workers,
+            'acked': self.acked,
+            'failed': self.failed,
+            'reclaimed': self.reclaimed,
+            'in_flight': len(self._in_flight),
+            'deferred': self.deferred,
+            'news_bodies': self.news_bodies.stats(),
+        }
@@ -0,0 +1,40 @@
+# infrastructure/streams/news_bodies.py
+from collections import OrderedDict
+from redis import asyncio as aioredis
+
+# Текст новости пишет Go-парсер один раз на рассылку (SET с TTL)
+NEWS_BODY_KEY = 'alert_news:{news_id}'
+
+
+class NewsBodyCache:
+    """Локальный LRU текстов новостей: одна рассылка читает текст из Redis один раз"""
+
+    def __init__(self, redis: aioredis.Redis, maxsize: int = 256):
+        self.redis = redis
+        self.maxsize = maxsize
+        self._bodies: OrderedDict[str, str] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, news_id: str) -> str | None:
+        body = self._bodies.get(news_id)
+        if body is not None:
+            self._bodies.move_to_end(news_id)
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        body = await self.redis.get(NEWS_BODY_KEY.format(news_id=news_id))
+        if body is not None:
+            self._bodies[news_id] = body
+            if len(self._bodies) > self.maxsize:
+                self._bodies.popitem(last=False)
+        return body
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._bodies),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
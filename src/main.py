@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from src.infrastructure.logging.logger_setup import *
 from src.infrastructure.logging.logger_setup import telegram_worker
 from src.infrastructure.faststream.alerts import run_faststream
+from src.infrastructure.repository.cache.user_cache import user_cache
 import asyncio
 from contextlib import asynccontextmanager
 import sys
@@ -24,6 +25,14 @@ class Application:
         self.bot_exempl = None
         self.fastapi_app = None
         self.telegram_service = None
+        self.container = None
+        self.delivery = None
+        self.alerts_consumer = None
+        self.alert_retries = None
+        self.alert_coalescer = None
+        self.alert_digest = None
+        self.tag_matcher = None
+        self.news_fanout = None
 
     @asynccontextmanager
     async def lifespan(self, app: FastAPI):
@@ -35,7 +44,13 @@ class Application:
     async def _on_startup(self, app: FastAPI):
         try:
             info('Start application')
-            bot, dp = await self.bot.init_bot()
+            from src.infrastructure.container import Container
+            self.container = Container()
+            app.state.container = self.container
+            await self.container.init_schema()
+
+            bot, dp = await self.bot.init_bot(**self.container.workflow_data())
+            self.container.bot = bot
             app.state.bot = bot
             app.state.dp = dp
 
@@ -43,10 +58,79 @@ class Application:
             self.telegram_service = TelegramBotService(bot)
             app.state.telegram_service = self.telegram_service
 
-            self.tasks.append(asyncio.create_task(run_faststream(self.telegram_service)))
+            from src.services.telegram.delivery_scheduler import DeliveryScheduler
+            self.delivery = DeliveryScheduler.from_env(self.telegram_service)
+            self.delivery.start()
+            app.state.delivery = self.delivery
+
+            self.tasks.append(asyncio.create_task(run_faststream()))
+
+            from src.infrastructure.streams.alert_retries import AlertRetryQueue
+            self.alert_retries = AlertRetryQueue.from_env(
+                self.container.redis, self.delivery, self.container.reachability
+            )
+            app.state.alert_retries = self.alert_retries
+            self.tasks.append(asyncio.create_task(self.alert_retries.run()))
+
+            from src.services.telegram.alert_coalescer import AlertCoalescer
+            self.alert_coalescer = AlertCoalescer.from_env(self.delivery)
+            app.state.alert_coalescer = self.alert_coalescer
+
+            from src.services.telegram.alert_digest import AlertDigest
+            self.alert_digest = AlertDigest.from_env(
+                self.container.redis, self.delivery, self.container.repository, self.alert_retries
+            )
+            app.state.alert_digest = self.alert_digest
+            self.tasks.append(asyncio.create_task(self.alert_digest.sync()))
+            self.tasks.append(asyncio.create_task(self.alert_digest.run()))
+
+            from src.infrastructure.streams.alerts_consumer import AlertsConsumer
+            self.alerts_consumer = AlertsConsumer.from_env(
+                self.container.redis, self.alert_coalescer, self.alert_retries,
+                self.container.reachability, self.alert_digest
+            )
+            app.state.alerts_consumer = self.alerts_consumer
+            self.tasks.append(asyncio.create_task(self.alerts_consumer.run()))
+            self.tasks.append(asyncio.create_task(self.container.reachability.sync()))
+            self.tasks.append(asyncio.create_task(user_cache.listen_invalidations()))
+
+            from src.services.tags.canonical import canonicalizer
+            canonicalizer.add_listener(self.container.repository)
+            self.tasks.append(asyncio.create_task(
+                canonicalizer.run(self.container.redis, float(getenv('TAG_ALIASES_REFRESH_INTERVAL', 600)))
+            ))
+
+            if getenv('NEWS_FANOUT', '0') == '1':
+                from src.services.matching.tag_matcher import TagMatcher
+                from src.services.matching.news_fanout import NewsFanout
+                self.tag_matcher = TagMatcher(
+                    self.container.repository,
+                    rebuild_interval=float(getenv('TAG_MATCHER_REBUILD_INTERVAL', 600)),
+                )
+                self.container.repository.add_listener(self.tag_matcher)
+                canonicalizer.add_listener(self.tag_matcher)
+                self.news_fanout = NewsFanout.from_env(self.container.redis, self.tag_matcher)
+                app.state.tag_matcher = self.tag_matcher
+                app.state.news_fanout = self.news_fanout
+                self.tasks.append(asyncio.create_task(self.tag_matcher.run()))
+                self.tasks.append(asyncio.create_task(self.news_fanout.run()))
+
+            if self.container.repository.settings_buffer is not None:
+                self.tasks.append(asyncio.create_task(self.container.repository.settings_buffer.run()))
+
+            if self.container.repository.router.replicas:
+                self.tasks.append(asyncio.create_task(self.container.repository.router.run_health_checks()))
+
+            from src.services.subscription.expiry_sweeper import run_expiry_sweeper
+            self.tasks.append(asyncio.create_task(run_expiry_sweeper(self.container.repository)))
+
+            from src.presentation.telegram_bot.handlers.base_handler import listen_for_ai_responses
+            self.tasks.append(asyncio.create_task(
+                listen_for_ai_responses(self.container.repository, bot, self.container.redis)
+            ))
             if self.bot_mode in (TelegramBotMode.POLLING, TelegramBotMode.TEST):
                 self.tasks.append(asyncio.create_task(self.bot._run_poling()))
-            self.tasks.append(asyncio.create_task(telegram_worker()))
+            self.tasks.append(asyncio.create_task(telegram_worker(bot)))
             info('Application startup complete')
 
         except Exception as e:
@@ -63,6 +147,12 @@ class Application:
             await asyncio.gather(*self.tasks, return_exceptions=True)
         except:
             pass
+        if self.alert_coalescer:
+            await self.alert_coalescer.close()
+        if self.delivery:
+            await self.delivery.close()
+        if self.container:
+            await self.container.close()
         info('Application shutdown complete')
 
     def create_server(self):
@@ -71,6 +161,9 @@ class Application:
         from src.presentation.server.routers.webhook import router as webhook_router
         self.fastapi_app.include_router(webhook_router)
 
+        from src.presentation.server.routers.metrics import router as metrics_router
+        self.fastapi_app.include_router(metrics_router)
+
         return self.fastapi_app
 
     async def run(self):
@@ -0,0 +1,91 @@
+import json
+from fastapi import APIRouter, Request
+from fastapi.exceptions import HTTPException
+from os import getenv
+from dotenv import load_dotenv
+from src.infrastructure.database.instrumentation import query_stats
+from src.infrastructure.repository.cache.user_cache import user_cache
+from src.services.tags.canonical import canonicalizer
+
+load_dotenv()
+
+METRICS_TOKEN = getenv("METRICS_TOKEN")
+
+router = APIRouter(prefix="/metrics")
+
+
+def check_token(request: Request):
+    if METRICS_TOKEN and request.headers.get("X-Metrics-Token") != METRICS_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+
+@router.get('/db')
+async def db_metrics(request: Request, top: int | None = None):
+    check_token(request)
+    return query_stats.snapshot(top=top)
+
+
+@router.post('/db/reset')
+async def db_metrics_reset(request: Request):
+    check_token(request)
+    query_stats.reset()
+    return {"status": "ok"}
+
+
+@router.get('/db/replicas')
+async def db_replicas_metrics(request: Request):
+    check_token(request)
+    return request.app.state.container.repository.router.stats()
+
+
+@router.get('/cache')
+async def cache_metrics(request: Request):
+    check_token(request)
+    return user_cache.stats()
+
+
+@router.get('/settings_buffer')
+async def settings_buffer_metrics(request: Request):
+    check_token(request)
+    settings_buffer = request.app.state.container.repository.settings_buffer
+    if settings_buffer is None:
+        return {"enabled": False}
+    return {"enabled": True, **settings_buffer.stats()}
+
+
+@router.get('/delivery')
+async def delivery_metrics(request: Request):
+    check_token(request)
+    return {
+        **request.app.state.delivery.stats(),
+        'consumer': request.app.state.alerts_consumer.stats(),
+        'retries': await request.app.state.alert_retries.stats(),
+        'reachability': request.app.state.container.reachability.stats(),
+        'coalescer': request.app.state.alert_coalescer.stats(),
+        'digest': await request.app.state.alert_digest.stats(),
+    }
+
+
+@router.get('/matcher')
+async def matcher_metrics(request: Request):
+    check_token(request)
+    matcher = getattr(request.app.state, 'tag_matcher', None)
+    if matcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **matcher.stats(), 'fanout': request.app.state.news_fanout.stats()}
+
+
+@router.get('/collector')
+async def collector_metrics(request: Request):
+    """Лимиты запросов, остаток дневного бюджета CMC и кэш ответов, которые публикует api_parser/client"""
+    check_token(request)
+    raw = await request.app.state.container.redis.get('api_parser:metrics')
+    if raw is None:
+        return {"enabled": False}
+    return {"enabled": True, **json.loads(raw)}
+
+
+@router.get('/tags')
+async def tags_metrics(request: Request):
+    check_token(request)
+    return canonicalizer.stats()
@@ -20,7 +20,7 @@ class TelegramBot:
         self.webhook_url = getenv('WEBHOOK_URL')
         self.dp: Optional[Dispatcher] = None
 
-    async def init_bot(self):
+    async def init_bot(self, **workflow_data):
         match self.mode:
             case TelegramBotMode.POLLING:
                 self.bot = Bot(token=self.token, default=DefaultBotProperties(parse_mode='HTML'))
@@ -44,7 +44,8 @@ class TelegramBot:
                 raise ValueError(f'Unknown mode: {self.mode}')
 
         self.router = Router()
-        self.dp = Dispatcher()
+        # Общие зависимости приложения доступны обработчикам как аргументы
+        self.dp = Dispatcher(**workflow_data)
         self.dp.include_router(self.router)
         info('Bot initialized!')
 
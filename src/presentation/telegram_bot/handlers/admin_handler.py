@@ -2,19 +2,20 @@ from aiogram import Router, types
 from aiogram.filters import Command
 from src.infrastructure.repository.mariadb.user_repo import MariaUserRepository
 from src.infrastructure.logging.logger_setup import *
+from src.infrastructure.streams.alert_retries import replay_dead_letters, DEAD_STREAM
+from redis import asyncio as aioredis
 from src.presentation.telegram_bot.handlers.base_handler import ADMINS
 from datetime import datetime, timedelta
 from shared import UserFull, User
 
 router = Router()
-repository = MariaUserRepository()
 
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором"""
     return user_id in ADMINS
 
 @router.message(Command(commands=['add_subscription']))
-async def add_subscription_handler(message: types.Message):
+async def add_subscription_handler(message: types.Message, repository: MariaUserRepository):
     try:
         # Проверяем права администратора
         if not is_admin(message.from_user.id):
@@ -62,6 +63,105 @@ async def add_subscription_handler(message: types.Message):
         error(f"Ошибка в add_subscription_handler: {e}")
         await message.answer("❌ Произошла ошибка при выполнении команды")
 
+@router.message(Command(commands=['add_subscription_bulk']))
+async def add_subscription_bulk_handler(message: types.Message, repository: MariaUserRepository):
+    try:
+        if not is_admin(message.from_user.id):
+            await message.answer("❌ У вас нет прав для выполнения этой команды")
+            return
+
+        # /add_subscription_bulk <days> <user_id> [<user_id> ...], ID можно разделять запятыми
+        args = message.text.replace(',', ' ').split()
+        if len(args) < 3:
+            await message.answer("❌ Неправильный формат команды. Используйте: /add_subscription_bulk <days> <user_id> [<user_id> ...]")
+            return
+
+        days = int(args[1])
+        user_ids = [int(user_id) for user_id in args[2:]]
+
+        updated = await repository.add_subscription_days_bulk(user_ids, days)
+        await message.answer(f"✅ Подписка на {days} дней добавлена {updated} из {len(set(user_ids))} пользователей")
+
+    except ValueError:
+        await message.answer("❌ Неверный формат аргументов. user_id и days должны быть числами")
+    except Exception as e:
+        error(f"Ошибка в add_subscription_bulk_handler: {e}")
+        await message.answer("❌ Произошла ошибка при выполнении команды")
+
+@router.message(Command(commands=['cache_stats']))
+async def cache_stats_handler(message: types.Message, repository: MariaUserRepository):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды")
+        return
+
+    stats = repository.cache.stats()
+    await message.answer(
+        "📊 Кэш пользователей:\n\n"
+        f"Записей: {stats['size']} / {stats['maxsize']}\n"
+        f"TTL: {stats['ttl']} сек\n"
+        f"Попаданий: {stats['hits']}\n"
+        f"Промахов: {stats['misses']}\n"
+        f"Hit rate: {stats['hit_rate']:.1%}\n"
+        f"Инвалидаций: {stats['invalidations']}"
+    )
+
+@router.message(Command(commands=['db_stats']))
+async def db_stats_handler(message: types.Message, repository: MariaUserRepository):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды")
+        return
+
+    stats = repository.stats.snapshot(top=5)
+    lines = ["🗄 Время БД по методам репозитория:\n"]
+    for operation in stats['operations']:
+        lines.append(
+            f"{operation['name']}: {operation['count']} запр., всего {operation['total_ms']:.0f} мс, "
+            f"p95 {operation['p95_ms']:.0f} мс"
+        )
+    checkout = stats['pool_checkout']
+    lines.append(f"\nОжидание пула: p95 {checkout['p95_ms']:.0f} мс, max {checkout['max_ms']:.0f} мс")
+    lines.append(f"Медленных запросов (>{stats['slow_query_ms']:.0f} мс): {len(stats['slow_queries'])}")
+    await message.answer("\n".join(lines))
+
+@router.message(Command(commands=['rebuild_tags']))
+async def rebuild_tags_handler(message: types.Message, repository: MariaUserRepository):
+    try:
+        if not is_admin(message.from_user.id):
+            await message.answer("❌ У вас нет прав для выполнения этой команды")
+            return
+
+        await message.answer("⏳ Перестраиваю индекс тегов...")
+        processed = await repository.rebuild_tag_index()
+        await message.answer(f"✅ Индекс тегов перестроен для {processed} пользователей")
+
+    except Exception as e:
+        error(f"Ошибка в rebuild_tags_handler: {e}")
+        await message.answer("❌ Произошла ошибка при выполнении команды")
+
+@router.message(Command(commands=['replay_dead']))
+async def replay_dead_handler(message: types.Message, redis: aioredis.Redis):
+    try:
+        if not is_admin(message.from_user.id):
+            await message.answer("❌ У вас нет прав для выполнения этой команды")
+            return
+
+        # /replay_dead [count] - без аргумента показывает размер очереди
+        args = message.text.split()
+        if len(args) == 1:
+            total = await redis.xlen(DEAD_STREAM)
+            await message.answer(f"📭 Недоставленных алертов: {total}\nДля повтора: /replay_dead <count>")
+            return
+
+        count = int(args[1])
+        replayed = await replay_dead_letters(redis, count)
+        await message.answer(f"✅ Возвращено в очередь отправки: {replayed}")
+
+    except ValueError:
+        await message.answer("❌ Неверный формат аргументов. count должен быть числом")
+    except Exception as e:
+        error(f"Ошибка в replay_dead_handler: {e}")
+        await message.answer("❌ Произошла ошибка при выполнении команды")
+
 @router.message(Command(commands=['admin_help']))
 async def admin_help_handler(message: types.Message):
     if not is_admin(message.from_user.id):
@@ -72,6 +172,11 @@ async def admin_help_handler(message: types.Message):
 🛠️ Команды администратора:
 
 /add_subscription <user_id> <days> - Добавить подписку пользователю
+/add_subscription_bulk <days> <user_id> [<user_id> ...] - Добавить подписку списку пользователей
+/cache_stats - Статистика кэша пользователей
+/db_stats - Статистика запросов к БД
+/rebuild_tags - Перестроить индекс тегов пользователей
+/replay_dead [count] - Повторить отправку недоставленных алертов
 /admin_help - Показать эту справку
     """
     await message.answer(help_text)
\ No newline at end of file
@@ -7,9 +7,9 @@ from dotenv import load_dotenv
 import json
 import asyncio
 from src.infrastructure.repository.mariadb.user_repo import MariaUserRepository
-from src.presentation.telegram_bot.handlers.lang_config import subscription_required_message
 from shared import UserSettingsDTO
 from src.presentation.telegram_bot.handlers.lang_config import subscription_required_message
+from src.services.tags.canonical import canonical_tags
 
 
 load_dotenv()
@@ -18,58 +18,18 @@ ADMINS = [int(admin_id) for admin_id in os.getenv('ADMINS', '').split(',') if ad
 
 rt = Router()
 
-bot = Bot(token=os.getenv('TELEGRAM_BOT_TOKEN'))
-repository = MariaUserRepository()
-
-
-class RedisClient:
-    def __init__(self):
-        self.redis = None
-        self.redis_password = os.getenv('REDIS_PASSWORD')
-        self.redis_host = os.getenv('REDIS_HOST', 'redis')
-        self.redis_port = int(os.getenv('REDIS_PORT', 6379))
-        self.is_connected = False
-
-    async def connect(self):
-        try:
-            if self.is_connected and self.redis:
-                return
-
-            self.redis = await aioredis.Redis(
-                host=self.redis_host,
-                port=self.redis_port,
-                password=self.redis_password,
-                decode_responses=True
-            )
-            # Проверяем подключение
-            await self.redis.ping()
-            self.is_connected = True
-            info("Connected to Redis successfully")
-        except Exception as e:
-            error(f"Failed to connect to Redis: {e}")
-            self.is_connected = False
-            raise
-
-    async def send_prompt_message(self, user_id: int, text: str):
-        """Отправка сообщения в Redis Stream"""
-        try:
-            if not self.is_connected:
-                await self.connect()
-
-            message_data = {
-                'user_id': str(user_id),
-                'text': text
-            }
-            await self.redis.xadd('prompt', message_data)
-            info(f"Message sent to Redis stream 'prompt' for user {user_id}")
-
-        except Exception as e:
-            error(f"Error sending message to Redis: {e}")
-            self.is_connected = False
-            raise
-
-
-redis_client = RedisClient()
+PROMPT_STREAM = 'prompt'
+PROMPT_RESPONSE_STREAM = 'prompt_response'
+
+
+async def send_prompt_message(redis: aioredis.Redis, user_id: int, text: str):
+    """Отправка сообщения в Redis Stream"""
+    message_data = {
+        'user_id': str(user_id),
+        'text': text
+    }
+    await redis.xadd(PROMPT_STREAM, message_data)
+    info(f"Message sent to Redis stream '{PROMPT_STREAM}' for user {user_id}")
 
 
 def is_tag_configuration_response(text: str) -> bool:
@@ -88,12 +48,13 @@ def is_tag_configuration_response(text: str) -> bool:
         return False
 
 
-async def update_user_tags(user_id: int, ai_response: str) -> bool:
+async def update_user_tags(repository: MariaUserRepository, user_id: int, ai_response: str) -> bool:
     """Обновляет теги пользователя на основе AI ответа"""
     try:
         data = json.loads(ai_response)
-        specifical_tags = data.get('specifical_tags', [])
-        general_tags = data.get('general_tags', [])
+        # Варианты написания одного тега (Биткоин, Bitcoin, BTC) схлопываются в канонический
+        specifical_tags = canonical_tags(data.get('specifical_tags', []))
+        general_tags = canonical_tags(data.get('general_tags', []))
 
         # Получаем текущие настройки пользователя
         user = await repository.get_user(user_id)
@@ -123,7 +84,7 @@ async def update_user_tags(user_id: int, ai_response: str) -> bool:
 
 
 @rt.message()
-async def handle_text_message(message: types.Message):
+async def handle_text_message(message: types.Message, repository: MariaUserRepository, redis: aioredis.Redis):
     try:
         if message.text.startswith('/'):
             return
@@ -143,7 +104,7 @@ async def handle_text_message(message: types.Message):
         await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
 
         # Отправляем сообщение в Redis Stream
-        await redis_client.send_prompt_message(message.from_user.id, message.text)
+        await send_prompt_message(redis, message.from_user.id, message.text)
 
         info(f"Сообщение от пользователя {message.from_user.id} отправлено в Redis Stream 'prompt'")
 
@@ -153,9 +114,9 @@ async def handle_text_message(message: types.Message):
 
 
 # Обработчик ответов от AI
-async def listen_for_ai_responses():
+async def listen_for_ai_responses(repository: MariaUserRepository, bot: Bot, redis: aioredis.Redis):
     try:
-        await redis_client.connect()
+        await redis.ping()
         info("Started listening for AI responses")
 
         # Используем '$' для чтения только новых сообщений
@@ -166,8 +127,8 @@ async def listen_for_ai_responses():
         while True:
             try:
                 # Слушаем ответы из stream 'prompt_response'
-                messages = await redis_client.redis.xread(
-                    {'prompt_response': last_id}, count=10, block=5000
+                messages = await redis.xread(
+                    {PROMPT_RESPONSE_STREAM: last_id}, count=10, block=5000
                 )
 
                 if messages:
@@ -187,7 +148,7 @@ async def listen_for_ai_responses():
 
                                 if is_tag_configuration_response(text):
                                     # Это конфигурация тегов - обновляем настройки
-                                    success = await update_user_tags(user_id, text)
+                                    success = await update_user_tags(repository, user_id, text)
 
                                     if success:
                                         # Отправляем сообщение об успешном обновлении
@@ -226,7 +187,7 @@ async def listen_for_ai_responses():
 
                 if retry_count >= max_retries:
                     error("Max retries reached, reconnecting to Redis...")
-                    await redis_client.connect()
+                    await redis.connection_pool.disconnect()
                     retry_count = 0
                     last_id = '$'  # Сбрасываем на чтение новых сообщений
 
@@ -236,20 +197,4 @@ async def listen_for_ai_responses():
         error(f"Fatal error in listen_for_ai_responses: {e}")
         # Перезапускаем задачу через некоторое время
         await asyncio.sleep(10)
-        await asyncio.create_task(listen_for_ai_responses())
-
-
-# Глобальная переменная для хранения задачи
-ai_listener_task = None
-
-
-# Функция для запуска слушателя
-def start_ai_listener():
-    global ai_listener_task
-    if ai_listener_task is None or ai_listener_task.done():
-        ai_listener_task = asyncio.create_task(listen_for_ai_responses())
-        info("AI listener task started")
-
-
-# Запускаем слушатель при импорте модуля
-start_ai_listener()
\ No newline at end of file
+        await asyncio.create_task(listen_for_ai_responses(repository, bot, redis))
@@ -123,4 +123,36 @@ Our neural network will configure everything for you!
 *Example: "Notify me about new tokens on STON.fi with high risk."*  
 
 ✨ Let's customize your experience according to your needs!"""
-}
\ No newline at end of file
+}
+digest_message = {
+    'ru': """📰 Режим дайджеста
+
+Сейчас: {current}
+
+Вместо отдельного сообщения на каждую новость алерты будут приходить одним сообщением раз в выбранный период.
+
+/digest 1 - раз в час
+/digest 4 - раз в 4 часа
+/digest 24 - раз в сутки
+/digest off - присылать сразу""",
+    'en': """📰 Digest mode
+
+Current: {current}
+
+Instead of a separate message for every news item, alerts will arrive as one message once per chosen period.
+
+/digest 1 - every hour
+/digest 4 - every 4 hours
+/digest 24 - once a day
+/digest off - send immediately"""
+}
+
+digest_current = {
+    'ru': {'off': "алерты приходят сразу", 'on': "дайджест раз в {hours} ч."},
+    'en': {'off': "alerts are sent immediately", 'on': "digest every {hours} h"}
+}
+
+digest_changed = {
+    'ru': {'off': "✅ Алерты снова будут приходить сразу", 'on': "✅ Дайджест включен: раз в {hours} ч."},
+    'en': {'off': "✅ Alerts will be sent immediately again", 'on': "✅ Digest enabled: every {hours} h"}
+}
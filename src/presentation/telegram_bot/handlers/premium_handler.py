@@ -8,7 +8,6 @@ from datetime import datetime, timedelta
 from shared import UserFull, User
 
 router = Router()
-repository = MariaUserRepository()
 
 
 @router.pre_checkout_query()
@@ -23,7 +22,7 @@ async def pre_checkout_handler(pre_checkout_query: PreCheckoutQuery, bot: Bot):
 
 
 @router.message(lambda message: message.successful_payment is not None)
-async def successful_payment_handler(message: Message):
+async def successful_payment_handler(message: Message, repository: MariaUserRepository):
     try:
         payment_info = message.successful_payment
         user_id = message.from_user.id
@@ -3,8 +3,12 @@ from aiogram import types, Router, Bot
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, LabeledPrice
 from src.presentation.telegram_bot.handlers.lang_config import (start_message, first_message, premium_message,
-                                                                subscription_active_message, settings_message)
+                                                                subscription_active_message, settings_message,
+                                                                digest_message, digest_current, digest_changed)
 from src.infrastructure.repository.mariadb.user_repo import MariaUserRepository
+from src.services.telegram.reachability import UserReachability
+from src.services.telegram.alert_digest import set_digest_mode, DIGEST_PERIODS, DIGEST_MODES_KEY
+from redis import asyncio as aioredis
 from shared import UserFull, LLMModel, UserSettingsDTO, User
 from src.infrastructure.logging.logger_setup import *
 from datetime import datetime, timedelta
@@ -17,8 +21,6 @@ def payment_keyboard():
     builder.button(text="💳 Оплатить 100 Stars", pay=True)
     return builder.as_markup()
 
-repository = MariaUserRepository()
-
 rt = Router()
 
 language_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -28,35 +30,47 @@ language_keyboard = InlineKeyboardMarkup(inline_keyboard=[
 
 
 @rt.message(Command(commands=['start']))
-async def start_handler(message: types.Message, bot: Bot):
+async def start_handler(message: types.Message, bot: Bot, repository: MariaUserRepository,
+                        reachability: UserReachability):
     try:
-        user = await repository.get_user(telegram_id=message.from_user.id)
-        if user is None:
-            await message.answer(first_message['ru'], reply_markup=language_keyboard)
-
-            new_user = UserFull(
-                user=User(
-                    telegram_id=message.from_user.id,
-                    first_name=message.from_user.first_name,
-                    username=message.from_user.username,
-                    is_premium=message.from_user.is_premium or False,
-                    is_admin=False
-                ),
-                settings=UserSettingsDTO(
-                    LLM_model=LLMModel.GPT,
-                    alert_config_general=[],
-                    alert_config_specific=[],
-                    language='ru'
-                )
+        new_user = UserFull(
+            user=User(
+                telegram_id=message.from_user.id,
+                first_name=message.from_user.first_name,
+                username=message.from_user.username,
+                is_premium=message.from_user.is_premium or False,
+                is_admin=False
+            ),
+            settings=UserSettingsDTO(
+                LLM_model=LLMModel.GPT,
+                alert_config_general=[],
+                alert_config_specific=[],
+                language='ru'
             )
-            await repository.new_user(new_user)
+        )
+
+        # Регистрация и проверка существования - один запрос к БД
+        created = await repository.register_user(new_user)
+        if created is None:
+            await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+            return
+
+        if not created:
+            # Пользователь мог ранее заблокировать бота: /start возвращает его в рассылки
+            await reachability.reactivate(message.from_user.id)
+
+        if created:
+            await message.answer(first_message['ru'], reply_markup=language_keyboard)
         else:
-            # Получаем информацию о боте для использования в сообщении
-            bot_info = await bot.get_me()
+            user = await repository.get_user(telegram_id=message.from_user.id)
+            language = user.language if user else 'ru'
+
+            # Получаем информацию о боте для использования в сообщении (кэшируется aiogram)
+            bot_info = await bot.me()
             bot_username = bot_info.username
 
             # Заменяем ____ в сообщении на @username бота
-            personalized_message = start_message[user.language].replace('____', f'@{bot_username}')
+            personalized_message = start_message[language].replace('____', f'@{bot_username}')
             await message.answer(personalized_message)
     except Exception as e:
         TGLog(f'Ошибка при /start: {e}')
@@ -64,7 +78,7 @@ async def start_handler(message: types.Message, bot: Bot):
 
 
 @rt.message(Command(commands=['premium']))
-async def premium_handler(message: types.Message, bot: Bot):
+async def premium_handler(message: types.Message, bot: Bot, repository: MariaUserRepository):
     try:
         user = await repository.get_user(telegram_id=message.from_user.id)
         if user:
@@ -98,7 +112,7 @@ async def premium_handler(message: types.Message, bot: Bot):
         error(f'Ошибка при обработке /premium: {e}')
 
 @rt.message(Command(commands=['settings']))
-async def settings_handler(message: types.Message):
+async def settings_handler(message: types.Message, repository: MariaUserRepository):
     try:
         user = await repository.get_user(telegram_id=message.from_user.id)
         if user:
@@ -109,10 +123,40 @@ async def settings_handler(message: types.Message):
         TGLog(f'Ошибка при обработке /settings: {e}')
         error(f'Ошибка при обработке /settings: {e}')
 
+@rt.message(Command(commands=['digest']))
+async def digest_handler(message: types.Message, repository: MariaUserRepository, redis: aioredis.Redis):
+    try:
+        user = await repository.get_user(telegram_id=message.from_user.id)
+        if not user:
+            await message.answer("Пожалуйста, сначала зарегистрируйтесь с помощью /start")
+            return
+        language = user.language if user.language in digest_message else 'ru'
+
+        # /digest без аргумента или с неизвестным периодом показывает текущий режим и варианты
+        args = message.text.split()
+        if len(args) > 1 and args[1].lower() in ('off', '0'):
+            hours = None
+        elif len(args) > 1 and args[1].isdigit() and int(args[1]) in DIGEST_PERIODS:
+            hours = int(args[1])
+        else:
+            current_hours = await redis.hget(DIGEST_MODES_KEY, str(message.from_user.id))
+            current = (digest_current[language]['on'].format(hours=current_hours) if current_hours
+                       else digest_current[language]['off'])
+            await message.answer(digest_message[language].format(current=current))
+            return
+
+        if await set_digest_mode(repository, redis, message.from_user.id, hours):
+            changed = digest_changed[language]
+            await message.answer(changed['on'].format(hours=hours) if hours else changed['off'])
+        else:
+            await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+    except Exception as e:
+        TGLog(f'Ошибка при обработке /digest: {e}')
+        error(f'Ошибка при обработке /digest: {e}')
 
 
 @rt.callback_query(lambda c: c.data == 'pay_premium')
-async def process_pay_premium(callback_query: types.CallbackQuery):
+async def process_pay_premium(callback_query: types.CallbackQuery, repository: MariaUserRepository):
     try:
         user_id = callback_query.from_user.id
         user = await repository.get_user(user_id)
@@ -153,7 +197,7 @@ async def process_pay_premium(callback_query: types.CallbackQuery):
 
 
 @rt.callback_query(lambda c: c.data.startswith('lang_'))
-async def process_language_callback(callback_query: types.CallbackQuery):
+async def process_language_callback(callback_query: types.CallbackQuery, repository: MariaUserRepository):
     try:
         language = callback_query.data.split('_')[1]
         user_id = callback_query.from_user.id
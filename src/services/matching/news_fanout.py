@@ -0,0 +1,131 @@
+# services/matching/news_fanout.py
+import asyncio
+import json
+import os
+import socket
+from os import getenv
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from redis.exceptions import ResponseError
+from src.infrastructure.streams.news_bodies import NEWS_BODY_KEY
+from src.infrastructure.logging.logger_setup import *
+from src.services.matching.tag_matcher import TagMatcher
+from src.services.tags.canonical import canonical_tags
+
+load_dotenv()
+
+NEWS_BODY_TTL = 24 * 3600
+
+
+def parse_news_tags(raw: str) -> list[str]:
+    """Теги новости из JSON-строки; при битом JSON - как в Go-парсере, разбором строки вручную"""
+    try:
+        tags = json.loads(raw)
+        if isinstance(tags, list):
+            return [str(tag) for tag in tags]
+    except (TypeError, ValueError):
+        pass
+    raw = (raw or '').strip().strip('[]')
+    return [tag.strip().strip('"\'') for tag in raw.split(',') if tag.strip().strip('"\'')]
+
+
+class NewsFanout:
+    """Рассылка новостей из stream news через TagMatcher вместо Go-парсера (включается NEWS_FANOUT=1).
+
+    Пишет в alerts те же записи-рассылки (news_id, user_ids, priority, premium), что и Go-парсер,
+    поэтому одновременно должен работать только один из них.
+    """
+
+    def __init__(self, redis: aioredis.Redis, matcher: TagMatcher, stream: str = 'news', group: str = 'fanout',
+                 consumer: str | None = None, chunk_size: int = 100):
+        self.redis = redis
+        self.matcher = matcher
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.chunk_size = chunk_size
+
+        self.news = 0
+        self.alerts = 0
+
+    @classmethod
+    def from_env(cls, redis: aioredis.Redis, matcher: TagMatcher) -> 'NewsFanout':
+        return cls(
+            redis,
+            matcher,
+            group=getenv('NEWS_FANOUT_GROUP', 'fanout'),
+            chunk_size=int(getenv('NEWS_FANOUT_CHUNK_SIZE', 100)),
+        )
+
+    async def _ensure_group(self):
+        try:
+            # Группа начинает с новых записей: прежний подписчик читал stream без группы и не удалял
+            # записи, доставка с '0' разослала бы всю историю повторно
+            await self.redis.xgroup_create(self.stream, self.group, id='$', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def publish(self, news_id: str, text: str, tags: list[str], priority: str = 'medium') -> int:
+        """Находит получателей новости и пишет рассылки в stream alerts; возвращает число получателей"""
+        if priority not in ('high', 'medium', 'low'):
+            priority = 'medium'
+        result = self.matcher.match(tags)
+        if not result.user_ids:
+            return 0
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(NEWS_BODY_KEY.format(news_id=news_id), text, ex=NEWS_BODY_TTL)
+            for premium, user_ids in ((True, result.premium), (False, result.regular)):
+                for i in range(0, len(user_ids), self.chunk_size):
+                    pipe.xadd('alerts', {
+                        'news_id': news_id,
+                        'user_ids': ','.join(map(str, user_ids[i:i + self.chunk_size])),
+                        'priority': priority,
+                        'premium': 'true' if premium else 'false',
+                    })
+            await pipe.execute()
+
+        self.alerts += len(result.user_ids)
+        info(f"Новость {news_id} ({priority}): {len(result.user_ids)} получателей из {result.scanned} кандидатов")
+        return len(result.user_ids)
+
+    async def run(self):
+        await self._ensure_group()
+        info(f"Рассылка новостей через TagMatcher: stream {self.stream}, группа {self.group}")
+        while True:
+            try:
+                response = await self.redis.xreadgroup(
+                    self.group, self.consumer, {self.stream: '>'}, count=10, block=5000
+                )
+                for _, entries in response or []:
+                    for message_id, fields in entries:
+                        if 'text' in fields:
+                            await self.publish(
+                                message_id,
+                                fields['text'],
+                                canonical_tags(parse_news_tags(fields.get('tags', '[]'))),
+                                (fields.get('priority') or 'medium').strip().lower(),
+                            )
+                            self.news += 1
+                        async with self.redis.pipeline(transaction=False) as pipe:
+                            pipe.xack(self.stream, self.group, message_id)
+                            pipe.xdel(self.stream, message_id)
+                            await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except ResponseError as e:
+                if 'NOGROUP' in str(e):
+                    await self._ensure_group()
+                else:
+                    error(f"Ошибка чтения stream {self.stream}: {e}")
+                    await asyncio.sleep(1)
+            except Exception as e:
+                error(f"Ошибка рассылки новостей: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            'news': self.news,
+            'alerts': self.alerts,
+        }
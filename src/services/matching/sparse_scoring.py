@@ -0,0 +1,132 @@
+# services/matching/sparse_scoring.py
+import time
+import numpy as np
+from scipy import sparse
+from src.infrastructure.repository.mariadb.user_stream import UserFilter
+from src.infrastructure.logging.logger_setup import *
+from src.services.matching.tag_matcher import GENERAL_THRESHOLD, SPECIFIC_THRESHOLD, MatchResult
+from src.services.tags.canonical import canonical_tags
+
+
+class SparseTagScorer:
+    """Пакетная оценка новостей по всем пользователям через разреженные матрицы.
+
+    Канонические теги пользователей хранятся как бинарные CSR-матрицы тег x пользователь, пачка
+    новостей - как бинарная матрица новость x тег. Одно умножение дает число совпадений для всех пар
+    (новость, пользователь), пороги проверяются векторно.
+    Матрицы неизменяемы: снимок пересобирается целиком (rebuild), для точечных обновлений есть TagMatcher.
+    """
+
+    def __init__(self):
+        self.vocabulary: dict[str, int] = {}
+        self.user_ids = np.empty(0, dtype=np.int64)
+        # Окончание премиума (unix time), как в TagMatcher.is_premium: inf - бессрочно, -inf - не премиум
+        self.premium_until = np.empty(0, dtype=np.float64)
+        self._general = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._specific = sparse.csr_matrix((0, 0), dtype=np.int32)
+
+    def build(self, rows) -> int:
+        """Строит матрицы из (telegram_id, general_tags, specific_tags, is_premium, premium_until)"""
+        vocabulary: dict[str, int] = {}
+        user_ids, premium = [], []
+        general = ([], [], [])
+        specific = ([], [], [])
+
+        for column, (telegram_id, general_tags, specific_tags, is_premium, premium_until) in enumerate(rows):
+            user_ids.append(telegram_id)
+            if not is_premium:
+                premium.append(-np.inf)
+            else:
+                premium.append(np.inf if premium_until is None else premium_until.timestamp())
+            for tags, (data, tag_rows, columns) in ((general_tags, general), (specific_tags, specific)):
+                for tag in canonical_tags(tags):
+                    data.append(1)
+                    tag_rows.append(vocabulary.setdefault(tag, len(vocabulary)))
+                    columns.append(column)
+
+        shape = (len(vocabulary), len(user_ids))
+        self._general, self._specific = (
+            sparse.coo_matrix((data, (tag_rows, columns)), shape=shape, dtype=np.int32).tocsr()
+            for data, tag_rows, columns in (general, specific)
+        )
+        self.vocabulary = vocabulary
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.premium_until = np.asarray(premium, dtype=np.float64)
+        return len(user_ids)
+
+    async def rebuild(self, repository, batch_size: int = 5000) -> int:
+        """Строит снимок из БД (только доступные пользователи)"""
+        started = time.perf_counter()
+        rows = []
+        async for row in repository.iter_users(
+            UserFilter(), batch_size=batch_size,
+            columns=('alert_config_general', 'alert_config_specific', 'is_premium', 'premium_until'),
+        ):
+            rows.append((row.telegram_id, row.alert_config_general, row.alert_config_specific,
+                         row.is_premium, row.premium_until))
+        users = self.build(rows)
+        info(f"Матрицы тегов построены: {users} пользователей, {len(self.vocabulary)} тегов "
+             f"за {time.perf_counter() - started:.1f} сек")
+        return users
+
+    def _news_matrix(self, news_tags: list[list[str]]) -> tuple[sparse.csr_matrix, np.ndarray]:
+        data, rows, columns = [], [], []
+        totals = np.empty(len(news_tags), dtype=np.float64)
+        for row, tags in enumerate(news_tags):
+            tags = canonical_tags(tags)
+            # Делитель - все канонические теги новости, даже неизвестные словарю (как в Go-парсере)
+            totals[row] = len(tags)
+            for column in {self.vocabulary.get(tag) for tag in tags} - {None}:
+                data.append(1)
+                rows.append(row)
+                columns.append(column)
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.int32), (rows, columns)), shape=(len(news_tags), len(self.vocabulary))
+        )
+        return matrix, totals
+
+    @staticmethod
+    def _passing(counts: sparse.csr_matrix, totals: np.ndarray, threshold: float) -> sparse.csr_matrix:
+        """Маска пар (новость, пользователь), у которых процент совпадения не ниже порога"""
+        mask = counts.tocsr(copy=True)
+        news_rows = np.repeat(np.arange(mask.shape[0]), np.diff(mask.indptr))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percent = mask.data / totals[news_rows] * 100
+        mask.data = (percent >= threshold).astype(np.int8)
+        mask.eliminate_zeros()
+        return mask
+
+    def score(self, news_tags: list[list[str]]) -> list[MatchResult]:
+        """Получатели для каждой новости пачки"""
+        if not news_tags:
+            return []
+        news, totals = self._news_matrix(news_tags)
+        general_counts = news @ self._general
+        specific_counts = news @ self._specific
+        # Кандидаты - пользователи хотя бы с одним общим тегом (для сравнения с TagMatcher и сканом)
+        scanned = np.diff((general_counts + specific_counts).tocsr().indptr)
+        recipients = (
+            self._passing(general_counts, totals, GENERAL_THRESHOLD)
+            + self._passing(specific_counts, totals, SPECIFIC_THRESHOLD)
+        ).tocsr()
+
+        results = []
+        # Флаг is_premium снимает sweeper раз в минуту, поэтому дату окончания проверяем сами
+        now = time.time()
+        for row in range(len(news_tags)):
+            columns = np.sort(recipients.indices[recipients.indptr[row]:recipients.indptr[row + 1]])
+            is_premium = self.premium_until[columns] >= now
+            results.append(MatchResult(
+                premium=self.user_ids[columns[is_premium]].tolist(),
+                regular=self.user_ids[columns[~is_premium]].tolist(),
+                scanned=int(scanned[row]),
+            ))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            'users': int(self.user_ids.size),
+            'tags': len(self.vocabulary),
+            'general_nnz': int(self._general.nnz),
+            'specific_nnz': int(self._specific.nnz),
+        }
@@ -0,0 +1,211 @@
+# services/matching/tag_matcher.py
+import asyncio
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from src.infrastructure.repository.mariadb.user_stream import UserFilter
+from src.infrastructure.logging.logger_setup import *
+from src.services.tags.canonical import canonical_tags
+
+# Пороги совпадения те же, что в shouldSendNotification (user_parser/main.go)
+GENERAL_THRESHOLD = 70.0
+SPECIFIC_THRESHOLD = 20.0
+
+
+@dataclass
+class MatchResult:
+    premium: list[int] = field(default_factory=list)
+    regular: list[int] = field(default_factory=list)
+    # Сколько пользователей оценено (у кого есть хотя бы один тег новости)
+    scanned: int = 0
+
+    @property
+    def user_ids(self) -> list[int]:
+        return self.premium + self.regular
+
+
+class TagMatcher:
+    """In-memory инвертированный индекс тегов: тег -> {user_id: сколько раз тег встречается у пользователя}.
+
+    Семантика совпадает с calculateMatchPercent из Go-парсера: число канонических тегов пользователя,
+    входящих в канонические теги новости, делится на число канонических тегов новости. Оцениваются
+    только пользователи из posting lists тегов новости, поэтому стоимость зависит от числа совпадений.
+    """
+
+    def __init__(self, repository=None, rebuild_interval: float = 600.0):
+        self.repository = repository
+        self.rebuild_interval = rebuild_interval
+        self._general: dict[str, dict[int, int]] = {}
+        self._specific: dict[str, dict[int, int]] = {}
+        # Текущие теги пользователя, чтобы при обновлении убрать его из старых posting lists
+        self._user_tags: dict[int, tuple[Counter, Counter]] = {}
+        self._premium: dict[int, datetime | None] = {}
+        self._unreachable: set[int] = set()
+        # События, пришедшие во время пересборки: применяются повторно к новому индексу
+        self._missed_events: list | None = None
+        # Пересборки по таймеру и по смене словаря тегов не должны пересекаться (общий _missed_events)
+        self._rebuild_lock = asyncio.Lock()
+
+        self.matched_news = 0
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+
+    # --- события репозитория ---
+
+    def _record(self, event: str, *args):
+        if self._missed_events is not None:
+            self._missed_events.append((event, args))
+
+    def user_tags_changed(self, telegram_id: int, general_tags, specific_tags):
+        self._record('user_tags_changed', telegram_id, general_tags, specific_tags)
+        self._remove_postings(telegram_id)
+        general = Counter(canonical_tags(general_tags))
+        specific = Counter(canonical_tags(specific_tags))
+        self._add_postings(self._general, self._specific, self._user_tags, telegram_id, general, specific)
+
+    def user_premium_changed(self, telegram_id: int, is_premium: bool, premium_until: datetime | None):
+        self._record('user_premium_changed', telegram_id, is_premium, premium_until)
+        if is_premium:
+            self._premium[telegram_id] = premium_until
+        else:
+            self._premium.pop(telegram_id, None)
+
+    def user_reachability_changed(self, telegram_id: int, reachable: bool):
+        self._record('user_reachability_changed', telegram_id, reachable)
+        if reachable:
+            self._unreachable.discard(telegram_id)
+        else:
+            self._unreachable.add(telegram_id)
+
+    # --- индекс ---
+
+    @staticmethod
+    def _add_postings(general_index, specific_index, user_tags, telegram_id: int,
+                      general: Counter, specific: Counter):
+        if not general and not specific:
+            return
+        for tag, count in general.items():
+            general_index.setdefault(tag, {})[telegram_id] = count
+        for tag, count in specific.items():
+            specific_index.setdefault(tag, {})[telegram_id] = count
+        user_tags[telegram_id] = (general, specific)
+
+    def _remove_postings(self, telegram_id: int):
+        previous = self._user_tags.pop(telegram_id, None)
+        if previous is None:
+            return
+        for index, tags in ((self._general, previous[0]), (self._specific, previous[1])):
+            for tag in tags:
+                postings = index.get(tag)
+                if postings is None:
+                    continue
+                postings.pop(telegram_id, None)
+                if not postings:
+                    del index[tag]
+
+    async def tag_table_changed(self):
+        """Словарь тегов изменился: индекс построен по прежним каноническим формам"""
+        await self.rebuild()
+
+    async def rebuild(self, batch_size: int = 5000) -> int:
+        """Строит индекс заново из БД и атомарно подменяет текущий"""
+        async with self._rebuild_lock:
+            return await self._rebuild(batch_size)
+
+    async def _rebuild(self, batch_size: int) -> int:
+        started = time.perf_counter()
+        general_index: dict[str, dict[int, int]] = {}
+        specific_index: dict[str, dict[int, int]] = {}
+        user_tags: dict[int, tuple[Counter, Counter]] = {}
+        premium: dict[int, datetime | None] = {}
+        unreachable: set[int] = set()
+        columns = ('alert_config_general', 'alert_config_specific', 'is_premium', 'premium_until', 'is_reachable')
+
+        self._missed_events = []
+        try:
+            async for row in self.repository.iter_users(UserFilter(is_reachable=None), batch_size=batch_size,
+                                                        columns=columns):
+                general = Counter(canonical_tags(row.alert_config_general))
+                specific = Counter(canonical_tags(row.alert_config_specific))
+                self._add_postings(general_index, specific_index, user_tags, row.telegram_id, general, specific)
+                if row.is_premium:
+                    premium[row.telegram_id] = row.premium_until
+                if not row.is_reachable:
+                    unreachable.add(row.telegram_id)
+        except BaseException:
+            self._missed_events = None
+            raise
+
+        self._general, self._specific, self._user_tags = general_index, specific_index, user_tags
+        self._premium, self._unreachable = premium, unreachable
+        missed, self._missed_events = self._missed_events, None
+        for event, args in missed:
+            getattr(self, event)(*args)
+        self.rebuilds += 1
+        self.rebuild_seconds = time.perf_counter() - started
+        info(f"Индекс тегов в памяти построен: {len(user_tags)} пользователей, "
+             f"{len(general_index) + len(specific_index)} тегов за {self.rebuild_seconds:.1f} сек")
+        return len(user_tags)
+
+    async def run(self):
+        """Строит индекс при старте и периодически пересобирает (догоняет изменения других процессов)"""
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error(f"Ошибка построения индекса тегов: {e}")
+            await asyncio.sleep(self.rebuild_interval)
+
+    # --- сопоставление ---
+
+    def is_premium(self, telegram_id: int, now: datetime | None = None) -> bool:
+        if telegram_id not in self._premium:
+            return False
+        premium_until = self._premium[telegram_id]
+        return premium_until is None or premium_until >= (now or datetime.now())
+
+    def match(self, news_tags: list[str]) -> MatchResult:
+        """Пользователи, которым нужно отправить новость с тегами news_tags"""
+        result = MatchResult()
+        tags = canonical_tags(news_tags)
+        total = len(tags)
+        if total == 0:
+            return result
+
+        general_counts: dict[int, int] = defaultdict(int)
+        specific_counts: dict[int, int] = defaultdict(int)
+        for tag in tags:
+            for telegram_id, count in self._general.get(tag, {}).items():
+                general_counts[telegram_id] += count
+            for telegram_id, count in self._specific.get(tag, {}).items():
+                specific_counts[telegram_id] += count
+
+        candidates = general_counts.keys() | specific_counts.keys()
+        result.scanned = len(candidates)
+        now = datetime.now()
+        for telegram_id in sorted(candidates):
+            if telegram_id in self._unreachable:
+                continue
+            if (general_counts.get(telegram_id, 0) * 100 / total >= GENERAL_THRESHOLD
+                    or specific_counts.get(telegram_id, 0) * 100 / total >= SPECIFIC_THRESHOLD):
+                if self.is_premium(telegram_id, now):
+                    result.premium.append(telegram_id)
+                else:
+                    result.regular.append(telegram_id)
+        self.matched_news += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._user_tags),
+            'general_tags': len(self._general),
+            'specific_tags': len(self._specific),
+            'premium': len(self._premium),
+            'unreachable': len(self._unreachable),
+            'matched_news': self.matched_news,
+            'rebuilds': self.rebuilds,
+            'rebuild_seconds': round(self.rebuild_seconds, 3),
+        }
@@ -0,0 +1,24 @@
+# services/subscription/expiry_sweeper.py
+import asyncio
+from os import getenv
+from dotenv import load_dotenv
+from src.infrastructure.logging.logger_setup import *
+
+load_dotenv()
+
+SWEEP_INTERVAL = float(getenv('PREMIUM_SWEEP_INTERVAL', 60))
+
+
+async def run_expiry_sweeper(repository, interval: float = SWEEP_INTERVAL):
+    """Периодически снимает премиум с истекших подписок одним запросом"""
+    info(f"Запущен sweeper истекших подписок, интервал {interval} сек")
+    while True:
+        try:
+            expired = await repository.expire_subscriptions()
+            if expired:
+                info(f"Истекло подписок: {expired}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error(f"Ошибка в sweeper подписок: {e}")
+        await asyncio.sleep(interval)
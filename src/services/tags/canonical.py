@@ -0,0 +1,220 @@
+# services/tags/canonical.py
+import asyncio
+import hashlib
+import json
+from os import getenv
+from pathlib import Path
+from dotenv import load_dotenv
+from src.infrastructure.logging.logger_setup import *
+from src.services.tags.normalization import TAG_MAX_LENGTH
+
+load_dotenv()
+
+# Скомпилированная таблица для Go-парсера и других сервисов: поле - свернутый синоним, значение - канонический тег
+TAG_ALIASES_KEY = 'tag_aliases'
+# Ручные дополнения словаря без релиза: поле - синоним, значение - канонический тег
+TAG_ALIASES_EXTRA_KEY = 'tag_aliases_extra'
+# Хэш таблицы, по которой построен user_tags; при расхождении одна реплика (lock) переиндексирует user_tags
+TAG_ALIASES_DIGEST_KEY = 'tag_aliases:digest'
+TAG_REINDEX_LOCK_KEY = 'tag_aliases:reindex_lock'
+TAG_REINDEX_LOCK_SECONDS = 3600
+
+DEFAULT_ALIASES_PATH = Path(__file__).with_name('tag_aliases.json')
+
+# Транслитерация кириллицы (упрощенный ГОСТ); та же таблица в user_parser/main.go
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+# Результаты canonical() кэшируются: при пересборке индексов одни и те же теги встречаются миллионы раз
+CACHE_LIMIT = 100_000
+
+
+def fold_tag(tag) -> str:
+    """Ключ поиска в словаре: нормализованный тег без префиксов тикеров ($BTC, #ton) и с е вместо ё"""
+    folded = ' '.join(str(tag).split()).lower().replace('ё', 'е').lstrip('#$')
+    return folded.strip()[:TAG_MAX_LENGTH]
+
+
+def transliterate(text: str) -> str:
+    return text.translate(TRANSLIT)
+
+
+class TagCanonicalizer:
+    """Приводит синонимы, регистр, транслитерацию и тикеры к каноническому тегу.
+
+    Словарь задается группами {канонический тег: [синонимы]} (встроенный tag_aliases.json, файл
+    TAG_ALIASES_FILE и hash tag_aliases_extra в Redis) и компилируется в плоскую таблицу
+    ключ -> канонический тег. Ключи - свернутые синонимы и их транслитерация. Теги, которых нет
+    в словаре, остаются нормализованными как есть.
+    """
+
+    def __init__(self, groups: dict[str, list[str]] | None = None):
+        self.groups: dict[str, list[str]] = groups or {}
+        self.extra: dict[str, str] = {}
+        self._table: dict[str, str] = {}
+        self._cache: dict[str, str] = {}
+        self.conflicts = 0
+        self.synced = 0
+        self.reindexed = 0
+        self.listeners: list = []
+        self._compile()
+
+    @classmethod
+    def from_env(cls) -> 'TagCanonicalizer':
+        groups = cls.load_file(DEFAULT_ALIASES_PATH)
+        path = getenv('TAG_ALIASES_FILE')
+        if path:
+            for canonical, aliases in cls.load_file(path).items():
+                groups.setdefault(canonical, []).extend(aliases)
+        return cls(groups)
+
+    @staticmethod
+    def load_file(path) -> dict[str, list[str]]:
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            return {str(canonical): [str(alias) for alias in aliases] for canonical, aliases in data.items()}
+        except Exception as e:
+            error(f"Не удалось загрузить словарь тегов {path}: {e}")
+            return {}
+
+    def _compile(self):
+        """Строит таблицу и атомарно подменяет текущую"""
+        table: dict[str, str] = {}
+        conflicts = 0
+
+        def put(key: str, canonical: str):
+            nonlocal conflicts
+            if not key:
+                return
+            current = table.setdefault(key, canonical)
+            if current != canonical:
+                conflicts += 1
+
+        groups = {fold_tag(canonical): aliases for canonical, aliases in self.groups.items()}
+        for alias, canonical in self.extra.items():
+            groups.setdefault(fold_tag(canonical), []).append(alias)
+        groups.pop('', None)
+
+        # Точные ключи важнее транслитерированных: сначала все свернутые синонимы, затем их транслитерация
+        for canonical, aliases in groups.items():
+            put(canonical, canonical)
+            for alias in aliases:
+                put(fold_tag(alias), canonical)
+        for canonical, aliases in groups.items():
+            for alias in [canonical, *aliases]:
+                put(transliterate(fold_tag(alias)), canonical)
+
+        self._table, self._cache, self.conflicts = table, {}, conflicts
+        if conflicts:
+            warn(f"Словарь тегов: {conflicts} синонимов относятся к нескольким тегам, оставлен первый")
+
+    def digest(self) -> str:
+        return hashlib.sha1(json.dumps(sorted(self._table.items()), ensure_ascii=False).encode()).hexdigest()
+
+    def add_listener(self, listener):
+        """Подписывает объект на async-события tag_table_changed (изменилась таблица этой реплики)
+        и tag_table_published (user_tags построен по другой таблице; вызывается на одной реплике под lock)"""
+        self.listeners.append(listener)
+
+    async def _notify(self, event: str) -> bool:
+        """True, если все обработчики события отработали без ошибок"""
+        ok = True
+        for listener in self.listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                await handler()
+            except Exception as e:
+                ok = False
+                error(f"Ошибка обработчика события {event}: {e}")
+        return ok
+
+    async def _reindex_if_changed(self, redis):
+        """Канонические формы в user_tags записаны по прежней таблице: переиндексация при смене хэша"""
+        digest = self.digest()
+        if await redis.get(TAG_ALIASES_DIGEST_KEY) == digest:
+            return
+        if not await redis.set(TAG_REINDEX_LOCK_KEY, 1, nx=True, ex=TAG_REINDEX_LOCK_SECONDS):
+            return
+        try:
+            info("Словарь тегов изменился, переиндексация user_tags")
+            # Хэш записывается только после успешной переиндексации, иначе повтор на следующем sync
+            if await self._notify('tag_table_published'):
+                await redis.set(TAG_ALIASES_DIGEST_KEY, digest)
+                self.reindexed += 1
+        finally:
+            await redis.delete(TAG_REINDEX_LOCK_KEY)
+
+    def canonical(self, tag) -> str:
+        """Канонический тег; пустая строка для пустого тега"""
+        folded = fold_tag(tag)
+        cached = self._cache.get(folded)
+        if cached is not None:
+            return cached
+        canonical = self._table.get(folded) or self._table.get(transliterate(folded)) or folded
+        if len(self._cache) >= CACHE_LIMIT:
+            self._cache.clear()
+        self._cache[folded] = canonical
+        return canonical
+
+    def canonical_tags(self, tags) -> list[str]:
+        """Канонические теги без пустых и повторов, с сохранением порядка"""
+        canonical = (self.canonical(tag) for tag in tags or [])
+        return list(dict.fromkeys(tag for tag in canonical if tag))
+
+    async def sync(self, redis) -> int:
+        """Подмешивает tag_aliases_extra из Redis и публикует скомпилированную таблицу в tag_aliases"""
+        temp_key = f'{TAG_ALIASES_KEY}:rebuild'
+        changed = False
+        try:
+            extra = await redis.hgetall(TAG_ALIASES_EXTRA_KEY)
+            if extra != self.extra:
+                self.extra = dict(extra)
+                self._compile()
+                changed = True
+            await redis.delete(temp_key)
+            if self._table:
+                await redis.hset(temp_key, mapping=self._table)
+                await redis.rename(temp_key, TAG_ALIASES_KEY)
+            self.synced += 1
+            info(f"Словарь тегов опубликован: {len(self._table)} ключей, дополнений из Redis: {len(self.extra)}")
+            await self._reindex_if_changed(redis)
+        except Exception as e:
+            error(f"Ошибка синхронизации словаря тегов: {e}")
+        if changed:
+            await self._notify('tag_table_changed')
+        return len(self._table)
+
+    async def run(self, redis, interval: float = 600.0):
+        """Публикует словарь при старте и периодически подхватывает дополнения из Redis"""
+        while True:
+            await self.sync(redis)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            'canonical_tags': len(set(self._table.values())),
+            'keys': len(self._table),
+            'extra': len(self.extra),
+            'conflicts': self.conflicts,
+            'cached': len(self._cache),
+            'synced': self.synced,
+            'reindexed': self.reindexed,
+        }
+
+
+canonicalizer = TagCanonicalizer.from_env()
+
+
+def canonical_tag(tag) -> str:
+    return canonicalizer.canonical(tag)
+
+
+def canonical_tags(tags) -> list[str]:
+    return canonicalizer.canonical_tags(tags)
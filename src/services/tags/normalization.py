@@ -0,0 +1,15 @@
+# services/tags/normalization.py
+
+# Длина ключа индекса user_tags (utf8mb4)
+TAG_MAX_LENGTH = 191
+
+
+def normalize_tag(tag) -> str:
+    """Приводит тег к виду, по которому строится индекс: нижний регистр, схлопнутые пробелы"""
+    return ' '.join(str(tag).split()).lower()[:TAG_MAX_LENGTH]
+
+
+def normalize_tags(tags) -> list[str]:
+    """Нормализует список тегов, убирая пустые и повторы с сохранением порядка"""
+    normalized = (normalize_tag(tag) for tag in tags or [])
+    return list(dict.fromkeys(tag for tag in normalized if tag))
@@ -0,0 +1,123 @@
+# services/telegram/alert_coalescer.py
+import asyncio
+from os import getenv
+from dotenv import load_dotenv
+from src.infrastructure.logging.logger_setup import *
+from src.services.telegram.delivery_scheduler import LANE_MEDIUM, higher_lane
+
+load_dotenv()
+
+# Ограничение Telegram на длину текста сообщения
+TELEGRAM_MESSAGE_LIMIT = 4096
+ALERT_SEPARATOR = '\n\n➖➖➖➖➖\n\n'
+
+
+def pack_messages(texts: list[str], limit: int = TELEGRAM_MESSAGE_LIMIT,
+                  separator: str = ALERT_SEPARATOR) -> list[tuple[str, list[int]]]:
+    """Склеивает тексты в сообщения не длиннее limit; возвращает (текст, индексы исходных текстов)"""
+    packed = []
+    current: list[int] = []
+    length = 0
+    for index, text in enumerate(texts):
+        added = len(text) + (len(separator) if current else 0)
+        if current and length + added > limit:
+            packed.append((separator.join(texts[i] for i in current), current))
+            current, length = [], 0
+            added = len(text)
+        current.append(index)
+        length += added
+    if current:
+        packed.append((separator.join(texts[i] for i in current), current))
+    return packed
+
+
+class AlertCoalescer:
+    """Склеивает алерты одному пользователю, пришедшие в пределах окна, в одно сообщение.
+
+    Интерфейс submit совпадает с DeliveryScheduler, поэтому коалесер ставится перед планировщиком.
+    """
+
+    def __init__(self, scheduler, window: float = 3.0, limit: int = TELEGRAM_MESSAGE_LIMIT):
+        self.scheduler = scheduler
+        self.window = window
+        self.limit = limit
+        self._buffers: dict[int, list[tuple[str, asyncio.Future]]] = {}
+        # Склеенное сообщение идет в самую приоритетную полосу из его частей
+        self._lanes: dict[int, str] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self.received = 0
+        self.sent = 0
+
+    @classmethod
+    def from_env(cls, scheduler) -> 'AlertCoalescer':
+        return cls(scheduler, window=float(getenv('ALERT_COALESCE_WINDOW', 3)))
+
+    async def submit(self, user_id: int, text: str, lane: str = LANE_MEDIUM) -> asyncio.Future:
+        self.received += 1
+        if self.window <= 0:
+            self.sent += 1
+            return await self.scheduler.submit(user_id, text, lane)
+
+        future = asyncio.get_running_loop().create_future()
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            buffer = self._buffers[user_id] = []
+            self._timers[user_id] = asyncio.get_running_loop().call_later(self.window, self._spawn_flush, user_id)
+        buffer.append((text, future))
+        self._lanes[user_id] = higher_lane(self._lanes.get(user_id, lane), lane)
+        return future
+
+    def _spawn_flush(self, user_id: int):
+        task = asyncio.create_task(self._flush(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, user_id: int):
+        self._timers.pop(user_id, None)
+        buffer = self._buffers.pop(user_id, None)
+        lane = self._lanes.pop(user_id, LANE_MEDIUM)
+        if not buffer:
+            return
+        texts = [text for text, _ in buffer]
+        for text, indexes in pack_messages(texts, self.limit):
+            futures = [buffer[index][1] for index in indexes]
+            try:
+                delivery = await self.scheduler.submit(user_id, text, lane)
+            except BaseException as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+            self.sent += 1
+            delivery.add_done_callback(lambda done, futures=futures: self._resolve(done, futures))
+        if len(buffer) > 1:
+            info(f"Склеено {len(buffer)} алертов для пользователя {user_id}")
+
+    @staticmethod
+    def _resolve(delivery: asyncio.Future, futures: list[asyncio.Future]):
+        for future in futures:
+            if future.done():
+                continue
+            if delivery.cancelled():
+                future.cancel()
+            elif delivery.exception() is not None:
+                future.set_exception(delivery.exception())
+            else:
+                future.set_result(delivery.result())
+
+    async def close(self):
+        """Отправляет накопленные алерты, не дожидаясь окончания окна"""
+        for user_id, handle in list(self._timers.items()):
+            handle.cancel()
+            self._spawn_flush(user_id)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'window': self.window,
+            'buffered_users': len(self._buffers),
+            'received': self.received,
+            'sent': self.sent,
+        }
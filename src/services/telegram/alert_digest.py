@@ -0,0 +1,155 @@
+# services/telegram/alert_digest.py
+import asyncio
+import time
+from os import getenv
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from src.infrastructure.repository.mariadb.user_stream import UserFilter
+from src.services.telegram.alert_coalescer import pack_messages, TELEGRAM_MESSAGE_LIMIT
+from src.infrastructure.logging.logger_setup import *
+
+load_dotenv()
+
+# user_id -> период дайджеста в часах (копия users.digest_hours для быстрых проверок)
+DIGEST_MODES_KEY = 'alert_digest_modes'
+# user_id -> время ближайшей отправки дайджеста
+DIGEST_DUE_KEY = 'alert_digest_due'
+DIGEST_ITEMS_KEY = 'alert_digest:{user_id}'
+
+DIGEST_PERIODS = (1, 4, 24)
+
+POP_DUE_SCRIPT = """
+local users = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #users > 0 then
+    redis.call('ZREM', KEYS[1], unpack(users))
+end
+return users
+"""
+
+
+async def set_digest_mode(repository, redis: aioredis.Redis, user_id: int, hours: int | None) -> bool:
+    """Сохраняет режим дайджеста в БД и Redis; при отключении накопленное уходит сразу"""
+    if not await repository.set_digest_hours(user_id, hours):
+        return False
+    if hours:
+        await redis.hset(DIGEST_MODES_KEY, str(user_id), hours)
+    else:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(DIGEST_MODES_KEY, str(user_id))
+            pipe.zadd(DIGEST_DUE_KEY, {str(user_id): time.time()}, xx=True)
+            await pipe.execute()
+    return True
+
+
+class AlertDigest:
+    """Копит алерты пользователей в режиме дайджеста и отправляет их одним сообщением раз в период"""
+
+    def __init__(self, redis: aioredis.Redis, scheduler, repository=None, retries=None,
+                 limit: int = TELEGRAM_MESSAGE_LIMIT, max_items: int = 50, poll_interval: float = 5.0):
+        self.redis = redis
+        self.scheduler = scheduler
+        self.repository = repository
+        self.retries = retries
+        self.limit = limit
+        self.max_items = max_items
+        self.poll_interval = poll_interval
+        self._pop_due = redis.register_script(POP_DUE_SCRIPT)
+
+        self.queued = 0
+        self.digests = 0
+
+    @classmethod
+    def from_env(cls, redis: aioredis.Redis, scheduler, repository=None, retries=None) -> 'AlertDigest':
+        return cls(
+            redis,
+            scheduler,
+            repository=repository,
+            retries=retries,
+            max_items=int(getenv('ALERT_DIGEST_MAX_ITEMS', 50)),
+            poll_interval=float(getenv('ALERT_DIGEST_POLL_INTERVAL', 5)),
+        )
+
+    async def periods(self, user_ids: list[int]) -> dict[int, int]:
+        """Период дайджеста для тех пользователей из списка, у кого он включен"""
+        if not user_ids:
+            return {}
+        values = await self.redis.hmget(DIGEST_MODES_KEY, [str(user_id) for user_id in user_ids])
+        return {user_id: int(value) for user_id, value in zip(user_ids, values) if value}
+
+    async def enqueue(self, user_id: int, text: str, hours: int):
+        key = DIGEST_ITEMS_KEY.format(user_id=user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, text)
+            # В дайджест попадают только последние max_items алертов
+            pipe.ltrim(key, -self.max_items, -1)
+            pipe.zadd(DIGEST_DUE_KEY, {str(user_id): time.time() + hours * 3600}, nx=True)
+            await pipe.execute()
+        self.queued += 1
+
+    async def _send_digest(self, user_id: int):
+        key = DIGEST_ITEMS_KEY.format(user_id=user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            texts, _ = await pipe.execute()
+        if not texts:
+            return
+        header = f"📰 Дайджест: {len(texts)} алертов\n\n"
+        for text, _ in pack_messages(texts, self.limit - len(header)):
+            text = header + text
+            try:
+                await self.scheduler.send(user_id, text)
+            except Exception as e:
+                if self.retries is not None:
+                    await self.retries.handle_failure(user_id, text, e)
+                else:
+                    error(f"Ошибка отправки дайджеста пользователю {user_id}: {e}")
+        self.digests += 1
+
+    async def run(self):
+        info("Отправка дайджестов алертов запущена")
+        while True:
+            try:
+                user_ids = await self._pop_due(keys=[DIGEST_DUE_KEY], args=[time.time(), 100])
+                if user_ids:
+                    await asyncio.gather(*(self._send_digest(int(user_id)) for user_id in user_ids))
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error(f"Ошибка отправки дайджестов: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def sync(self, batch_size: int = 1000) -> int:
+        """Пересобирает hash режимов дайджеста в Redis из БД (при старте приложения)"""
+        temp_key = f'{DIGEST_MODES_KEY}:rebuild'
+        total = 0
+        try:
+            await self.redis.delete(temp_key)
+            batch = {}
+            async for row in self.repository.iter_users(UserFilter(has_digest=True), batch_size=batch_size,
+                                                        columns=('digest_hours',)):
+                batch[str(row.telegram_id)] = row.digest_hours
+                if len(batch) >= batch_size:
+                    await self.redis.hset(temp_key, mapping=batch)
+                    total += len(batch)
+                    batch = {}
+            if batch:
+                await self.redis.hset(temp_key, mapping=batch)
+                total += len(batch)
+            if total:
+                await self.redis.rename(temp_key, DIGEST_MODES_KEY)
+            else:
+                await self.redis.delete(DIGEST_MODES_KEY)
+            info(f"Пользователей в режиме дайджеста: {total}")
+        except Exception as e:
+            error(f"Ошибка синхронизации режимов дайджеста: {e}")
+        return total
+
+    async def stats(self) -> dict:
+        return {
+            'queued': self.queued,
+            'digests': self.digests,
+            'users': await self.redis.hlen(DIGEST_MODES_KEY),
+            'due': await self.redis.zcard(DIGEST_DUE_KEY),
+        }
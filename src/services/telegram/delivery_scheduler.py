@@ -0,0 +1,297 @@
+# services/telegram/delivery_scheduler.py
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from os import getenv
+from dotenv import load_dotenv
+from aiogram.exceptions import TelegramRetryAfter
+from src.infrastructure.logging.logger_setup import *
+
+load_dotenv()
+
+# Полосы доставки в порядке важности и их веса в weighted fair queuing
+LANE_HIGH = 'high'
+LANE_PREMIUM = 'premium'
+LANE_MEDIUM = 'medium'
+LANE_LOW = 'low'
+DEFAULT_LANE_WEIGHTS = {LANE_HIGH: 8, LANE_PREMIUM: 4, LANE_MEDIUM: 2, LANE_LOW: 1}
+
+
+def lane_for(priority: str | None, premium: bool = False) -> str:
+    """Полоса алерта: срочные новости - high, остальное для премиума - premium, иначе по приоритету"""
+    if priority == LANE_HIGH:
+        return LANE_HIGH
+    if premium:
+        return LANE_PREMIUM
+    return LANE_LOW if priority == LANE_LOW else LANE_MEDIUM
+
+
+def higher_lane(first: str, second: str) -> str:
+    order = list(DEFAULT_LANE_WEIGHTS)
+    return min(first, second, key=lambda lane: order.index(lane) if lane in order else len(order))
+
+
+def parse_lane_weights(value: str | None) -> dict[str, int]:
+    """Разбирает веса полос вида 'high:8,premium:4,medium:2,low:1'"""
+    weights = dict(DEFAULT_LANE_WEIGHTS)
+    for item in (value or '').split(','):
+        lane, _, weight = item.partition(':')
+        if lane.strip() in weights and weight.strip().isdigit():
+            weights[lane.strip()] = max(1, int(weight))
+    return weights
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Берет токен, если он есть, и возвращает 0; иначе - сколько секунд ждать"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Блокирует выдачу токенов (например, по retry_after от Telegram)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+@dataclass
+class DeliveryJob:
+    user_id: int
+    text: str
+    future: asyncio.Future
+    lane: str = LANE_MEDIUM
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class _Lanes:
+    """Очереди полос с выбором по smooth weighted round robin (как в nginx)"""
+
+    def __init__(self, weights: dict[str, int]):
+        self.weights = weights
+        self.jobs = {lane: deque() for lane in weights}
+        self.current = dict.fromkeys(weights, 0)
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self.jobs.values())
+
+    def append(self, job: DeliveryJob):
+        self.jobs.get(job.lane, self.jobs[LANE_MEDIUM]).append(job)
+
+    def popleft(self) -> DeliveryJob:
+        # Пустые полосы не копят вес, поэтому непустые делят пропускную способность пропорционально весам
+        active = [lane for lane, jobs in self.jobs.items() if jobs]
+        total = 0
+        for lane in active:
+            self.current[lane] += self.weights[lane]
+            total += self.weights[lane]
+        best = max(active, key=self.current.__getitem__)
+        self.current[best] -= total
+        return self.jobs[best].popleft()
+
+
+class LaneQueue(asyncio.Queue):
+    """asyncio.Queue с полосами приоритета вместо FIFO (get/put/join работают как обычно)"""
+
+    def __init__(self, weights: dict[str, int]):
+        self.weights = weights
+        super().__init__()
+
+    def _init(self, maxsize):
+        self._queue = _Lanes(self.weights)
+
+    def _put(self, item: DeliveryJob):
+        self._queue.append(item)
+
+    def _get(self) -> DeliveryJob:
+        return self._queue.popleft()
+
+    def sizes(self) -> dict[str, int]:
+        return {lane: len(jobs) for lane, jobs in self._queue.jobs.items()}
+
+
+class DeliveryScheduler:
+    """Планировщик отправки в Telegram: глобальный и per-chat лимиты, retry_after, ограниченная конкурентность.
+
+    Очередь разбита на полосы (high, premium, medium, low), которые обслуживаются пропорционально весам:
+    при упоре в лимиты важные алерты уходят первыми, а низкоприоритетные ждут, но не голодают.
+    """
+
+    def __init__(self, service, global_rate: float = 30, global_burst: float | None = None,
+                 chat_rate: float = 1, chat_burst: float = 1, concurrency: int = 20,
+                 queue_size: int = 10000, max_retry_after: int = 5, lane_weights: dict[str, int] | None = None):
+        self.service = service
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.concurrency = concurrency
+        self.max_retry_after = max_retry_after
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        # Очередь без ограничения (туда же возвращаются отложенные задачи), допуск ограничен семафором
+        self._queue = LaneQueue(lane_weights or dict(DEFAULT_LANE_WEIGHTS))
+        self._slots = asyncio.Semaphore(queue_size)
+        self._workers: list[asyncio.Task] = []
+        # Отложенные задачи (лимит чата, retry_after): таймер -> задача, чтобы при остановке отменить их future
+        self._delayed: dict[asyncio.TimerHandle, DeliveryJob] = {}
+        self._in_flight = 0
+
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+
+    @classmethod
+    def from_env(cls, service) -> 'DeliveryScheduler':
+        global_burst = getenv('TELEGRAM_GLOBAL_BURST')
+        return cls(
+            service,
+            global_rate=float(getenv('TELEGRAM_GLOBAL_RATE', 30)),
+            global_burst=float(global_burst) if global_burst else None,
+            chat_rate=float(getenv('TELEGRAM_CHAT_RATE', 1)),
+            chat_burst=float(getenv('TELEGRAM_CHAT_BURST', 1)),
+            concurrency=int(getenv('DELIVERY_CONCURRENCY', 20)),
+            queue_size=int(getenv('DELIVERY_QUEUE_SIZE', 10000)),
+            max_retry_after=int(getenv('DELIVERY_MAX_RETRY_AFTER', 5)),
+            lane_weights=parse_lane_weights(getenv('DELIVERY_LANE_WEIGHTS')),
+        )
+
+    def start(self):
+        for index in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker(), name=f'delivery-worker-{index}'))
+        info(f"Планировщик доставки запущен: {self.global_bucket.rate} msg/s, {self.concurrency} воркеров")
+
+    async def submit(self, user_id: int, text: str, lane: str = LANE_MEDIUM) -> asyncio.Future:
+        """Ставит сообщение в полосу lane; ждет, если очередь заполнена. Результат - в возвращаемом future"""
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda _: self._slots.release())
+        self._queue.put_nowait(DeliveryJob(user_id=user_id, text=text, future=future, lane=lane))
+        return future
+
+    async def send(self, user_id: int, text: str, lane: str = LANE_MEDIUM) -> bool:
+        """Отправляет сообщение через очередь и ждет результата"""
+        return await (await self.submit(user_id, text, lane))
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 100000:
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items() if not value.is_idle()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _requeue_later(self, job: DeliveryJob, delay: float):
+        handle = None
+
+        def requeue():
+            self._delayed.pop(handle, None)
+            self._queue.put_nowait(job)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._delayed[handle] = job
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.future.done():
+                    continue
+
+                # Лимит на чат не блокирует воркер: задача возвращается в очередь позже
+                wait = self._chat_bucket(job.user_id).reserve()
+                if wait > 0:
+                    self._requeue_later(job, wait)
+                    continue
+
+                await self.global_bucket.acquire()
+                self._in_flight += 1
+                try:
+                    await self.service.send_message(user_id=job.user_id, text=job.text)
+                finally:
+                    self._in_flight -= 1
+                self.sent += 1
+                job.future.set_result(True)
+
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                job.attempts += 1
+                warn(f"Telegram flood control: retry_after={e.retry_after} сек (пользователь {job.user_id})")
+                # Flood control действует на весь бот: приостанавливаем все отправки
+                self.global_bucket.pause(e.retry_after)
+                if job.attempts > self.max_retry_after:
+                    self.failed += 1
+                    job.future.set_exception(e)
+                else:
+                    self._requeue_later(job, e.retry_after)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def close(self, timeout: float = 10.0):
+        """Дожидается отправки очереди (не дольше timeout) и останавливает воркеров"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            warn(f"Планировщик доставки остановлен с неотправленными сообщениями: {self._queue.qsize()}")
+        # Ожидающие send() не должны зависнуть: future отложенных и оставшихся в очереди задач отменяются
+        for handle, job in self._delayed.items():
+            handle.cancel()
+            job.future.cancel()
+        self._delayed.clear()
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+            self._queue.task_done()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'lanes': self._queue.sizes(),
+            'delayed': len(self._delayed),
+            'in_flight': self._in_flight,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retry_after': self.retry_after,
+            'global_rate': self.global_bucket.rate,
+            'chat_buckets': len(self._chat_buckets),
+        }
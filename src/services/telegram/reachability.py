@@ -0,0 +1,83 @@
+# services/telegram/reachability.py
+from redis import asyncio as aioredis
+from src.infrastructure.repository.mariadb.user_stream import UserFilter
+from src.infrastructure.logging.logger_setup import *
+
+UNREACHABLE_KEY = 'unreachable_users'
+
+# Коды причин (см. classify_error), после которых пользователь считается недоступным
+UNREACHABLE_REASONS = ('forbidden', 'chat_not_found', 'not_found')
+
+
+class UserReachability:
+    """Недоступные пользователи: флаг is_reachable в БД и set в Redis для быстрых проверок при рассылке"""
+
+    def __init__(self, repository, redis: aioredis.Redis, key: str = UNREACHABLE_KEY):
+        self.repository = repository
+        self.redis = redis
+        self.key = key
+
+        self.marked = 0
+        self.reactivated = 0
+        self.skipped = 0
+
+    async def mark_unreachable(self, user_id: int, reason: str):
+        await self.redis.sadd(self.key, user_id)
+        if await self.repository.set_reachable(user_id, False):
+            self.marked += 1
+            warn(f"Пользователь {user_id} помечен недоступным ({reason}) и исключен из рассылок")
+
+    async def reactivate(self, user_id: int) -> bool:
+        """Возвращает пользователя в рассылки (вызывается на /start)"""
+        try:
+            await self.redis.srem(self.key, user_id)
+        except Exception as e:
+            error(f"Ошибка при удалении пользователя {user_id} из {self.key}: {e}")
+        # set в Redis не источник истины (вытесняется при allkeys-lru, пересобирается только при старте):
+        # UPDATE выполняется всегда, для доступного пользователя он не меняет ни одной строки
+        if await self.repository.set_reachable(user_id, True):
+            self.reactivated += 1
+            info(f"Пользователь {user_id} снова доступен для рассылок")
+            return True
+        return False
+
+    async def filter_reachable(self, user_ids: list[int]) -> list[int]:
+        """Отбрасывает недоступных пользователей одним SMISMEMBER"""
+        if not user_ids:
+            return []
+        flags = await self.redis.smismember(self.key, user_ids)
+        reachable = [user_id for user_id, blocked in zip(user_ids, flags) if not blocked]
+        self.skipped += len(user_ids) - len(reachable)
+        return reachable
+
+    async def sync(self, batch_size: int = 1000) -> int:
+        """Пересобирает set в Redis из БД (при старте приложения)"""
+        temp_key = f'{self.key}:rebuild'
+        batch = []
+        total = 0
+        try:
+            await self.redis.delete(temp_key)
+            async for row in self.repository.iter_users(UserFilter(is_reachable=False), batch_size=batch_size):
+                batch.append(row.telegram_id)
+                if len(batch) >= batch_size:
+                    await self.redis.sadd(temp_key, *batch)
+                    total += len(batch)
+                    batch.clear()
+            if batch:
+                await self.redis.sadd(temp_key, *batch)
+                total += len(batch)
+            if total:
+                await self.redis.rename(temp_key, self.key)
+            else:
+                await self.redis.delete(self.key)
+            info(f"Недоступных пользователей загружено в Redis: {total}")
+        except Exception as e:
+            error(f"Ошибка синхронизации недоступных пользователей: {e}")
+        return total
+
+    def stats(self) -> dict:
+        return {
+            'marked': self.marked,
+            'reactivated': self.reactivated,
+            'skipped': self.skipped,
+        }
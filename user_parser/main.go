@@ -7,8 +7,8 @@ import (
 	"fmt"
 	"log"
 	"os"
+	"strconv"
 	"strings"
-	"sync"
 	"time"
 	"regexp"
 
@@ -17,8 +17,10 @@ import (
 )
 
 type NewsMessage struct {
-	Text string   `json:"text"`
-	Tags []string `json:"tags"`
+	ID       string   `json:"id"`
+	Text     string   `json:"text"`
+	Tags     []string `json:"tags"`
+	Priority string   `json:"priority"`
 }
 
 type User struct {
@@ -33,10 +35,11 @@ type User struct {
 	Language            string
 }
 
-type AlertMessage struct {
-	UserID int64  `json:"user_id"`
-	Text   string `json:"text"`
-}
+// Текст новости хранится в Redis один раз, stream alerts несет только news_id и список пользователей
+const (
+	newsBodyKeyPrefix = "alert_news:"
+	newsBodyTTL       = 24 * time.Hour
+)
 
 var (
 	rdb *redis.Client
@@ -130,7 +133,7 @@ func processNewsStream() {
 
 		for _, message := range messages {
 			for _, xMessage := range message.Messages {
-				processNewsMessage(xMessage.Values)
+				processNewsMessage(xMessage.ID, xMessage.Values)
 				// В будущем стоит перейти на Consumer Groups вместо удаления
 				// rdb.XAck(ctx, "news", "news-consumers", xMessage.ID)
 				rdb.XDel(ctx, "news", xMessage.ID)
@@ -139,7 +142,7 @@ func processNewsStream() {
 	}
 }
 
-func processNewsMessage(values map[string]interface{}) {
+func processNewsMessage(id string, values map[string]interface{}) {
     // Извлекаем текст и теги из значений Redis
     text, ok := values["text"].(string)
     if !ok {
@@ -171,8 +174,10 @@ func processNewsMessage(values map[string]interface{}) {
 
     // Создаем объект новости
     news := NewsMessage{
-        Text: cleanRedisString(text),
-        Tags: tags,
+        ID:       id,
+        Text:     cleanRedisString(text),
+        Tags:     tags,
+        Priority: normalizePriority(values["priority"]),
     }
 
     log.Printf("Processing news with %d tags: %v", len(news.Tags), news.Tags)
@@ -181,6 +186,18 @@ func processNewsMessage(values map[string]interface{}) {
     processUsersWithCursorPagination(news)
 }
 
+// normalizePriority приводит приоритет от ИИ к high/medium/low
+func normalizePriority(value interface{}) string {
+	priority, _ := value.(string)
+	priority = strings.ToLower(strings.TrimSpace(cleanRedisString(priority)))
+	switch priority {
+	case "high", "medium", "low":
+		return priority
+	default:
+		return "medium"
+	}
+}
+
 func cleanRedisString(s string) string {
     // Удаляем водяные знаки и артефакты нейросети
     cleaned := strings.Map(func(r rune) rune {
@@ -243,17 +260,116 @@ func extractTagsFromString(s string) []string {
     return tags
 }
 
+// Длина ключа индекса user_tags; свертка и словарь совпадают с services/tags/canonical.py в монолите
+const tagMaxLength = 191
+
+// Скомпилированный словарь тегов (свернутый синоним -> канонический тег) публикует монолит
+const (
+	tagAliasesKey     = "tag_aliases"
+	tagAliasesRefresh = 10 * time.Minute
+	// Пока словарь не загружен (ошибка Redis или монолит его еще не опубликовал), повторяем чаще
+	tagAliasesRetry = 30 * time.Second
+)
+
+var (
+	tagAliases         = map[string]string{}
+	tagAliasesNextLoad time.Time
+)
+
+var translit = map[rune]string{
+	'а': "a", 'б': "b", 'в': "v", 'г': "g", 'д': "d", 'е': "e", 'ж': "zh", 'з': "z", 'и': "i",
+	'й': "y", 'к': "k", 'л': "l", 'м': "m", 'н': "n", 'о': "o", 'п': "p", 'р': "r", 'с': "s",
+	'т': "t", 'у': "u", 'ф': "f", 'х': "h", 'ц': "ts", 'ч': "ch", 'ш': "sh", 'щ': "sch", 'ъ': "",
+	'ы': "y", 'ь': "", 'э': "e", 'ю': "yu", 'я': "ya",
+}
+
+// refreshTagAliases перечитывает словарь из Redis не чаще раза в tagAliasesRefresh;
+// после ошибки или пустого хэша прежний словарь остается, а загрузка повторяется через tagAliasesRetry
+func refreshTagAliases() {
+	if time.Now().Before(tagAliasesNextLoad) {
+		return
+	}
+	tagAliasesNextLoad = time.Now().Add(tagAliasesRetry)
+	aliases, err := rdb.HGetAll(ctx, tagAliasesKey).Result()
+	if err != nil {
+		log.Printf("Error loading tag aliases: %v", err)
+		return
+	}
+	if len(aliases) == 0 {
+		log.Printf("Tag aliases not published yet, retrying in %v", tagAliasesRetry)
+		return
+	}
+	tagAliases = aliases
+	tagAliasesNextLoad = time.Now().Add(tagAliasesRefresh)
+	log.Printf("Loaded %d tag aliases", len(aliases))
+}
+
+func foldTag(tag string) string {
+	folded := strings.ToLower(strings.Join(strings.Fields(tag), " "))
+	folded = strings.ReplaceAll(folded, "ё", "е")
+	folded = strings.TrimSpace(strings.TrimLeft(folded, "#$"))
+	if runes := []rune(folded); len(runes) > tagMaxLength {
+		folded = string(runes[:tagMaxLength])
+	}
+	return folded
+}
+
+func transliterate(text string) string {
+	var b strings.Builder
+	for _, r := range text {
+		if latin, ok := translit[r]; ok {
+			b.WriteString(latin)
+		} else {
+			b.WriteRune(r)
+		}
+	}
+	return b.String()
+}
+
+// canonicalTag приводит синонимы, регистр, транслитерацию и тикеры к каноническому тегу
+func canonicalTag(tag string) string {
+	folded := foldTag(tag)
+	if canonical, ok := tagAliases[folded]; ok && canonical != "" {
+		return canonical
+	}
+	if canonical, ok := tagAliases[transliterate(folded)]; ok && canonical != "" {
+		return canonical
+	}
+	return folded
+}
+
+func canonicalTags(tags []string) []string {
+	seen := make(map[string]struct{}, len(tags))
+	canonical := make([]string, 0, len(tags))
+	for _, tag := range tags {
+		c := canonicalTag(tag)
+		if c == "" {
+			continue
+		}
+		if _, exists := seen[c]; exists {
+			continue
+		}
+		seen[c] = struct{}{}
+		canonical = append(canonical, c)
+	}
+	return canonical
+}
+
 func processUsersWithCursorPagination(news NewsMessage) {
 	limit := 100
 	lastID := int64(0)
 
-	// Создаем пул горутин
-	maxGoroutines := 50
-	semaphore := make(chan struct{}, maxGoroutines)
-	var wg sync.WaitGroup
+	// Кандидаты - только пользователи, у которых есть хотя бы один тег новости
+	refreshTagAliases()
+	tags := canonicalTags(news.Tags)
+	if len(tags) == 0 {
+		return
+	}
+
+	bodyStored := false
 
 	for {
-		users, err := getUsersBatch(lastID, limit)
+		users, err := getMatchingUsersBatch(tags, lastID, limit)
 		if err != nil {
 			log.Printf("Error getting users batch: %v", err)
 			return
@@ -263,37 +379,66 @@ func processUsersWithCursorPagination(news NewsMessage) {
 			break // Все пользователи обработаны
 		}
 
-		// Обрабатываем каждого пользователя с ограничением количества одновременных горутин
+		// Проверка совпадения дешевая, поэтому выполняется в цикле; результат пачки уходит одной записью.
+		// Премиум-пользователи идут отдельной записью: у них своя полоса доставки
+		var premium, regular []int64
 		for _, user := range users {
-			wg.Add(1)
-			semaphore <- struct{}{} // Acquire semaphore
-
-			go func(u User) {
-				defer wg.Done()
-				defer func() { <-semaphore }() // Release semaphore
+			if !shouldSendNotification(tags, user.AlertConfigGeneral, user.AlertConfigSpecific) {
+				continue
+			}
+			if user.IsPremium {
+				premium = append(premium, user.TelegramID)
+			} else {
+				regular = append(regular, user.TelegramID)
+			}
+		}
 
-				processUser(u, news)
-			}(user)
+		if len(premium)+len(regular) > 0 {
+			if !bodyStored {
+				if err := storeNewsBody(news); err != nil {
+					log.Printf("Error storing news body %s: %v", news.ID, err)
+					return
+				}
+				bodyStored = true
+			}
+			if len(premium) > 0 {
+				sendBroadcast(news, true, premium)
+			}
+			if len(regular) > 0 {
+				sendBroadcast(news, false, regular)
+			}
 		}
 
 		// Обновляем lastID для следующей итерации
 		lastID = users[len(users)-1].TelegramID
 	}
-
-	wg.Wait() // Ждем завершения всех горутин
 }
 
-func getUsersBatch(lastID int64, limit int) ([]User, error) {
-	query := `SELECT telegram_id, first_name, username, is_premium, is_admin, 
-		LLM_model, alert_config_general, alert_config_specific, language 
-		FROM users WHERE telegram_id > ? ORDER BY telegram_id LIMIT ?`
+// getMatchingUsersBatch выбирает пользователей через инвертированный индекс user_tags
+func getMatchingUsersBatch(tags []string, lastID int64, limit int) ([]User, error) {
+	placeholders := strings.TrimSuffix(strings.Repeat("?,", len(tags)), ",")
+	query := `SELECT telegram_id, first_name, username, is_premium, is_admin,
+		LLM_model, alert_config_general, alert_config_specific, language
+		FROM users
+		WHERE telegram_id IN (SELECT telegram_id FROM user_tags WHERE tag_normalized IN (` + placeholders + `))
+		AND is_reachable = 1 AND telegram_id > ? ORDER BY telegram_id LIMIT ?`
+
+	args := make([]interface{}, 0, len(tags)+2)
+	for _, tag := range tags {
+		args = append(args, tag)
+	}
+	args = append(args, lastID, limit)
 
-	rows, err := db.Query(query, lastID, limit)
+	rows, err := db.Query(query, args...)
 	if err != nil {
 		return nil, err
 	}
 	defer rows.Close()
 
+	return scanUsers(rows)
+}
+
+func scanUsers(rows *sql.Rows) ([]User, error) {
 	var users []User
 	for rows.Next() {
 		var user User
@@ -328,17 +473,10 @@ func getUsersBatch(lastID int64, limit int) ([]User, error) {
 		users = append(users, user)
 	}
 
-	return users, nil
-}
-
-func processUser(user User, news NewsMessage) {
-	// Теперь JSON уже распарсен в структуре User
-	// Проверяем условия отправки уведомления
-	if shouldSendNotification(news.Tags, user.AlertConfigGeneral, user.AlertConfigSpecific) {
-		sendAlert(user.TelegramID, news.Text)
-	}
+	return users, rows.Err()
 }
 
+// shouldSendNotification ожидает канонические теги новости; теги пользователя приводятся здесь
 func shouldSendNotification(newsTags, generalTags, specificTags []string) bool {
 	totalTags := len(newsTags)
 	if totalTags == 0 {
@@ -346,13 +484,13 @@ func shouldSendNotification(newsTags, generalTags, specificTags []string) bool {
 	}
 
 	// Проверяем общие теги (70% совпадение)
-	generalMatch := calculateMatchPercent(newsTags, generalTags)
+	generalMatch := calculateMatchPercent(newsTags, canonicalTags(generalTags))
 	if generalMatch >= 70 {
 		return true
 	}
 
 	// Проверяем специфические теги (20% совпадение)
-	specificMatch := calculateMatchPercent(newsTags, specificTags)
+	specificMatch := calculateMatchPercent(newsTags, canonicalTags(specificTags))
 	if specificMatch >= 20 {
 		return true
 	}
@@ -368,12 +506,12 @@ func calculateMatchPercent(newsTags, userTags []string) float64 {
 	// Создаем множество тегов новости для быстрого поиска
 	newsTagSet := make(map[string]struct{}, len(newsTags))
 	for _, tag := range newsTags {
-		newsTagSet[strings.ToLower(tag)] = struct{}{}
+		newsTagSet[tag] = struct{}{}
 	}
 
 	matchCount := 0
 	for _, userTag := range userTags {
-		if _, exists := newsTagSet[strings.ToLower(userTag)]; exists {
+		if _, exists := newsTagSet[userTag]; exists {
 			matchCount++
 		}
 	}
@@ -381,26 +519,30 @@ func calculateMatchPercent(newsTags, userTags []string) float64 {
 	return float64(matchCount) / float64(len(newsTags)) * 100
 }
 
-func sendAlert(userID int64, text string) {
-	alert := AlertMessage{
-		UserID: userID,
-		Text:   text,
-	}
+func storeNewsBody(news NewsMessage) error {
+	return rdb.Set(ctx, newsBodyKeyPrefix+news.ID, news.Text, newsBodyTTL).Err()
+}
 
-	// Отправляем в стрим alerts
-	values := map[string]interface{}{
-		"user_id": alert.UserID,
-		"text":    alert.Text,
+// sendBroadcast пишет в стрим alerts одну запись на пачку пользователей
+func sendBroadcast(news NewsMessage, premium bool, userIDs []int64) {
+	ids := make([]string, len(userIDs))
+	for i, id := range userIDs {
+		ids[i] = strconv.FormatInt(id, 10)
 	}
 
 	_, err := rdb.XAdd(ctx, &redis.XAddArgs{
 		Stream: "alerts",
-		Values: values,
+		Values: map[string]interface{}{
+			"news_id":  news.ID,
+			"user_ids": strings.Join(ids, ","),
+			"priority": news.Priority,
+			"premium":  strconv.FormatBool(premium),
+		},
 	}).Result()
 
 	if err != nil {
-		log.Printf("Error sending alert for user %d: %v", userID, err)
+		log.Printf("Error sending broadcast for news %s (%d users): %v", news.ID, len(userIDs), err)
 	} else {
-		log.Printf("Alert sent for user %d", userID)
+		log.Printf("Broadcast sent for news %s (%s, premium=%t): %d users", news.ID, news.Priority, premium, len(userIDs))
 	}
 }